@@ -0,0 +1,394 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import argparse
+import asyncio
+import atexit
+import collections
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+import numpy as np
+from trussAnalysis import *
+from analysisSession import AnalysisSession
+#----------------------------------------------------------------------------------------------------------------------#
+#Long running local analysis service: an asyncio HTTP server (TCP or Unix socket) in front of a pool of worker
+#processes that keep the modules imported and the models in memory
+#   POST /analyze   body: a model in the .json schema ({"FEA": {...}} or the "FEA" dictionary), returns the results
+#                   of analyzeModel {trussAnalysis.py} as json, with "worker" and "session" ("hit", "miss", "none")
+#                   Models that can't be solved get 422 with the message of ModelValidationError {modelValidation.py}
+#   GET  /metrics   queue depth, request counts and latency percentiles
+#   GET  /health
+#Linear models solved by a direct solver are routed by their geometry, sections, supports and solver settings
+#{sessionKey}, so the same structure always reaches the same worker. Each worker keeps the AnalysisSession
+#{analysisSession.py} of its most recent structures: a request with new loads only solves with the stored
+#factorization. Other models (pcg, substructure, nonlinear, renumbered...) are analyzed with analyzeModel by the least
+#busy worker, the results have the same entries either way
+#Request bodies are parsed, validated and hashed off the event loop {requestKey}, large ones in parser processes, and
+#the worker parses them again, so a large model never blocks the other requests. The workers aren't daemonic
+#(substructure requests start their own worker processes), close() stops them and is also run at exit
+#Usage: python analysisService.py --port 8765 -j 4        curl --data @model.json http://127.0.0.1:8765/analyze
+#       python analysisService.py --unix /tmp/truss.sock  curl --unix-socket /tmp/truss.sock --data @model.json \
+#                                                              http://localhost/analyze
+
+#Number of structures each worker keeps in memory (least recently used ones are dropped)
+MAX_SESSIONS = 32
+#Number of most recent requests the latency percentiles are calculated from
+LATENCY_WINDOW = 1000
+#Largest request body accepted, in bytes
+MAX_BODY = 256 * 2 ** 20
+#Reason phrases of the status codes the service answers with
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 422: "Unprocessable Entity", 500: "Internal Server Error"}
+#Largest number of processes parsing request bodies, bodies up to INLINE_BODY bytes are parsed in a thread instead
+#(json parsing holds the GIL, but only for about a millisecond)
+MAX_PARSERS = 2
+INLINE_BODY = 2 ** 17
+
+def sessionKey(IC):
+    #Key of the AnalysisSession of a model: geometry, sections, supports and solver settings {resultCache.py}
+    #None for models the sessions don't handle (iterative or nonlinear analyses, renumbered nodes)
+    solver = IC.get("solver", "auto")
+    if solver not in SOLVERS or solver == "gauss_seidel" or IC.get("analysis", "linear") != "linear" or \
+            IC.get("ordering", "none") != "none":
+        return None
+    items = stiffnessItems(IC)
+    support_displacement = IC['initial_conds'].get("support_displacement")
+    if support_displacement is not None:
+        items.append(("support_displacement", canonicalArray(support_displacement).reshape(-1)))
+    return hashArrays(items, {"kind": "session", "solver": solver, "precision": IC.get("precision", "double")})
+
+def requestModel(body):
+    #Model dictionary of a request body ({"FEA": {...}} or the "FEA" dictionary)
+    data = json.loads(body)
+    IC = data.get("FEA", data) if isinstance(data, dict) else None
+    if not isinstance(IC, dict):
+        raise ValueError("The request body must be a model object")
+    return IC
+
+def requestKey(body):
+    #Session key of a request body {sessionKey}, run off the event loop: only the key goes back to it
+    #The model is validated first (unless its "validation" entry is "none"), a malformed one raises
+    #ModelValidationError instead of failing in the key
+    IC = requestModel(body)
+    validation = IC.get("validation", "basic")
+    if validation not in VALIDATION_LEVELS:
+        raise ValueError("Unknown validation '%s', expected one of %s" % (validation, VALIDATION_LEVELS))
+    if validation != "none":
+        validateModel(IC)
+    return sessionKey(IC)
+
+def errorBody(message,**extra):
+    return json.dumps(dict(extra, error=message)).encode()
+
+def runRequest(sessions,key,IC,max_sessions):
+    #Results of one model in a worker and how its session was found
+    if key is None:
+        return analyzeModel(IC), "none"
+    load_cases = readLoadCases(IC["initial_conds"])
+    session = sessions.get(key)
+    if session is not None:
+        #Same structure as a previous request, only the loads can differ: check them against the stored model
+        shape = np.shape(load_cases)
+        if len(shape) != 3 or shape[1:] != (session.model.num_nodes, 2):
+            raise ModelValidationError("Every load case must have one [force, angle] pair per node (%d)" %
+                                       session.model.num_nodes, "schema")
+        sessions.move_to_end(key)
+        state = "hit"
+    else:
+        #The session validates, builds, assembles and factorizes the model {analysisSession.py}
+        session = AnalysisSession(IC, solver=IC.get("solver", "auto"), precision=IC.get("precision", "double"),
+                                  validation=IC.get("validation", "basic"))
+        sessions[key] = session
+        if len(sessions) > max_sessions:
+            sessions.popitem(last=False)
+        state = "miss"
+    return session.solve(load_cases), state
+
+def serviceWorker(connection,max_sessions):
+    #Loop of a worker process: ("analyze", key, request body) messages are answered with (status, json body, info),
+    #None (or the main process going away) stops
+    sessions = collections.OrderedDict()
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        command, key, body = message
+        start = time.perf_counter()
+        state = "none"
+        try:
+            results, state = runRequest(sessions, key, requestModel(body), max_sessions)
+            status = 200
+            body = json.dumps(resultsToJSON(results), default=jsonDefault).encode()
+        except ModelValidationError as error:
+            #Models that can't be solved, the message names the elements / nodes at fault {modelValidation.py}
+            status = 422
+            body = errorBody(str(error), problem=error.problem)
+        except (KeyError, TypeError, ValueError) as error:
+            status = 400
+            body = errorBody("%s: %s" % (type(error).__name__, error))
+        except Exception as error:
+            status = 500
+            body = errorBody("%s: %s" % (type(error).__name__, error), traceback=traceback.format_exc())
+        connection.send((status, body, {"session": state, "time": time.perf_counter() - start,
+                                        "sessions": len(sessions)}))
+    connection.close()
+
+class ServiceWorker():
+    #Main process end of one worker process, its requests wait in queue and are sent one at a time
+    def start(self):
+        #Not daemonic: a daemonic process can't start the subdomain processes of substructure requests
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=serviceWorker, args=(child, self.max_sessions))
+        try:
+            self.process.start()
+        finally:
+            child.close()
+
+    def call(self,message):
+        #Send one request and wait for its answer (run in a thread, not in the event loop)
+        #A worker that died is restarted, the request fails and its sessions are lost
+        try:
+            self.connection.send(message)
+            return self.connection.recv()
+        except (EOFError, OSError):
+            self.process.join(timeout=1)
+            self.start()
+            self.restarts = self.restarts + 1
+            return 500, errorBody("The worker process stopped, it was restarted"), {"session": "none", "time": 0.0,
+                                                                                    "sessions": 0}
+
+    def close(self):
+        try:
+            self.connection.send(None)
+        except (EOFError, OSError):
+            pass
+        if self.process.pid is not None:
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+        self.connection.close()
+
+    def __init__(self,index,max_sessions=MAX_SESSIONS):
+        self.index = index
+        self.max_sessions = max_sessions
+        #Requests queued or being solved, and the sessions the worker reported last
+        self.depth = 0
+        self.sessions = 0
+        self.restarts = 0
+        self.queue = None
+        self.start()
+
+def latencyStats(values):
+    #Count, mean and percentiles (seconds) of a list of latencies
+    if len(values) == 0:
+        return {"count": 0}
+    values = np.asarray(values, dtype=float)
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {"count": int(values.shape[0]), "mean": float(np.mean(values)), "p50": float(p50), "p90": float(p90),
+            "p99": float(p99), "max": float(np.max(values))}
+
+class AnalysisService():
+    #HTTP front end and worker pool, run with asyncio.run(service.serve(...))
+    async def dispatch(self,worker):
+        #Send the queued requests of one worker in order, each answer resolves the future of its request
+        loop = asyncio.get_running_loop()
+        while True:
+            key, body, future = await worker.queue.get()
+            try:
+                reply = await loop.run_in_executor(self.executor, worker.call, ("analyze", key, body))
+            except Exception as error:
+                reply = 500, errorBody("%s: %s" % (type(error).__name__, error)), {"session": "none", "time": 0.0,
+                                                                                   "sessions": worker.sessions}
+            worker.depth = worker.depth - 1
+            worker.sessions = reply[2]["sessions"]
+            if not future.cancelled():
+                future.set_result(reply)
+
+    async def analyze(self,body):
+        #Route one model to a worker and wait for its results, the body is parsed and hashed off the event loop
+        try:
+            parsers = self.parsers if len(body) > INLINE_BODY else None
+            key = await asyncio.get_running_loop().run_in_executor(parsers, requestKey, body)
+        except ModelValidationError as error:
+            return 422, errorBody(str(error), problem=error.problem)
+        except (KeyError, TypeError, ValueError) as error:
+            return 400, errorBody("%s: %s" % (type(error).__name__, error))
+        if key is not None:
+            worker = self.workers[int(key[:8], 16) % len(self.workers)]
+        else:
+            worker = min(self.workers, key=lambda item: item.depth)
+        future = asyncio.get_running_loop().create_future()
+        worker.depth = worker.depth + 1
+        worker.queue.put_nowait((key, body, future))
+        status, payload, info = await future
+
+        self.solve_latency.append(info["time"])
+        self.sessions[info["session"]] = self.sessions.get(info["session"], 0) + 1
+        if status == 200:
+            #The worker wrote the results as a json object, add where they came from without parsing them again
+            extra = json.dumps({"worker": worker.index, "session": info["session"]})
+            payload = payload[:-1] + b", " + extra[1:].encode()
+        return status, payload
+
+    def metrics(self):
+        #Queue depth (requests waiting or being solved), request counts and latencies (seconds) of the service
+        return {
+            "uptime": time.time() - self.started,
+            "workers": len(self.workers),
+            "queue_depth": sum(worker.depth for worker in self.workers),
+            "queue_depth_per_worker": [worker.depth for worker in self.workers],
+            "sessions_per_worker": [worker.sessions for worker in self.workers],
+            "worker_restarts": sum(worker.restarts for worker in self.workers),
+            "requests": self.requests,
+            "responses": dict((str(status), count) for status, count in sorted(self.responses.items())),
+            "sessions": self.sessions,
+            "latency": latencyStats(self.latency),
+            "solve_latency": latencyStats(self.solve_latency),
+        }
+
+    async def route(self,method,path,body):
+        #(status, json body) of one request
+        if path == "/analyze":
+            if method != "POST":
+                return 405, errorBody("Use POST with a model as the body")
+            return await self.analyze(body)
+        if path in ("/metrics", "/health"):
+            if method != "GET":
+                return 405, errorBody("Use GET")
+            if path == "/health":
+                return 200, json.dumps({"status": "ok", "workers": len(self.workers)}).encode()
+            return 200, json.dumps(self.metrics()).encode()
+        return 404, errorBody("Unknown path '%s', expected /analyze, /metrics or /health" % path)
+
+    async def handle(self,reader,writer):
+        #One client connection, HTTP/1.1 requests are answered in turn until the client closes or asks to
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                start = time.perf_counter()
+                parts = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", "0") or 0) if len(parts) == 3 else -1
+                except ValueError:
+                    length = -1
+                if len(parts) != 3 or length < 0:
+                    #The body can't be skipped without its length, the connection is closed after the reply
+                    status, payload, keep_alive = 400, errorBody("Malformed request line or Content-Length"), False
+                elif length > MAX_BODY:
+                    status, payload, keep_alive = 413, errorBody("Models are limited to %d bytes" % MAX_BODY), False
+                else:
+                    body = await reader.readexactly(length) if length > 0 else b""
+                    self.requests = self.requests + 1
+                    status, payload = await self.route(parts[0].upper(), parts[1].split("?")[0], body)
+                    keep_alive = parts[2] == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                self.responses[status] = self.responses.get(status, 0) + 1
+                writer.write(("HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n"
+                              "Connection: %s\r\n\r\n" % (status, STATUS_TEXT.get(status, ""), len(payload),
+                                                          "keep-alive" if keep_alive else "close")).encode())
+                writer.write(payload)
+                await writer.drain()
+                if parts and parts[1].split("?")[0] == "/analyze":
+                    self.latency.append(time.perf_counter() - start)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            #The server is stopping while the client keeps its connection open
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self,host="127.0.0.1",port=8765,unix=None,ready=None):
+        #Serve until cancelled, on a Unix socket when unix is a path, otherwise on host:port
+        #ready() is called once the server is listening
+        for worker in self.workers:
+            worker.queue = asyncio.Queue()
+        dispatchers = [asyncio.ensure_future(self.dispatch(worker)) for worker in self.workers]
+        try:
+            if unix:
+                server = await asyncio.start_unix_server(self.handle, path=unix)
+            else:
+                server = await asyncio.start_server(self.handle, host, port)
+            async with server:
+                if ready is not None:
+                    ready()
+                await server.serve_forever()
+        finally:
+            for dispatcher in dispatchers:
+                dispatcher.cancel()
+            self.close()
+
+    def close(self):
+        #Stop the worker and parser processes, can be called more than once
+        for worker in self.workers:
+            worker.close()
+        self.workers = []
+        self.parsers.shutdown(wait=False, cancel_futures=True)
+        self.executor.shutdown(wait=False)
+
+    def __init__(self,workers=None,max_sessions=MAX_SESSIONS):
+        #workers: number of worker processes (default: all cores), max_sessions: structures kept by each worker
+        workers = workers or os.cpu_count() or 1
+        self.workers = []
+        self.parsers = concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, MAX_PARSERS))
+        #One thread per worker waits on its pipe so the event loop never blocks
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        try:
+            for i in range(0, workers):
+                self.workers.append(ServiceWorker(i, max_sessions))
+        except BaseException:
+            self.close()
+            raise
+        #The workers aren't daemonic, stop them before multiprocessing waits for them at exit
+        atexit.register(self.close)
+        self.started = time.time()
+        self.requests = 0
+        self.responses = {}
+        self.sessions = {}
+        self.latency = collections.deque(maxlen=LATENCY_WINDOW)
+        self.solve_latency = collections.deque(maxlen=LATENCY_WINDOW)
+
+def main(argv=None):
+    #Command line interface of the service
+    parser = argparse.ArgumentParser(description="Local truss analysis service with a pool of warm worker processes")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port")
+    parser.add_argument("--unix", default=None, metavar="PATH", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="number of worker processes (default: all cores)")
+    parser.add_argument("--sessions", type=int, default=MAX_SESSIONS, help="structures kept in memory per worker")
+    args = parser.parse_args(argv)
+
+    service = AnalysisService(args.workers, args.sessions)
+    address = args.unix or "http://%s:%d" % (args.host, args.port)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix,
+                                  ready=lambda: print("Serving on %s with %d workers" % (address,
+                                                                                         len(service.workers)))))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import time
+import numpy as np
+from projectFunc import *
+from solverEngine import *
+from dofMap import *
+from trussAnalysis import buildModel
+from modelValidation import *
+#----------------------------------------------------------------------------------------------------------------------#
+#Persistent analysis of one geometry for design iterations that only change E or D of a few elements
+#The reduced system is assembled and factorized once. Each bar stiffness is k = EA/L * b*b^T (b = strain_matrix row),
+#so changing E or A of an element adds the rank-1 term (E'A' - EA)/L * b*b^T. The changes are kept as
+#K = K0 + U*C*U^T and solved with the Woodbury identity on the factorization of K0:
+#   K^-1 f = y - Z*(I + C*U^T*Z)^-1*C*U^T*y,   y = K0^-1 f,  Z = K0^-1 U
+#Once the number of rank-1 terms exceeds max_rank the system is reassembled and refactorized
+
+class AnalysisSession():
+    def factorize(self):
+        #Assemble and factorize the reduced system of the current model, clears the low rank updates
+        start = time.perf_counter()
+        self.K_ff, self.K_cf, self.K_cc = assembleReduced(self.model, self.dof_map)
+        if self.validation == "full":
+            checkPivots(self.K_ff, self.dof_map)
+        try:
+            self.factorization = Factorization(self.K_ff, self.solver, self.precision)
+        except SingularMatrixError as error:
+            #A mechanism, or elements updated to a stiffness of 0
+            raise explainSingular(self.K_ff, self.dof_map, error=error)
+        #U / V: b of each update at the free / constrained dofs, C: stiffness change of each update
+        self.U = np.zeros((self.dof_map.num_free, 0))
+        self.V = np.zeros((self.dof_map.num_fixed, 0))
+        self.C = np.zeros(0)
+        self.Z = np.zeros((self.dof_map.num_free, 0))
+        self.refactorizations = self.refactorizations + 1
+        self.factor_time = time.perf_counter() - start
+
+    def updateElements(self,indices,E=None,D=None,A=None):
+        #Change the Young's modulus and/or diameter (or area) of the given elements
+        #Only their contributions are added to the factorized system as rank-1 updates
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        if D is not None:
+            A = diaToArea(np.asarray(D, dtype=float))
+        old_stiffness = self.model.E[indices] * self.model.A[indices] / self.model.length[indices]
+        self.model.section_update(indices, E=E, A=A, D=D)
+        change = self.model.E[indices] * self.model.A[indices] / self.model.length[indices] - old_stiffness
+
+        #Unchanged elements add nothing
+        keep = change != 0
+        indices = indices[keep]
+        change = change[keep]
+        if indices.shape[0] == 0:
+            return
+        if self.C.shape[0] + indices.shape[0] > self.max_rank:
+            #Too many updates for the low rank correction to pay off, start from a new factorization
+            self.factorize()
+            return
+
+        #Scatter b of every changed element into the free and constrained dof numbering
+        dofs = self.model.dofs[indices]
+        direction = self.model.strain_matrix[indices]
+        columns = np.repeat(np.arange(indices.shape[0]), 4)
+        free_rows = self.dof_map.free_index[dofs].ravel()
+        fixed_rows = self.dof_map.fixed_index[dofs].ravel()
+        U = np.zeros((self.dof_map.num_free, indices.shape[0]))
+        V = np.zeros((self.dof_map.num_fixed, indices.shape[0]))
+        on_free = free_rows >= 0
+        U[free_rows[on_free], columns[on_free]] = direction.ravel()[on_free]
+        on_fixed = fixed_rows >= 0
+        V[fixed_rows[on_fixed], columns[on_fixed]] = direction.ravel()[on_fixed]
+
+        #One solve with the existing factorization for the new columns of Z = K0^-1 U
+        self.U = np.hstack([self.U, U])
+        self.V = np.hstack([self.V, V])
+        self.C = np.concatenate([self.C, change])
+        self.Z = np.hstack([self.Z, self.factorization.solve(U).reshape(U.shape)])
+
+    def applyInverse(self,rhs):
+        #K^-1 * rhs of the current (updated) free-free matrix, rhs is (free dofs x cases)
+        y = self.factorization.solve(rhs).reshape(rhs.shape)
+        if self.C.shape[0] == 0:
+            return y
+        capacitance = np.eye(self.C.shape[0]) + self.C[:, None] * self.U.T.dot(self.Z)
+        correction = np.linalg.solve(capacitance, self.C[:, None] * self.U.T.dot(y))
+        return y - self.Z.dot(correction)
+
+    def stiffnessProducts(self,u_free,u_fixed):
+        #Products of the current K blocks: K_ff*u_f + K_fc*u_c and K_cf*u_f + K_cc*u_c, (dofs x cases)
+        free = self.K_ff.dot(u_free) + self.K_cf.T.dot(u_fixed)
+        fixed = self.K_cf.dot(u_free) + self.K_cc.dot(u_fixed)
+        if self.C.shape[0] > 0:
+            projection = self.C[:, None] * (self.U.T.dot(u_free) + self.V.T.dot(u_fixed))
+            free = free + self.U.dot(projection)
+            fixed = fixed + self.V.dot(projection)
+        return free, fixed
+
+    def solve(self,load_cases=None):
+        #Solve the current model for its load cases (or new load cases in the [[force, angle],...] format)
+        #Returns a result dictionary like analyzeModel {trussAnalysis.py}
+        start = time.perf_counter()
+        case_forces = self.case_forces if load_cases is None else transformLoadCases(load_cases)
+        u_fixed = np.repeat(self.dof_map.prescribed[:, None], case_forces.shape[0], axis=1)
+
+        #Right hand side f_f - K_fc*u_c, with the updated K_fc
+        rhs = case_forces[:, self.dof_map.free].T
+        if np.any(self.dof_map.prescribed != 0):
+            rhs = rhs - self.stiffnessProducts(np.zeros(rhs.shape), u_fixed)[0]
+        u_free = self.applyInverse(rhs)
+
+        #Residual f_f - (K_ff*u_f + K_fc*u_c) and reactions use the updated blocks without assembling them
+        product_free, product_fixed = self.stiffnessProducts(u_free, u_fixed)
+        residual = np.linalg.norm(case_forces[:, self.dof_map.free].T - product_free, axis=0)
+        force_norm = np.linalg.norm(case_forces[:, self.dof_map.free].T, axis=0)
+        relative = residual / np.where(force_norm > 0, force_norm, 1.0)
+
+        displacement = self.dof_map.expand(u_free)
+        reactions = np.zeros(displacement.shape)
+        reactions[:, self.dof_map.fixed] = product_fixed.T
+        stresses = calcStress(self.model, displacement)
+        solver_info = {
+            "method": self.factorization.method,
+            "backend": self.factorization.kind,
+            "residual_norm": float(np.max(residual, initial=0.0)),
+            "relative_residual": float(np.max(relative, initial=0.0)),
+            "iterations": 1,
+            "converged": bool(np.max(relative, initial=0.0) <= 1e-8),
+            "factor_time": self.factor_time,
+            "time": time.perf_counter() - start,
+            "update_rank": int(self.C.shape[0]),
+            "refactorizations": self.refactorizations,
+        }
+        if self.precision == "mixed":
+            solver_info["precision"] = "mixed" if self.factorization.dtype == np.float32 else "double"
+            solver_info["refinements"] = self.factorization.refinements
+            solver_info["precision_fallback"] = self.factorization.fallback
+        return {
+            "num_nodes": self.model.num_nodes,
+            "num_elements": self.model.num_elements,
+            "num_cases": case_forces.shape[0],
+            "solver": solver_info,
+            #Sessions solve in the model's own node numbering, like analyzeModel without "ordering"
+            "ordering": None,
+            "displacement": displacement,
+            "strain": calcStrain(self.model, displacement),
+            "stress": stresses,
+            "element_force": calcElementForces(stresses, self.model),
+            "reaction": reactions,
+        }
+
+    def __init__(self,IC,model=None,solver="auto",max_rank=64,precision="double",validation="basic"):
+        #IC: model dictionary, model: its TrussModel if already built (kept and modified by updateElements)
+        #solver: direct backend of the factorization {solverEngine.py}, max_rank: largest number of rank-1 updates
+        #kept before the system is refactorized, precision: "mixed" keeps float32 factors {Factorization}
+        #A model that can't be solved raises ModelValidationError before it is built {modelValidation.py}, validation
+        #is the level of analyzeModel {trussAnalysis.py}: "basic", "full" (pivot check before every factorization) or
+        #"none" (a given model was validated by the caller)
+        if validation not in VALIDATION_LEVELS:
+            raise ValueError("Unknown validation '%s', expected one of %s" % (validation, VALIDATION_LEVELS))
+        self.validation = validation
+        if model is None:
+            if validation != "none":
+                validateModel(IC)
+            model = buildModel(IC)
+        self.model = model
+        self.solver = solver
+        self.precision = precision
+        self.max_rank = max_rank
+        self.dof_map = dofMapFromConditions(IC['initial_conds'])
+        self.case_forces = transformLoadCases(readLoadCases(IC["initial_conds"]))
+        self.refactorizations = 0
+        self.factorize()
@@ -0,0 +1,187 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from trussAnalysis import *
+from trussPlot import plotResults
+#----------------------------------------------------------------------------------------------------------------------#
+#Headless batch analysis of many model files across a process pool
+#Usage: python batchRunner.py models/ "more/*.json" -o results -j 8
+
+def findModels(paths):
+    #Expand a list of files, directories (all .json and binary .npz model files inside) and glob patterns into a sorted
+    #list of model files
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "*.json")))
+            files.extend(glob.glob(os.path.join(path, "*.npz")))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            files.extend(glob.glob(path, recursive=True))
+    return sorted(set(os.path.abspath(file) for file in files))
+
+def resultNames(files,extension=".result.json"):
+    #Name of the result file of each model, the model file name with a number added if two models share it
+    names = []
+    used = {}
+    for file in files:
+        stem = os.path.splitext(os.path.basename(file))[0]
+        count = used.get(stem, 0)
+        used[stem] = count + 1
+        if count > 0:
+            stem = "%s_%d" % (stem, count)
+        names.append(stem + extension)
+    return names
+
+def runModel(task):
+    #Analyze one model file and write its result file, called in a worker process
+    #Returns a summary entry, errors are recorded instead of raised so one bad model doesn't stop the batch
+    file, result_file, solver, plot, profile, cache_dir, cache_size, validation = task
+    start = time.perf_counter()
+    entry = {"model": file, "result": result_file}
+    #Profile of the analysis {instrumentation.py}, only collected when asked for
+    instrumentation = Instrumentation() if profile else NULL_INSTRUMENTATION
+    #The cache directory is shared by all workers {resultCache.py}
+    cache = ResultCache(cache_dir, cache_size) if cache_dir else None
+    try:
+        with instrumentation.stage("load"):
+            IC = loadModel(file)
+        #The model is only built when the results are not cached or a plot needs it, and checked before being built
+        #{modelValidation.py}
+        model = None
+        if plot:
+            if (validation or IC.get("validation", "basic")) != "none":
+                with instrumentation.stage("validate"):
+                    validateModel(IC)
+            with instrumentation.stage("element_build"):
+                model = buildModel(IC)
+        results = analyzeModel(IC, solver=solver, model=model, instrumentation=instrumentation, cache=cache,
+                               validation=validation)
+        with instrumentation.stage("write"):
+            if result_file.endswith(".npz"):
+                writeBinaryResults(results, result_file)
+            else:
+                with open(result_file, "w") as output:
+                    json.dump(resultsToJSON(results), output)
+        #matplotlib is only imported when a plot is asked for, plot is the image format ("png", "svg", True for png)
+        #The first load case is drawn on its deformed shape with the members colored by stress {trussPlot.py}
+        if plot:
+            image_format = plot if isinstance(plot, str) else "png"
+            with instrumentation.stage("plot"):
+                plotResults(model, IC["initial_conds"], results,
+                            filename=os.path.splitext(result_file)[0] + "." + image_format)
+
+        if profile:
+            profile_file = os.path.splitext(os.path.splitext(result_file)[0])[0] + ".profile.json"
+            instrumentation.exportReport(profile_file)
+            entry["profile"] = profile_file
+
+        entry["status"] = "ok"
+        entry["num_nodes"] = results["num_nodes"]
+        entry["num_elements"] = results["num_elements"]
+        entry["num_cases"] = results["num_cases"]
+        entry["max_abs_stress"] = float(np.max(np.abs(results["stress"]), initial=0.0))
+        entry["max_abs_displacement"] = float(np.max(np.abs(results["displacement"]), initial=0.0))
+        entry["solver"] = results["solver"]
+        if cache is not None:
+            entry["cache"] = cache.stats()
+    except ModelValidationError as error:
+        #Models that can never solve: the message names the elements / nodes at fault, no traceback needed
+        entry["status"] = "invalid"
+        entry["problem"] = error.problem
+        entry["error"] = str(error)
+    except Exception as error:
+        entry["status"] = "failed"
+        entry["error"] = "%s: %s" % (type(error).__name__, error)
+        entry["traceback"] = traceback.format_exc()
+    entry["time"] = time.perf_counter() - start
+    return entry
+
+def runBatch(paths,output_dir,workers=None,solver=None,plot=None,profile=False,cache_dir=None,cache_size=2 ** 30,
+             binary=False,validation=None):
+    #Analyze every model found in paths with a process pool, write one result file per model and summary.json
+    #profile also writes a <model>.profile.json report of the stage times, metrics and solver residuals
+    #cache_dir: optional result cache directory {resultCache.py}, identical models are only analyzed once
+    #binary writes <model>.result.npz files {modelFormat.py} instead of .json
+    #plot: optional image format ("png", "svg") of a <model>.<format> plot of the results next to each result file
+    #validation overrides the "validation" entry of every model ("none", "basic", "full" {modelValidation.py}),
+    #invalid models get the "invalid" status and the diagnostic instead of being solved
+    #Returns the summary dictionary, its "models_per_second" entry is the throughput of the batch
+    files = findModels(paths)
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(files[i], os.path.join(output_dir, name), solver, plot, profile, cache_dir, cache_size, validation)
+             for i, name in enumerate(resultNames(files, ".result.npz" if binary else ".result.json"))]
+
+    start = time.perf_counter()
+    if workers == 1:
+        entries = [runModel(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            #Hand out several small models per task to keep the inter-process overhead low
+            chunksize = max(1, len(tasks) // (4 * (workers or os.cpu_count() or 1)))
+            entries = list(pool.map(runModel, tasks, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    failed = [entry for entry in entries if entry["status"] != "ok"]
+    summary = {
+        "num_models": len(entries),
+        "num_failed": len(failed),
+        "num_invalid": sum(1 for entry in failed if entry["status"] == "invalid"),
+        "workers": workers or os.cpu_count(),
+        "elapsed": elapsed,
+        "models_per_second": len(entries) / elapsed if elapsed > 0 else 0.0,
+        "models": entries,
+    }
+    if cache_dir:
+        summary["cache_hits"] = sum(entry["cache"]["hits_by_kind"].get("results", 0)
+                                    for entry in entries if "cache" in entry)
+        summary["cache_misses"] = sum(entry["cache"]["misses_by_kind"].get("results", 0)
+                                      for entry in entries if "cache" in entry)
+    with open(os.path.join(output_dir, "summary.json"), "w") as output:
+        json.dump(summary, output, indent=1)
+    return summary
+
+def main(argv=None):
+    #Command line interface of the batch runner
+    parser = argparse.ArgumentParser(description="Analyze many truss model files in parallel without plotting")
+    parser.add_argument("paths", nargs="+", help="model files, directories of .json files or glob patterns")
+    parser.add_argument("-o", "--output", default="results", help="directory for the result files and summary.json")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--solver", default=None, choices=SOLVERS + MATRIX_FREE_SOLVERS + SUBSTRUCTURE_SOLVERS,
+                        help="override the solver of every model")
+    parser.add_argument("--plot", nargs="?", const="png", default=None, choices=["png", "svg", "pdf"],
+                        help="save a plot of the results (deformed shape colored by stress) next to each result file")
+    parser.add_argument("--profile", action="store_true", help="save a .profile.json report next to each result file")
+    parser.add_argument("--cache", default=None, metavar="DIR", help="reuse results of identical models from this cache")
+    parser.add_argument("--cache-size", type=float, default=1024, help="size limit of the cache in MB")
+    parser.add_argument("--binary", action="store_true", help="write binary .result.npz files instead of .json")
+    parser.add_argument("--validate", default=None, choices=VALIDATION_LEVELS,
+                        help="model checks before solving (default: the model's \"validation\" entry, or basic)")
+    args = parser.parse_args(argv)
+
+    summary = runBatch(args.paths, args.output, workers=args.workers, solver=args.solver, plot=args.plot,
+                       profile=args.profile, cache_dir=args.cache, cache_size=int(args.cache_size * 2 ** 20),
+                       binary=args.binary, validation=args.validate)
+    print("Analyzed %d models (%d failed) in %.3f s: %.1f models/second"
+          % (summary["num_models"], summary["num_failed"], summary["elapsed"], summary["models_per_second"]))
+    if args.cache:
+        print("Cache: %d hits, %d misses" % (summary["cache_hits"], summary["cache_misses"]))
+    for entry in summary["models"]:
+        if entry["status"] != "ok":
+            print("%s %s: %s" % (entry["status"].upper(), entry["model"], entry["error"]))
+    return 1 if summary["num_failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
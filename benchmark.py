@@ -0,0 +1,196 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+import scipy
+from trussAnalysis import *
+from trussGenerator import *
+from trussPlot import plotModel
+#----------------------------------------------------------------------------------------------------------------------#
+#Stage by stage benchmark of the analysis pipeline across model sizes and solver backends
+#Usage: python benchmark.py --kinds warren grid --sizes 100 10000 1000000 --solvers cholesky pcg -o bench.json
+#       python benchmark.py --compare old_bench.json new_bench.json
+
+#Stages timed for every model, in pipeline order
+STAGES = ["load", "element_build", "assembly", "trim", "solve", "post_process", "plot"]
+#Largest number of free dofs run with the slow reference / dense backends, larger models record "skipped"
+SOLVER_LIMITS = {"gauss_seidel": 200, "dense": 5000}
+#Largest number of elements plotted when the plot stage is enabled
+PLOT_LIMIT = 200000
+
+def timeStage(function,repeat):
+    #Run function repeat times, return its last result and the best wall time
+    best = None
+    for i in range(0, repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def benchmarkModel(file,solver,repeat=1,plot=False):
+    #Time every stage of the pipeline of one model file with one solver, returns a record dictionary
+    times = {}
+    IC, times["load"] = timeStage(lambda: loadModel(file), repeat)
+    model, times["element_build"] = timeStage(lambda: buildModel(IC), repeat)
+    case_forces = transformLoadCases(readLoadCases(IC["initial_conds"]))
+
+    #Trim: number the dofs and extract the free part of the load vectors {dofMap.py}
+    dof_map, times["trim"] = timeStage(lambda: dofMapFromConditions(IC["initial_conds"]), repeat)
+    record = {
+        "model": os.path.basename(file),
+        "num_nodes": model.num_nodes,
+        "num_elements": model.num_elements,
+        "num_free_dofs": dof_map.num_free,
+        "solver": solver,
+    }
+    if dof_map.num_free > SOLVER_LIMITS.get(solver, dof_map.num_free):
+        record["skipped"] = "more than %d free dofs" % SOLVER_LIMITS[solver]
+        return record
+
+    if solver in MATRIX_FREE_SOLVERS:
+        times["assembly"] = 0.0
+        forces = dof_map.reduceForces(case_forces)
+        (solution, info), times["solve"] = timeStage(lambda: solveMatrixFree(model, dof_map, forces), repeat)
+        reactions = lambda displacement: reactionsMatrixFree(model, dof_map, displacement)
+    elif solver in SUBSTRUCTURE_SOLVERS:
+        #The subdomains are assembled and condensed in the worker processes, all of it is timed as the solve
+        #{substructuring.py}, one subdomain per core
+        times["assembly"] = 0.0
+        (displacement, reaction, info), times["solve"] = timeStage(
+            lambda: solveSubstructured(model, dof_map, case_forces), repeat)
+        solution = displacement[:, dof_map.free].T
+        reactions = lambda displacement: reaction
+        record["interface_dofs"] = info["interface_dofs"]
+    else:
+        (K_ff, K_cf, K_cc), times["assembly"] = timeStage(lambda: assembleReduced(model, dof_map), repeat)
+        forces, trim_rhs = timeStage(lambda: dof_map.reduceForces(case_forces, K_cf), repeat)
+        times["trim"] += trim_rhs
+        (solution, info), times["solve"] = timeStage(lambda: solveSystem(K_ff, forces, method=solver), repeat)
+        reactions = lambda displacement: dof_map.reactions(K_cf, K_cc, displacement)
+        record["nnz"] = int(K_ff.nnz)
+
+    def postProcess():
+        displacement = dof_map.expand(solution)
+        stresses = calcStress(model, displacement)
+        return (displacement, calcStrain(model, displacement), stresses, calcElementForces(stresses, model),
+                reactions(displacement))
+    results, times["post_process"] = timeStage(postProcess, repeat)
+
+    if plot and model.num_elements <= PLOT_LIMIT:
+        image = os.path.splitext(file)[0] + ".png"
+        _, times["plot"] = timeStage(lambda: plotModel(model, IC["initial_conds"]["displacement"],
+                                                         transformForce(IC["initial_conds"]["force"]),
+                                                         filename=image), repeat)
+
+    record["backend"] = info["backend"]
+    record["iterations"] = info["iterations"]
+    record["relative_residual"] = info["relative_residual"]
+    record["converged"] = info["converged"]
+    record["stages"] = times
+    record["total"] = sum(times.values())
+    return record
+
+def environment():
+    #Versions and machine information stored with the results so runs can be compared
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def runBenchmark(kinds,sizes,solvers,repeat=1,plot=False,workdir=None):
+    #Generate every kind/size model once {trussGenerator.py}, then benchmark it with every solver
+    #Returns {"environment": ..., "records": [...]}, one record per model and solver
+    records = []
+    with tempfile.TemporaryDirectory(dir=workdir) as directory:
+        for kind in kinds:
+            for size in sizes:
+                file = os.path.join(directory, "%s_%d.json" % (kind, size))
+                start = time.perf_counter()
+                writeModel(generateModel(kind, size), file)
+                generate_time = time.perf_counter() - start
+                for solver in solvers:
+                    record = benchmarkModel(file, solver, repeat=repeat, plot=plot)
+                    record["kind"] = kind
+                    record["target_elements"] = size
+                    record["generate"] = generate_time
+                    records.append(record)
+                    printRecord(record)
+    return {"environment": environment(), "records": records}
+
+def printRecord(record):
+    #One line summary of a benchmark record
+    if "skipped" in record:
+        print("%-10s %9d elements  %-12s skipped (%s)" % (record["kind"], record["num_elements"], record["solver"],
+                                                          record["skipped"]))
+        return
+    stages = "  ".join("%s %.4f" % (stage, record["stages"][stage]) for stage in STAGES if stage in record["stages"])
+    print("%-10s %9d elements  %-12s total %.4f s  %s" % (record["kind"], record["num_elements"], record["solver"],
+                                                         record["total"], stages))
+
+def recordKey(record):
+    #Records of two runs are matched on the model type, size and solver
+    return (record.get("kind"), record.get("target_elements"), record.get("solver"))
+
+def compareBenchmarks(old,new,threshold=1.2):
+    #Compare two benchmark result dictionaries stage by stage, returns a list of
+    #(kind, size, solver, stage, old time, new time, ratio) for every stage that got slower by more than threshold
+    old_records = dict((recordKey(record), record) for record in old["records"] if "stages" in record)
+    regressions = []
+    for record in new["records"]:
+        previous = old_records.get(recordKey(record))
+        if previous is None or "stages" not in record:
+            continue
+        for stage in STAGES:
+            if stage in record["stages"] and stage in previous["stages"] and previous["stages"][stage] > 0:
+                ratio = record["stages"][stage] / previous["stages"][stage]
+                if ratio > threshold:
+                    regressions.append(recordKey(record) + (stage, previous["stages"][stage],
+                                                            record["stages"][stage], ratio))
+    return regressions
+
+def main(argv=None):
+    #Command line interface of the benchmark
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the truss analysis pipeline")
+    parser.add_argument("--kinds", nargs="+", default=["warren", "grid", "delaunay"], choices=TRUSS_TYPES)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--solvers", nargs="+", default=["cholesky", "pcg"], choices=SOLVERS + MATRIX_FREE_SOLVERS +
+                        SUBSTRUCTURE_SOLVERS)
+    parser.add_argument("--repeat", type=int, default=1, help="best of this many runs per stage")
+    parser.add_argument("--plot", action="store_true", help="also time the plot stage (small models only)")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="machine readable result file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="report stages that got slower")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported by --compare")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as old_file, open(args.compare[1]) as new_file:
+            regressions = compareBenchmarks(json.load(old_file), json.load(new_file), args.threshold)
+        for kind, size, solver, stage, old_time, new_time, ratio in regressions:
+            print("%-10s %9d %-12s %-13s %.4f s -> %.4f s (x%.2f)" % (kind, size, solver, stage, old_time,
+                                                                       new_time, ratio))
+        print("%d regressions" % len(regressions))
+        return 1 if regressions else 0
+
+    results = runBenchmark(args.kinds, args.sizes, args.solvers, repeat=args.repeat, plot=args.plot)
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=1)
+    print("Wrote %s" % args.output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
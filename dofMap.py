@@ -0,0 +1,69 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import numpy as np
+#----------------------------------------------------------------------------------------------------------------------#
+
+#Numbering of the free (solved for) and constrained (support) dofs of a model, computed once from the boundary
+#conditions and used to assemble and solve the reduced system without deleting rows/columns of a global matrix
+class DofMap():
+    def reduceForces(self,forces,K_cf=None):
+        #Right hand side of the free dofs from a dof vector or a (cases x dofs) force array, one column per case
+        #Prescribed support displacements u_c move to the right hand side: f_f - K_fc*u_c (K_fc = K_cf^T)
+        forces = np.asarray(forces, dtype=float)
+        rhs = forces[..., self.free].T
+        if K_cf is not None and np.any(self.prescribed != 0):
+            correction = K_cf.T.dot(self.prescribed)
+            rhs = rhs - (correction[:, None] if rhs.ndim == 2 else correction)
+        return rhs
+
+    def expand(self,free_values):
+        #Scatter a solution of the free dofs (vector or free dofs x cases) back into the full dof layout, constrained
+        #dofs take their prescribed value. A (free dofs x cases) solution gives a (cases x dofs) array
+        free_values = np.asarray(free_values, dtype=float)
+        if free_values.ndim == 2:
+            output = np.empty((free_values.shape[1], self.num_dofs))
+            output[:, self.free] = free_values.T
+        else:
+            output = np.empty(self.num_dofs)
+            output[self.free] = free_values
+        output[..., self.fixed] = self.prescribed
+        return output
+
+    def reactions(self,K_cf,K_cc,displacement):
+        #Reaction forces R_c = K_cf*u_f + K_cc*u_c at the constrained dofs, 0 at the free dofs
+        #displacement is a full dof vector or a (cases x dofs) array, the result has the same shape
+        displacement = np.asarray(displacement, dtype=float)
+        r_forces = K_cf.dot(displacement[..., self.free].T) + K_cc.dot(displacement[..., self.fixed].T)
+        output = np.zeros(displacement.shape)
+        output[..., self.fixed] = r_forces.T
+        return output
+
+    def __init__(self,displacement,support_displacement=None):
+        #displacement: the [[x,y],...] flag lists of the model, 0 = constrained dof, non-zero = free dof
+        #support_displacement: optional [[x,y],...] values of the constrained dofs (settlement of supports),
+        #entries at free dofs are ignored
+        flags = np.asarray(displacement).reshape(-1)
+        self.num_dofs = flags.shape[0]
+        self.free_mask = flags != 0
+        self.free = np.flatnonzero(self.free_mask)
+        self.fixed = np.flatnonzero(~self.free_mask)
+        self.num_free = self.free.shape[0]
+        self.num_fixed = self.fixed.shape[0]
+
+        #Position of each global dof in the free / constrained numbering, -1 if the dof is not in that set
+        self.free_index = np.full(self.num_dofs, -1, dtype=np.int64)
+        self.free_index[self.free] = np.arange(self.num_free)
+        self.fixed_index = np.full(self.num_dofs, -1, dtype=np.int64)
+        self.fixed_index[self.fixed] = np.arange(self.num_fixed)
+
+        #Prescribed values of the constrained dofs, 0 unless support displacements are given
+        self.prescribed = np.zeros(self.num_fixed)
+        if support_displacement is not None:
+            self.prescribed = np.asarray(support_displacement, dtype=float).reshape(-1)[self.fixed]
+
+def dofMapFromConditions(initial_conds):
+    #Create the DofMap of a model's "initial_conds", with the optional "support_displacement" lists
+    return DofMap(initial_conds["displacement"], initial_conds.get("support_displacement"))
@@ -6,24 +6,41 @@
 import numpy as np
 #----------------------------------------------------------------------------------------------------------------------#
 
+def elementKernel(E,A,start_coords,end_coords):
+    #Batched element calculation: E, A are arrays of n elements, start_coords/end_coords are (n x 2) arrays
+    #Returns the lengths (n), direction cosines [-l, -m, l, m] used as strain matrices (n x 4),
+    #stress matrices (n x 4) and stiffness matrices in global coordinates (n x 4 x 4)
+    E = np.asarray(E, dtype=float)
+    A = np.asarray(A, dtype=float)
+    delta = np.asarray(end_coords, dtype=float) - np.asarray(start_coords, dtype=float)
+    length = np.hypot(delta[:, 0], delta[:, 1])
+
+    # l = cos(theta), m = sin(theta)
+    direction = np.empty((delta.shape[0], 4))
+    direction[:, 2] = delta[:, 0]/length
+    direction[:, 3] = delta[:, 1]/length
+    direction[:, 0] = -direction[:, 2]
+    direction[:, 1] = -direction[:, 3]
+
+    # k = EA/L * [-l,-m,l,m]^T [-l,-m,l,m], the outer product gives the [[l^2, lm, -l^2, -lm],...] matrix
+    stiff = (E*A/length)[:, None, None] * direction[:, :, None] * direction[:, None, :]
+    stress = (E/length)[:, None] * direction
+    return length, direction, stress, stiff
+
 #Create object to hold all element parameters
 class Element():
+    #Fixed attribute slots keep each object small when many elements are created
+    __slots__ = ("E", "A", "start_coord", "end_coord", "connecting_nodes", "length", "augMatrix",
+                 "stiff_matrix", "strain_matrix", "stress_matrix", "midpoint")
+
     def stiff_matrix_calc(self):
-        #Calculates the individual stiffness matrices in global coordinates
-        # l = cos(theta)
-        # m = sin(theta)
-        l = (self.end_coord[0] - self.start_coord[0])/self.length
-        m = (self.end_coord[1] - self.start_coord[1])/self.length
+        #Calculates the individual stiffness matrices in global coordinates {elementKernel in this file}
+        length, direction, stress, stiff = elementKernel([self.E], [self.A], [self.start_coord], [self.end_coord])
 
         #Create variable to hold stiff_matrix for the element
-        self.stiff_matrix = np.multiply(self.E * self.A / self.length, np.array([ \
-            [pow(l, 2), l * m, -pow(l, 2), -l * m], \
-            [l * m, pow(m, 2), -l * m, -pow(m, 2)], \
-            [-pow(l, 2), -l * m, pow(l, 2), l * m], \
-            [-l * m, -pow(m, 2), l * m, pow(m, 2)]]))
-
-        self.strain_matrix = np.array([-l, -m, l, m])
-        self.stress_matrix = np.multiply(self.E/self.length, np.array([-l, -m, l, m]))
+        self.stiff_matrix = stiff[0]
+        self.strain_matrix = direction[0]
+        self.stress_matrix = stress[0]
 
     def element_midpoint(self):
         #Find the midpoint of the element, used to annotate the plot of the structure
@@ -4,11 +4,14 @@
 # Mar 10, 2019
 # ----------------------------------------------------------------------------------------------------------------------#
 import numpy as np
+import scipy.sparse as sp
 # ----------------------------------------------------------------------------------------------------------------------#
 
-def calcGS(augMatrix, disp_vector, forces):
-    # define maximum acceptable error
-    max_error = 0.000001
+def calcGS(augMatrix, disp_vector, forces, max_error=0.000001, max_iter=10000, info=False, callback=None):
+    # max_error is the maximum acceptable change of any displacement entry between two sweeps
+    # max_iter is the maximum number of sweeps (prevent endless loops if solution doesn't converge)
+    # If info is True, a dictionary with the number of sweeps used and the convergence flag is returned as well
+    # callback(sweep, largest change) is called after every sweep if given
     # finished sim flag will be set to true when all displacements have less than max error
     finished_sim = False
     # Set the displacement vector to a float
@@ -16,19 +19,36 @@ def calcGS(augMatrix, disp_vector, forces):
     # Create an initial displacement for calculating error, updated at end of each iteration
     last_iteration = np.zeros(disp_vector.shape[0])
 
+    # Sparse matrices are swept row by row using the CSR arrays, only the stored entries of each row are touched
+    sparse = sp.issparse(augMatrix)
+    if sparse:
+        augMatrix = augMatrix.tocsr()
+        indptr = augMatrix.indptr
+        indices = augMatrix.indices
+        data = augMatrix.data
+        diagonal = augMatrix.diagonal()
+
+    # Count the sweeps performed so the caller can tell whether the solution converged
+    sweeps = 0
     # Specify max number of iterations (prevent endless loops if solution doesn't converge)
-    for x in range(0, 10000):
+    for x in range(0, max_iter):
         # If all errors are < max_error, stop the analysis
         if finished_sim == True:
             break
         # Create array to hold errors less than max_error, reset every iteration
         finished_check = []
+        sweeps = sweeps + 1
 
         # For each variable (u1,v1,u2,v2,...) perform Gauss-Seidel method
         for i in range(0, len(disp_vector)):
             # If the initial value is set to 0, dont modify it (since it is a fixed point)
             if disp_vector[i] == 0:
                 pass
+            elif sparse:
+                # Off diagonal sum of the row = full row product minus the diagonal contribution
+                row = slice(indptr[i], indptr[i + 1])
+                off_diag = np.dot(data[row], disp_vector[indices[row]]) - diagonal[i] * disp_vector[i]
+                disp_vector[i] = float(forces[i] - off_diag) / diagonal[i]
             else:
                 # Jacobi is split into two parts: See documentation for explanation
                 pt1 = np.dot(augMatrix[i][0:i], disp_vector[0:i])
@@ -41,9 +61,11 @@ def calcGS(augMatrix, disp_vector, forces):
             # else:
             #     disp_vector[i] = float(forces[i]-pt1-pt2)/augMatrix[i][i]
 
-        # Calculate error of each entry in displacement matrix
+        # Calculate error of each entry in displacement matrix, track the largest one for the callback
+        max_change = 0.0
         for z in range(0, len(disp_vector)):
             current_error = abs(last_iteration[z] - disp_vector[z])
+            max_change = max(max_change, current_error)
             # If the current_error < max_error add entry to finished_check list
             if current_error < max_error:
                 finished_check.append(current_error)
@@ -55,4 +77,9 @@ def calcGS(augMatrix, disp_vector, forces):
         if len(finished_check) == disp_vector.shape[0]:
             finished_sim = True
 
+        if callback is not None:
+            callback(sweeps, max_change)
+
+    if info:
+        return disp_vector, {"iterations": sweeps, "converged": finished_sim}
     return (disp_vector)
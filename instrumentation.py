@@ -0,0 +1,149 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import json
+import time
+import tracemalloc
+try:
+    import resource
+except ImportError:
+    resource = None
+#----------------------------------------------------------------------------------------------------------------------#
+#Opt-in profiling of an analysis: per stage wall/CPU time and peak memory, metrics (matrix size, nnz, solver
+#iterations...), solver residual history and user callbacks. The analysis uses NULL_INSTRUMENTATION by default,
+#whose methods do nothing, so there is no cost when profiling is disabled
+
+#Events passed to the callbacks
+EVENTS = ["stage_start", "stage_end", "metric", "residual"]
+
+def peakRSS():
+    #Peak resident memory of the process in bytes (0 where the resource module is not available)
+    if resource is None:
+        return 0
+    #ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class Stage():
+    #Context manager timing one stage of the analysis, created by Instrumentation.stage
+    def __enter__(self):
+        self.owner.emit("stage_start", {"stage": self.name})
+        if self.owner.track_memory:
+            tracemalloc.reset_peak()
+            self.start_traced = tracemalloc.get_traced_memory()[0]
+        self.start_cpu = time.process_time()
+        self.start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        entry = {
+            "stage": self.name,
+            "wall": time.perf_counter() - self.start_wall,
+            "cpu": time.process_time() - self.start_cpu,
+            "peak_rss": peakRSS(),
+        }
+        if self.owner.track_memory:
+            #Peak Python/numpy allocation above the memory in use when the stage started
+            entry["peak_traced"] = tracemalloc.get_traced_memory()[1] - self.start_traced
+        self.owner.stages.append(entry)
+        self.owner.emit("stage_end", entry)
+        return False
+
+    def __init__(self,owner,name):
+        self.owner = owner
+        self.name = name
+
+class Instrumentation():
+    #Collects the profile of one analysis, export it with report() or exportReport(file)
+    def stage(self,name):
+        #Use as: with instrumentation.stage("assembly"): ...
+        return Stage(self, name)
+
+    def record(self,name,value):
+        #Store a metric (ie. "nnz", "num_free_dofs", "solver_iterations")
+        self.metrics[name] = value
+        self.emit("metric", {"name": name, "value": value})
+
+    def residual(self,iteration,norm):
+        #Store one entry of the solver residual history, can be passed directly as a solver callback
+        self.residual_history.append((int(iteration), float(norm)))
+        self.emit("residual", {"iteration": int(iteration), "norm": float(norm)})
+
+    def addCallback(self,function,events=None):
+        #Attach a user callback, called as function(event, data) for the given events (all events if None)
+        for event in (events or EVENTS):
+            if event not in EVENTS:
+                raise ValueError("Unknown event '%s', expected one of %s" % (event, EVENTS))
+            self.callbacks.setdefault(event, []).append(function)
+
+    def emit(self,event,data):
+        #Call the callbacks attached to an event
+        for function in self.callbacks.get(event, []):
+            function(event, data)
+
+    def report(self):
+        #Dictionary of everything collected, ready for json.dump
+        return {
+            "stages": self.stages,
+            "total_wall": sum(entry["wall"] for entry in self.stages),
+            "total_cpu": sum(entry["cpu"] for entry in self.stages),
+            "metrics": self.metrics,
+            "residual_history": self.residual_history,
+        }
+
+    def exportReport(self,file):
+        #Write the report to a .json file
+        with open(file, "w") as output:
+            json.dump(self.report(), output, indent=1, default=float)
+
+    def close(self):
+        #Stop memory tracing if this object started it
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def __init__(self,track_memory=False):
+        #track_memory traces Python/numpy allocations with tracemalloc to get the peak of each stage (slower),
+        #the peak resident memory of the process is always recorded
+        self.enabled = True
+        self.track_memory = track_memory
+        self.stages = []
+        self.metrics = {}
+        self.residual_history = []
+        self.callbacks = {}
+        self.started_tracing = False
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+class NullStage():
+    #Context manager that does nothing
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        return False
+
+class NullInstrumentation():
+    #Disabled instrumentation with the same methods as Instrumentation, used when profiling is off
+    enabled = False
+    null_stage = NullStage()
+
+    def stage(self,name):
+        return self.null_stage
+
+    def record(self,name,value):
+        pass
+
+    def residual(self,iteration,norm):
+        pass
+
+    def addCallback(self,function,events=None):
+        pass
+
+    def report(self):
+        return None
+
+#Shared disabled instance
+NULL_INSTRUMENTATION = NullInstrumentation()
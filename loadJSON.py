@@ -4,9 +4,222 @@
 #Mar 10, 2019
 #----------------------------------------------------------------------------------------------------------------------#
 import json
+import re
+import numpy as np
 #----------------------------------------------------------------------------------------------------------------------#
 
 class loadJSON():
     #Load the json file specified by user
     def __init__(self,file):
-        self.data = json.load(open(file))
\ No newline at end of file
+        self.data = json.load(open(file))
+
+#Whitespace, and the characters separating the numbers of a numeric array
+WHITESPACE = " \t\r\n"
+SEPARATORS = str.maketrans("[],\t\r\n", "      ")
+#Numbers, true, false and null outside of arrays
+SCALAR = re.compile(r"-?[0-9.][0-9.eE+-]*|true|false|null")
+
+class StreamingJSON():
+    #Reader of large legacy .json model files. The file is read in chunks and every array of numbers (any depth, ie.
+    #the "nodes" or "node_connections" lists) becomes one float numpy array parsed in bulk, without the intermediate
+    #nested python lists of json.load. Other values (objects, strings, lists of non-numbers) are read as usual
+    #Usage: data = StreamingJSON(file).data, same dictionary as loadJSON(file).data with numpy arrays for the lists
+    def fill(self):
+        #Drop the consumed text and read the next chunk, returns False at the end of the file
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def skip(self,characters):
+        #Index of the first character at or after position that is not in characters (reads more of the file as
+        #needed), len(buffer) at the end of the file
+        offset = 0
+        while True:
+            end = self.position + offset
+            while end < len(self.buffer) and self.buffer[end] in characters:
+                end = end + 1
+            if end < len(self.buffer):
+                return end
+            offset = end - self.position
+            if not self.fill():
+                return len(self.buffer)
+
+    def peek(self):
+        #Next non-whitespace character, consumes the whitespace, "" at the end of the file
+        self.position = self.skip(WHITESPACE)
+        return self.buffer[self.position:self.position + 1]
+
+    def expect(self,character):
+        if self.peek() != character:
+            raise ValueError("Expected '%s' at '%s'" % (character, self.buffer[self.position:self.position + 20]))
+        self.position = self.position + 1
+
+    def value(self):
+        #Parse the next value
+        character = self.peek()
+        if character == "{":
+            return self.object()
+        if character == "[":
+            return self.array()
+        if character == '"':
+            return self.string()
+        return self.scalar()
+
+    def object(self):
+        self.expect("{")
+        output = {}
+        if self.peek() == "}":
+            self.position = self.position + 1
+            return output
+        while True:
+            key = self.string()
+            self.expect(":")
+            output[key] = self.value()
+            if self.peek() == ",":
+                self.position = self.position + 1
+                continue
+            self.expect("}")
+            return output
+
+    def array(self):
+        #Arrays whose first element (after any nested brackets) is a number are parsed as numeric arrays
+        first = self.skip("[" + WHITESPACE)
+        if self.buffer[first:first + 1] in list("-.0123456789"):
+            return self.numericArray()
+        self.expect("[")
+        output = []
+        if self.peek() == "]":
+            self.position = self.position + 1
+            return output
+        while True:
+            output.append(self.value())
+            if self.peek() == ",":
+                self.position = self.position + 1
+                continue
+            self.expect("]")
+            return output
+
+    def countChildren(self,codes,depths,state):
+        #Number of entries of every array closed in a parsed piece of text: the commas at the depth of its entries
+        #between its brackets, plus 1. state[d] = [commas counted at depth d, count at the open bracket of the array
+        #still open at depth d, smallest and largest number of entries of the arrays of depth d]
+        #Only the brackets and commas of the text are looked at
+        structure = np.flatnonzero((codes == 44) | (codes == 91) | (codes == 93))
+        codes = codes[structure]
+        depths = depths[structure]
+        is_open = codes == 91
+        is_close = codes == 93
+        is_comma = codes == 44
+        for d in range(1, int(np.max(depths, initial=0)) + 2):
+            #Opening / closing brackets of the arrays whose entries are at depth d, and the commas between them
+            selected = (is_open & (depths == d)) | (is_close & (depths == d - 1)) | (is_comma & (depths == d))
+            if not np.any(selected):
+                continue
+            if d not in state:
+                state[d] = [0, None, None, None]
+            commas = state[d][0] + np.cumsum(is_comma[selected])
+            opens = commas[is_open[selected]]
+            closes = commas[is_close[selected]]
+            if state[d][1] is not None:
+                opens = np.concatenate([[state[d][1]], opens])
+            #Arrays at the same depth don't nest, every close bracket ends the array opened last
+            if closes.shape[0] > 0:
+                entries = closes - opens[:closes.shape[0]] + 1
+                low, high = int(np.min(entries)), int(np.max(entries))
+                state[d][2] = low if state[d][2] is None else min(state[d][2], low)
+                state[d][3] = high if state[d][3] is None else max(state[d][3], high)
+            state[d][1] = int(opens[closes.shape[0]]) if opens.shape[0] > closes.shape[0] else None
+            state[d][0] = int(commas[-1])
+
+    def numericArray(self):
+        #Parse a (nested) array of numbers chunk by chunk, its shape comes from the number of brackets at each depth
+        #and the entries of every array (a ragged array raises ValueError)
+        depth = 0
+        opened = np.zeros(1, dtype=np.int64)
+        children = {}
+        parts = []
+        while True:
+            #Depth after every character from the bracket positions (numeric text is ascii, so byte and character
+            #positions agree up to the end of the array)
+            codes = np.frombuffer(self.buffer[self.position:].encode(), dtype=np.uint8)
+            is_open = codes == 91
+            is_close = codes == 93
+            depths = depth + np.cumsum(is_open.astype(np.int64) - is_close)
+            closed = np.flatnonzero(is_close & (depths == 0))
+            if closed.shape[0] > 0:
+                end = self.position + int(closed[0]) + 1
+            else:
+                #The array continues in the next chunk: parse up to the last separator so no number is cut in two.
+                #Brackets are separators too, so every bracket counted is in the parsed text
+                end = max(self.buffer.rfind(character) for character in "[]," + WHITESPACE) + 1
+            count = max(end - self.position, 0)
+            if count > 0:
+                #opened[d]: number of arrays opened at depth d
+                level = depths[:count][is_open[:count]]
+                opened = np.pad(opened, (0, max(0, int(np.max(level, initial=0)) + 1 - opened.shape[0])))
+                opened = opened + np.bincount(level, minlength=opened.shape[0])
+                self.countChildren(codes[:count], depths[:count], children)
+                depth = int(depths[count - 1])
+                text = self.buffer[self.position:end].translate(SEPARATORS)
+                #fromstring gives [-1] for text without numbers
+                if not text.isspace():
+                    parts.append(np.fromstring(text, sep=" "))
+                self.position = end
+            if count > 0 and depth == 0:
+                break
+            if not self.fill():
+                raise ValueError("Unexpected end of file in an array")
+
+        values = np.concatenate(parts) if parts else np.zeros(0)
+        #Every array of depth d has shape[d - 1] entries, all of them arrays except at the deepest level
+        shape = [children[d][2] for d in range(1, len(opened))]
+        rectangular = all(children[d][2] == children[d][3] for d in range(1, len(opened)))
+        rectangular = rectangular and all(opened[d + 1] == opened[d] * shape[d - 1] for d in range(1, len(opened) - 1))
+        if not rectangular or int(np.prod(shape)) != values.shape[0]:
+            raise ValueError("Nested numeric array is not rectangular (the lists at a depth have different lengths)")
+        return values.reshape(shape)
+
+    def string(self):
+        #Parse a string with json (handles the escapes), the closing quote is the first one not escaped
+        if self.peek() != '"':
+            raise ValueError("Expected a string at '%s'" % self.buffer[self.position:self.position + 20])
+        offset = 1
+        while True:
+            end = self.buffer.find('"', self.position + offset)
+            if end < 0:
+                offset = len(self.buffer) - self.position
+                if not self.fill():
+                    raise ValueError("Unexpected end of file in a string")
+                continue
+            backslashes = 0
+            while self.buffer[end - 1 - backslashes] == "\\":
+                backslashes = backslashes + 1
+            if backslashes % 2 == 0:
+                break
+            offset = end + 1 - self.position
+        text = self.buffer[self.position:end + 1]
+        self.position = end + 1
+        return json.loads(text)
+
+    def scalar(self):
+        #Number, true, false or null outside of an array
+        match = SCALAR.match(self.buffer, self.position)
+        while match is None or match.end() == len(self.buffer):
+            if not self.fill():
+                break
+            match = SCALAR.match(self.buffer, self.position)
+        if match is None:
+            raise ValueError("Unexpected value at '%s'" % self.buffer[self.position:self.position + 20])
+        self.position = match.end()
+        return json.loads(match.group())
+
+    def __init__(self,file,chunk_size=2 ** 22):
+        #chunk_size: number of characters read at a time
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        with open(file) as self.stream:
+            self.data = self.value()
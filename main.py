@@ -4,83 +4,57 @@
 #Mar 10, 2019
 #------------------------------------------------IMPORTS---------------------------------------------------------------#
 #IMPORT other python files from this folder
+import sys
 from projectFunc import *
-from elementClass import *
-from nodeClass import *
-from gaussSeidel import *
-from loadJSON import *
+from trussAnalysis import *
+from trussPlot import *
 #---------------------------READ initial conditions from JSON dictionary using loadJSON.py-----------------------------#
+#The model file can be given on the command line: python main.py initialConditions5.json
+#For headless analysis of many files use batchRunner.py
 file = 'initialConditions5.json'
-IC = loadJSON(file).data["FEA"]
+if len(sys.argv) > 1:
+    file = sys.argv[1]
+IC = loadModel(file)
 
-#Initialize variables read in json file (elements, nodes, Youngs modulus, area, initial conditions)
-element_params = IC['element_params']
-element_connections = element_params["node_connections"]
-initial_nodes = IC['nodes']
-E = element_params["E"]
-D = element_params["D"]
+#Initialize variables read in json file (initial conditions)
 initial_displacement = IC['initial_conds']["displacement"]
-initial_force = IC["initial_conds"]["force"]
-initial_force = transformForce(initial_force)
+#A model may define a list of "load_cases" instead of a single "force" list {readLoadCases in projectFunc.py}
+load_cases = readLoadCases(IC["initial_conds"])
+initial_force = transformForce(load_cases[0])
 
-#Create list to hold all node objects
-nodes = []
-for i in range(0,len(initial_nodes)):
-    #Node {from nodeClass} object requires x,y coordinates and the current index to create
-    nodes.append(Node(initial_nodes[i],i))
+#Check the model before building it, a model that can't be solved (zero length or duplicate members, unsupported
+#rigid body motions, mechanisms...) stops here with a message naming the elements / nodes {modelValidation.py}
+validation = validateModel(IC)
+for warning in validation["warnings"]:
+    print("Warning: " + warning)
 
-#Find total number of nodes, used later to create augmented matrix with correct shape
-num_nodes = len(nodes)
+#Create the array backed truss model {buildModel in trussAnalysis.py}
+model = buildModel(IC)
 
-#Create a list to hold all element objects
-elements = []
-for i in range(0,len(element_connections)):
-    # For each element, create a Element object as seen in ElementClass.py and append to elements list
-    elements.append(Element(E[i],diaToArea(D[i]),nodes,element_connections[i]))
-    #Calculate the augmented matrix of the element and set its augMatrix variable {augmentMatrix in projectFunc.py}
-    elements[i].augMatrix = augmentMatrix(elements[i], num_nodes)
-
-#Create schematic view of truss to verify correct element, node, and force placements {plotTruss in projectFunc.py}
-plotTruss(nodes,elements,initial_displacement,initial_force)
+#Create schematic view of truss to verify correct element, node, and force placements {plotModel in trussPlot.py}
+#All elements are drawn as one line collection, element/node numbers are only written on small models
+plotModel(model,initial_displacement,initial_force)
 
 #If truss diagram is accurate, proceed with analysis
 proceed = input("Correct truss analysis? Type y to continue")
 if proceed != 'y':
     exit()
 
-#Combine all individual element augmented matrices together by matrix addition to form global stiffness matrix
-#{combineAugmented in projectFunc.py}
-globalStiffnessMatrix = combineAugmented(elements)
-
-#Condense global stiffness matrix to solve for non-zero displacements {using trimMatrix located in projectFunc.py}
-trimmedMatrix = trimMatrix(initial_displacement,globalStiffnessMatrix)
-#Remove entries in force vector corresponding to 0 displacement entries in displacement vector
-forceVector = trimMatrix(initial_displacement,initial_force,vector=True)
-#Remove the 0 displacement entries in displacement vector
-dispVector = trimMatrix(initial_displacement,initial_displacement,vector=True)
-
-#------------All vectors should now have compatible dimensions for solution using Gauss-Seidel method------------------------#
-#Iteratively calculate the matrix solution {uses calcGS function located in gaussSeidel.py}
-result_vector = calcGS(trimmedMatrix,dispVector,forceVector)
-
-#Add back 0 displacement entries that were previously deleted {recompileMatrix located in projectFunc.py}
-final_displacement = recompileMatrix(initial_displacement,result_vector)
-
-#Call {printTable in projectFunc.py} to print out the final displacements to console
-printTable("disp",final_displacement)
-
-calc_strains = calcStrain(elements,final_displacement)
-printTable("strain",calc_strains)
-
-#Calculate stresses, then print to console {calcStress in projectFunc.py}
-calc_stresses = calcStress(elements,final_displacement)
-printTable("stress",calc_stresses)
-
-#Calculate forces in the elements
-element_forces = calcElementForces(calc_stresses,D)
-printTable("e_force",element_forces)
-
-#Calculate reaction forces, print to console {reactionForces in projectFunc.py}
-react_forces = reactionForces(globalStiffnessMatrix,final_displacement)
-printTable("reaction",react_forces)
-
+#Assemble the sparse global stiffness matrix, condense it to the free dofs and solve every load case with the solver
+#selected by the optional "solver" entry of the model {analyzeModel in trussAnalysis.py}
+results = analyzeModel(IC,model=model)
+printTable("solver",results["solver"])
+
+#Call {printTable in projectFunc.py} to print out the results of each load case to console
+for case in range(0,results["num_cases"]):
+    if results["num_cases"] > 1:
+        print("Load case %d" % case)
+        print("\n")
+    #Convergence of every load step of a nonlinear analysis {nonlinearAnalysis.py}
+    if "load_steps" in results:
+        printTable("load_steps",results["load_steps"][case])
+    printTable("disp",results["displacement"][case])
+    printTable("strain",results["strain"][case])
+    printTable("stress",results["stress"][case])
+    printTable("e_force",results["element_force"][case])
+    printTable("reaction",results["reaction"][case])
@@ -0,0 +1,187 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import time
+import numpy as np
+from solverEngine import PIVOT_TOLERANCE
+#----------------------------------------------------------------------------------------------------------------------#
+#Matrix-free preconditioned conjugate gradient solver, K*u is applied element by element and no global stiffness
+#matrix is ever assembled. Each bar stiffness is k = EA/L * b*b^T with b = [-l,-m,l,m] (strain_matrix of the element),
+#so K*u = sum over elements of EA/L * b * (b . u_e)
+
+#Names of the matrix-free solvers and preconditioners
+MATRIX_FREE_SOLVERS = ["pcg"]
+PRECONDITIONERS = ["none", "jacobi", "block_jacobi"]
+#A search direction d with d.K.d below PIVOT_TOLERANCE {solverEngine.py} times d.diag(K).d is a mechanism of the model
+#(K is singular), the iterations stop there instead of diverging
+
+def applyStiffness(model,displacement):
+    #Return K*u for a full dof displacement vector using only the per element data of the TrussModel
+    element_disp = displacement[model.dofs]
+    axial = model.E * model.A / model.length * np.einsum("ej,ej->e", element_disp, model.strain_matrix)
+    contributions = axial[:, None] * model.strain_matrix
+    return np.bincount(model.dofs.ravel(), weights=contributions.ravel(), minlength=2 * model.num_nodes)
+
+def nodeBlocks(model,dof_map):
+    #2x2 diagonal blocks of K for every node (sum of k_e*[[l^2, lm],[lm, m^2]] of the elements at the node)
+    #Rows/columns of constrained dofs are replaced by the identity so only the free part is preconditioned
+    coefficient = model.E * model.A / model.length
+    l = model.cos
+    m = model.sin
+    block = np.empty((model.num_elements, 4))
+    block[:, 0] = coefficient * l * l
+    block[:, 1] = coefficient * l * m
+    block[:, 2] = block[:, 1]
+    block[:, 3] = coefficient * m * m
+
+    #Both end nodes of an element receive the same 2x2 block
+    blocks = np.zeros((model.num_nodes, 4))
+    for end in range(0, 2):
+        for entry in range(0, 4):
+            blocks[:, entry] += np.bincount(model.connectivity[:, end], weights=block[:, entry],
+                                            minlength=model.num_nodes)
+    blocks = blocks.reshape(model.num_nodes, 2, 2)
+
+    fixed = ~dof_map.free_mask.reshape(model.num_nodes, 2)
+    blocks[:, 0, 1] = np.where(fixed[:, 0] | fixed[:, 1], 0.0, blocks[:, 0, 1])
+    blocks[:, 1, 0] = blocks[:, 0, 1]
+    blocks[:, 0, 0] = np.where(fixed[:, 0], 1.0, blocks[:, 0, 0])
+    blocks[:, 1, 1] = np.where(fixed[:, 1], 1.0, blocks[:, 1, 1])
+    return blocks
+
+def preconditioner(model,dof_map,kind="block_jacobi"):
+    #Return a function applying the inverse of the chosen preconditioner to a residual of the free dofs
+    if kind not in PRECONDITIONERS:
+        raise ValueError("Unknown preconditioner '%s', expected one of %s" % (kind, PRECONDITIONERS))
+    if kind == "none":
+        return lambda residual: residual
+
+    blocks = nodeBlocks(model, dof_map)
+    if kind == "jacobi":
+        inverse_diagonal = 1.0 / blocks[:, [0, 1], [0, 1]].reshape(-1)[dof_map.free]
+        return lambda residual: inverse_diagonal * residual
+
+    #Block Jacobi: invert the 2x2 block of every node at once
+    inverse_blocks = np.linalg.inv(blocks)
+    def apply(residual):
+        full = np.zeros(dof_map.num_dofs)
+        full[dof_map.free] = residual
+        full = np.einsum("nij,nj->ni", inverse_blocks, full.reshape(-1, 2)).reshape(-1)
+        return full[dof_map.free]
+    return apply
+
+def calcPCG(model,dof_map,forces,initial=None,kind="block_jacobi",tolerance=1e-10,max_iter=None,callback=None):
+    #Preconditioned conjugate gradient for one right hand side of the free dofs
+    #Converges when ||f - K*u|| <= tolerance*||f||, initial is an optional starting vector of the free dofs (warm start)
+    #callback(iteration, residual_norm) is called after every iteration
+    #Returns the free dof solution and a dictionary with the iterations, convergence, residual history and whether the
+    #iterations stopped at a mechanism ("singular")
+    forces = np.asarray(forces, dtype=float)
+    if max_iter is None:
+        max_iter = max(10 * dof_map.num_free, 100)
+    apply_inverse = preconditioner(model, dof_map, kind)
+    full = np.zeros(dof_map.num_dofs)
+
+    def operator(free_values):
+        #K_ff*u_f, constrained dofs held at 0
+        full[dof_map.free] = free_values
+        full[dof_map.fixed] = 0.0
+        return applyStiffness(model, full)[dof_map.free]
+
+    diagonal = nodeBlocks(model, dof_map)[:, [0, 1], [0, 1]].reshape(-1)[dof_map.free]
+    solution = np.zeros(dof_map.num_free) if initial is None else np.array(initial, dtype=float)
+    residual = forces - operator(solution) if initial is not None else forces.copy()
+    force_norm = np.linalg.norm(forces)
+    target = tolerance * (force_norm if force_norm > 0 else 1.0)
+
+    residual_norm = np.linalg.norm(residual)
+    history = [float(residual_norm)]
+    z = apply_inverse(residual)
+    direction = z.copy()
+    rz = np.dot(residual, z)
+    iterations = 0
+    singular = False
+    while residual_norm > target and iterations < max_iter:
+        K_direction = operator(direction)
+        curvature = np.dot(direction, K_direction)
+        if curvature <= PIVOT_TOLERANCE * np.dot(direction, diagonal * direction):
+            singular = True
+            break
+        step = rz / curvature
+        solution += step * direction
+        residual -= step * K_direction
+        residual_norm = np.linalg.norm(residual)
+        iterations = iterations + 1
+        history.append(float(residual_norm))
+        if callback is not None:
+            callback(iterations, residual_norm)
+
+        z = apply_inverse(residual)
+        rz_new = np.dot(residual, z)
+        direction = z + (rz_new / rz) * direction
+        rz = rz_new
+
+    return solution, {"iterations": iterations, "converged": bool(residual_norm <= target),
+                      "residual_history": history, "singular": singular}
+
+def solveMatrixFree(model,dof_map,forces,initial=None,kind="block_jacobi",tolerance=1e-10,max_iter=None,callback=None):
+    #Solve the reduced system for a (free dofs) vector or (free dofs x cases) right hand side with matrix-free PCG
+    #initial is an optional warm start of the same shape (ie. the free dofs of a previous displacement field)
+    #Returns the solution and diagnostics in the same format as solveSystem {solverEngine.py}
+    forces = np.asarray(forces, dtype=float)
+    start = time.perf_counter()
+    columns = forces[:, None] if forces.ndim == 1 else forces
+    starts = None if initial is None else np.asarray(initial, dtype=float).reshape(columns.shape)
+
+    solution = np.empty(columns.shape)
+    iterations = 0
+    converged = True
+    singular = False
+    histories = []
+    residual_norm = 0.0
+    relative = 0.0
+    #Conjugate gradient has no factorization to share, every load case is iterated on its own
+    for case in range(0, columns.shape[1]):
+        case_initial = None if starts is None else starts[:, case]
+        solution[:, case], pcg_info = calcPCG(model, dof_map, columns[:, case], case_initial, kind, tolerance,
+                                              max_iter, callback)
+        iterations = max(iterations, pcg_info["iterations"])
+        converged = converged and pcg_info["converged"]
+        singular = singular or pcg_info["singular"]
+        histories.append(pcg_info["residual_history"])
+        force_norm = np.linalg.norm(columns[:, case])
+        residual_norm = max(residual_norm, pcg_info["residual_history"][-1])
+        relative = max(relative, pcg_info["residual_history"][-1] / (force_norm if force_norm > 0 else 1.0))
+
+    info = {
+        "method": "pcg",
+        "backend": "matrix_free_" + kind,
+        "residual_norm": residual_norm,
+        "relative_residual": relative,
+        "iterations": iterations,
+        "converged": converged,
+        "singular": singular,
+        "factor_time": 0.0,
+        "time": time.perf_counter() - start,
+        "residual_history": histories if forces.ndim == 2 else histories[0],
+    }
+    if forces.ndim == 1:
+        return solution[:, 0], info
+    return solution, info
+
+def reactionsMatrixFree(model,dof_map,displacement):
+    #Reaction forces (K*u at the constrained dofs, 0 at free dofs) of a full dof vector or (cases x dofs) array
+    displacement = np.asarray(displacement, dtype=float)
+    rows = displacement.reshape(-1, dof_map.num_dofs)
+    output = np.zeros(rows.shape)
+    for case in range(0, rows.shape[0]):
+        output[case, dof_map.fixed] = applyStiffness(model, rows[case])[dof_map.fixed]
+    return output.reshape(displacement.shape)
+
+def prescribedForces(model,dof_map):
+    #K_fc*u_c, the force at the free dofs caused by the prescribed support displacements
+    full = np.zeros(dof_map.num_dofs)
+    full[dof_map.fixed] = dof_map.prescribed
+    return applyStiffness(model, full)[dof_map.free]
@@ -0,0 +1,188 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import argparse
+import sys
+import time
+import numpy as np
+import scipy.linalg as la
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+from projectFunc import *
+from solverEngine import *
+from dofMap import *
+from instrumentation import *
+from modelValidation import *
+from trussAnalysis import buildModel, loadModel
+#----------------------------------------------------------------------------------------------------------------------#
+#Natural frequencies and mode shapes of a truss: K*phi = w^2 * M*phi on the free dofs
+#The mass of each element is density * A * L from the "density" entry of "element_params" (mass per volume, in units
+#consistent with E), the mass matrix is assembled with the same reduced dof numbering as the stiffness matrix:
+#   "lumped"      half of the element mass at each end node in x and y (diagonal M)
+#   "consistent"  m/6 * [[2I, I], [I, 2I]] of a linear bar (more accurate frequencies for the same mesh)
+#The modes nearest to the shift (0: the lowest modes) are found by Lanczos iterations (ARPACK eigsh) in shift-invert
+#mode, (K - shift*M) is factorized once by the direct solvers {Factorization in solverEngine.py}
+#Usage: python modalAnalysis.py model.json -k 6 --mass consistent --plot mode.png --mode 0
+
+MASS_TYPES = ["lumped", "consistent"]
+#Number of modes returned when the model has no "modes" entry
+DEFAULT_MODES = 6
+#Consistent mass matrix of a bar of unit mass, [[2I, I], [I, 2I]] / 6
+CONSISTENT_MASS = np.kron(np.array([[2.0, 1.0], [1.0, 2.0]]), np.eye(2)) / 6
+
+def elementMasses(model,density):
+    #Mass of every element, density * A * L
+    return np.asarray(density, dtype=float).reshape(model.num_elements) * model.A * model.length
+
+def assembleMass(model,dof_map,density,mass="lumped"):
+    #Free-free block M_ff of the lumped or consistent mass matrix {assembleReduced in projectFunc.py}
+    if mass not in MASS_TYPES:
+        raise ValueError("Unknown mass '%s', expected one of %s" % (mass, MASS_TYPES))
+    masses = elementMasses(model, density)
+    if mass == "lumped":
+        #Half of each element mass on every dof of its two nodes, summed over the elements of each node
+        nodal = np.bincount(model.dofs.ravel(), np.repeat(masses / 2, 4), minlength=dof_map.num_dofs)
+        return sp.diags(nodal[dof_map.free]).tocsr()
+    return assembleReduced(model, dof_map, masses[:, None, None] * CONSISTENT_MASS)[0]
+
+def solveModes(K_ff,M_ff,num_modes,shift=0.0,solver="auto",precision="double"):
+    #num_modes eigenpairs of K*phi = lambda*M*phi with lambda nearest to shift, in increasing order
+    #Systems up to DENSE_LIMIT dofs use the dense LAPACK solver, larger ones shift-invert Lanczos (ARPACK) on the
+    #factorization of K - shift*M. The vectors are mass normalized (phi^T M phi = 1)
+    #Returns the eigenvalues, the (free dofs x modes) vectors and a dictionary of diagnostics
+    start = time.perf_counter()
+    size = K_ff.shape[0]
+    num_modes = min(int(num_modes), size)
+    factor_time = 0.0
+    if size <= DENSE_LIMIT or num_modes >= size - 1:
+        values, vectors = la.eigh(K_ff.toarray(), M_ff.toarray())
+        nearest = np.sort(np.argsort(np.abs(values - shift), kind="stable")[:num_modes])
+        values, vectors = values[nearest], vectors[:, nearest]
+        method, backend = "dense", "lapack_eigh"
+    else:
+        #K - shift*M is indefinite above the lowest eigenvalue, only an unshifted K must be positive definite
+        factorization = Factorization((K_ff - shift * M_ff).tocsc(), solver, precision, definite=shift <= 0)
+        factor_time = factorization.factor_time
+        inverse = spla.LinearOperator((size, size), matvec=factorization.solve, dtype=float)
+        values, vectors = spla.eigsh(K_ff, k=num_modes, M=M_ff, sigma=shift, which="LM", OPinv=inverse)
+        order = np.argsort(values)
+        values, vectors = values[order], vectors[:, order]
+        method, backend = "shift_invert", factorization.kind
+
+    #Relative residual |K*phi - lambda*M*phi| / |K*phi| of the worst mode
+    stiffness = K_ff.dot(vectors)
+    residual = np.linalg.norm(stiffness - M_ff.dot(vectors) * values, axis=0)
+    scale = np.linalg.norm(stiffness, axis=0)
+    relative = residual / np.where(scale > 0, scale, 1.0)
+    info = {
+        "method": method,
+        "backend": backend,
+        "shift": float(shift),
+        "relative_residual": float(np.max(relative, initial=0.0)),
+        "factor_time": factor_time,
+        "time": time.perf_counter() - start,
+    }
+    return values, vectors, info
+
+def analyzeModes(IC,num_modes=None,mass=None,shift=None,solver=None,model=None,instrumentation=None,validation=None):
+    #Modal analysis of a model dictionary, the optional "modes", "mass", "shift", "solver", "precision" and
+    #"validation" entries of the model are used when the arguments are None
+    #Returns a dictionary: the frequencies of every mode (rad/s, Hz, period), the mass normalized mode shapes as a
+    #(modes x dofs) array in the full dof layout (0 at the supports, like recompileMatrix in projectFunc.py), the
+    #participation factors and effective masses of every mode in x and y and the solver diagnostics
+    if instrumentation is None:
+        instrumentation = NULL_INSTRUMENTATION
+    num_modes = IC.get("modes", DEFAULT_MODES) if num_modes is None else num_modes
+    mass = IC.get("mass", "lumped") if mass is None else mass
+    shift = IC.get("shift", 0.0) if shift is None else shift
+    solver = IC.get("solver", "auto") if solver is None else solver
+    validation = IC.get("validation", "basic") if validation is None else validation
+    if mass not in MASS_TYPES:
+        raise ValueError("Unknown mass '%s', expected one of %s" % (mass, MASS_TYPES))
+    if solver not in SOLVERS or solver == "gauss_seidel":
+        direct = [name for name in SOLVERS if name != "gauss_seidel"]
+        raise ValueError("The modal analysis needs a direct solver, expected one of %s" % direct)
+    if "density" not in IC["element_params"]:
+        raise ModelValidationError('The modal analysis needs the "density" of every element in "element_params"',
+                                   "schema")
+
+    if model is None:
+        if validation != "none":
+            with instrumentation.stage("validate"):
+                validateModel(IC)
+        with instrumentation.stage("element_build"):
+            model = buildModel(IC)
+    with instrumentation.stage("dof_map"):
+        dof_map = DofMap(IC["initial_conds"]["displacement"])
+    with instrumentation.stage("assembly"):
+        K_ff = assembleReduced(model, dof_map)[0]
+        M_ff = assembleMass(model, dof_map, IC["element_params"]["density"], mass)
+    instrumentation.record("num_free_dofs", dof_map.num_free)
+    instrumentation.record("nnz", int(K_ff.nnz))
+    with instrumentation.stage("solve"):
+        try:
+            values, vectors, info = solveModes(K_ff, M_ff, num_modes, shift, solver, IC.get("precision", "double"))
+        except SingularMatrixError as error:
+            raise explainSingular(K_ff, dof_map, error=error)
+    info["mass"] = mass
+    instrumentation.record("solver_backend", info["backend"])
+    instrumentation.record("relative_residual", info["relative_residual"])
+
+    #Participation of every mode in a rigid translation r of the free dofs in x and y: gamma = phi^T M r, the
+    #effective masses gamma^2 add up to the free mass r^T M r over all modes
+    directions = np.zeros((dof_map.num_free, 2))
+    directions[np.arange(dof_map.num_free), dof_map.free % 2] = 1.0
+    participation = vectors.T.dot(M_ff.dot(directions))
+    mode_shape = np.zeros((values.shape[0], dof_map.num_dofs))
+    mode_shape[:, dof_map.free] = vectors.T
+    #Round off can leave an eigenvalue near 0 (or below a shift) slightly negative
+    angular = np.sqrt(np.maximum(values, 0.0))
+    return {
+        "num_nodes": model.num_nodes,
+        "num_elements": model.num_elements,
+        "num_modes": values.shape[0],
+        "eigenvalue": values,
+        "angular_frequency": angular,
+        "frequency": angular / (2 * np.pi),
+        "period": np.where(angular > 0, 2 * np.pi / np.where(angular > 0, angular, 1.0), np.inf),
+        "mode_shape": mode_shape,
+        "participation": participation,
+        "effective_mass": participation ** 2,
+        "total_mass": np.sum(directions * M_ff.dot(directions), axis=0),
+        "solver": info,
+    }
+
+def main(argv=None):
+    #Command line interface: print the frequencies of a model file and optionally plot one mode shape
+    parser = argparse.ArgumentParser(description="Natural frequencies and mode shapes of a truss model")
+    parser.add_argument("model", help=".json or .npz model file with a \"density\" entry in \"element_params\"")
+    parser.add_argument("-k", "--modes", type=int, default=None, help="number of modes (default: %d)" % DEFAULT_MODES)
+    parser.add_argument("--mass", default=None, choices=MASS_TYPES, help="mass matrix (default: lumped)")
+    parser.add_argument("--shift", type=float, default=None, help="find the modes with w^2 nearest to this value")
+    parser.add_argument("--plot", default=None, metavar="FILE", help="save a plot of one mode shape")
+    parser.add_argument("--mode", type=int, default=0, help="mode plotted by --plot")
+    args = parser.parse_args(argv)
+
+    IC = loadModel(args.model)
+    #Validate before building like main.py, analyzeModes doesn't check a model it is given
+    if IC.get("validation", "basic") != "none":
+        for warning in validateModel(IC)["warnings"]:
+            print("Warning: " + warning)
+    model = buildModel(IC)
+    results = analyzeModes(IC, args.modes, args.mass, args.shift, model=model)
+    printTable("solver", results["solver"])
+    print("Mode  Frequency (Hz)  Period (s)  Effective mass x  Effective mass y")
+    for i in range(0, results["num_modes"]):
+        print("%4d  %14.6g  %10.4g  %16.4g  %16.4g" % (i, results["frequency"][i], results["period"][i],
+                                                    results["effective_mass"][i, 0], results["effective_mass"][i, 1]))
+    if args.plot:
+        from trussPlot import plotModel
+        plotModel(model, IC["initial_conds"]["displacement"], displacement=results["mode_shape"][args.mode],
+                  title="Mode %d: %.4g Hz" % (args.mode, results["frequency"][args.mode]), filename=args.plot)
+        print("Wrote %s" % args.plot)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import argparse
+import json
+import struct
+import sys
+import zipfile
+import numpy as np
+from loadJSON import *
+from resultCache import jsonDefault
+#----------------------------------------------------------------------------------------------------------------------#
+#Binary model / result files: an uncompressed .npz (zip of .npy arrays) with one array per list of the .json schema,
+#ie. "nodes", "element_params/E", "initial_conds/displacement", and the other values (solver options...) as json
+#The members are stored without compression, so each array is memory mapped straight from the file: nothing is
+#parsed or copied when loading, pages are only read when used and TrussModel {trussModel.py} uses the arrays as is
+#Usage: python modelFormat.py model.json model.npz        (converts with the streaming json reader {loadJSON.py})
+
+#Lists of the schema stored as int64, every other numeric list is stored as float64
+INTEGER_FIELDS = ["element_params/node_connections", "initial_conds/displacement"]
+#Name of the member holding the non-array values as json
+METADATA = "metadata"
+
+def flattenModel(data,prefix=""):
+    #Split a nested model dictionary into {"path/of/list": array} and a dictionary of the other values
+    arrays = {}
+    metadata = {}
+    for key, value in data.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            sub_arrays, sub_metadata = flattenModel(value, name + "/")
+            arrays.update(sub_arrays)
+            if sub_metadata or not sub_arrays:
+                metadata[key] = sub_metadata
+            continue
+        if isinstance(value, (list, np.ndarray)):
+            try:
+                array = np.asarray(value)
+            except ValueError:
+                #Ragged lists stay json
+                array = np.zeros(0)
+            if array.dtype.kind in "iuf" and array.size > 0:
+                integer = any(name.endswith(field) for field in INTEGER_FIELDS)
+                arrays[name] = np.ascontiguousarray(array, dtype=np.int64 if integer else float)
+                continue
+        metadata[key] = value.tolist() if isinstance(value, np.ndarray) else value
+    return arrays, metadata
+
+def nestModel(arrays,metadata):
+    #Inverse of flattenModel
+    data = json.loads(json.dumps(metadata))
+    for name, array in arrays.items():
+        level = data
+        path = name.split("/")
+        for key in path[:-1]:
+            level = level.setdefault(key, {})
+        level[path[-1]] = array
+    return data
+
+def writeArrays(file,arrays,metadata):
+    #Uncompressed .npz of the arrays with the metadata member
+    np.savez(file, **dict(arrays, **{METADATA: np.array(json.dumps(metadata, default=jsonDefault))}))
+
+def memberArray(file,archive,info,mmap):
+    #Array of one .npy member, memory mapped (copy on write, changes are never written to the file) when the member
+    #is stored without compression, read normally otherwise
+    if not mmap or info.compress_type != zipfile.ZIP_STORED:
+        with archive.open(info) as member:
+            return np.lib.format.read_array(member, allow_pickle=False)
+    with open(file, "rb") as stream:
+        #The data starts after the local file header, whose name/extra lengths can differ from the central directory
+        stream.seek(info.header_offset)
+        header = stream.read(30)
+        name_length, extra_length = struct.unpack("<HH", header[26:30])
+        stream.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(stream)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+        offset = stream.tell()
+    if dtype.hasobject:
+        raise ValueError("Object arrays are not supported in model files")
+    if int(np.prod(shape)) == 0 or dtype.kind == "U":
+        with archive.open(info) as member:
+            return np.lib.format.read_array(member, allow_pickle=False)
+    return np.memmap(file, dtype=dtype, mode="c", offset=offset, shape=shape, order="F" if fortran_order else "C")
+
+def readArrays(file,mmap=True):
+    #{name: array} and the metadata dictionary of a file written by writeArrays
+    arrays = {}
+    metadata = {}
+    with zipfile.ZipFile(file) as archive:
+        for info in archive.infolist():
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            array = memberArray(file, archive, info, mmap)
+            if name == METADATA:
+                metadata = json.loads(str(array))
+            else:
+                arrays[name] = array
+    return arrays, metadata
+
+def writeBinaryModel(data,file):
+    #Write a model dictionary ({"FEA": {...}} or the "FEA" dictionary itself) to a binary model file
+    if "FEA" not in data:
+        data = {"FEA": data}
+    arrays, metadata = flattenModel(data)
+    writeArrays(file, arrays, metadata)
+
+def loadBinaryModel(file,mmap=True):
+    #Read a binary model file, the lists of the .json schema are (memory mapped) numpy arrays
+    #Returns the same dictionary as loadJSON(file).data
+    return nestModel(*readArrays(file, mmap))
+
+def writeBinaryResults(results,file):
+    #Write a result dictionary of analyzeModel {trussAnalysis.py}: arrays as members, the rest (solver information...)
+    #as json metadata
+    arrays = dict((name, np.asarray(value)) for name, value in results.items() if isinstance(value, np.ndarray))
+    metadata = dict((name, value) for name, value in results.items() if not isinstance(value, np.ndarray))
+    writeArrays(file, arrays, metadata)
+
+def loadBinaryResults(file,mmap=True):
+    #Read a result file written by writeBinaryResults
+    arrays, metadata = readArrays(file, mmap)
+    metadata.update(arrays)
+    return metadata
+
+def convertModel(json_file,binary_file,chunk_size=2 ** 22):
+    #Convert a .json model file to a binary model file without loading it as python lists {StreamingJSON in loadJSON.py}
+    writeBinaryModel(StreamingJSON(json_file, chunk_size).data, binary_file)
+
+def main(argv=None):
+    #Command line interface of the converter
+    parser = argparse.ArgumentParser(description="Convert a .json truss model file to the binary .npz model format")
+    parser.add_argument("input", help=".json model file")
+    parser.add_argument("output", help=".npz model file to write")
+    args = parser.parse_args(argv)
+    convertModel(args.input, args.output)
+    print("Wrote %s" % args.output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+from scipy.sparse.csgraph import connected_components
+from projectFunc import diaToArea
+from nodeOrdering import nodeGraph
+from solverEngine import PIVOT_TOLERANCE
+#----------------------------------------------------------------------------------------------------------------------#
+#Checks of a model dictionary before it is built and solved, so a model that can never solve fails at once with a
+#message naming the elements / nodes at fault instead of dividing by zero lengths or sweeping a singular matrix
+#validateModel runs in linear time on the arrays of the model (except the sort of the duplicate member check,
+#O(n log n)): shapes and index ranges, sections, zero length members, unconnected nodes, supports against the rigid
+#body motions of every connected part, nodes whose members are all collinear and a count of members against free
+#dofs. Duplicate members are only a warning (parallel bars are a valid model). The mechanisms the counts can't see
+#are found by the pivots of the factorization of K_ff {Factorization in solverEngine.py}, checkPivots names their
+#dofs (and runs before the solve with the "full" level)
+
+#Levels of the "validation" option of analyzeModel {trussAnalysis.py}: "full" adds checkPivots to the basic checks
+VALIDATION_LEVELS = ["none", "basic", "full"]
+#Members shorter than this fraction of the model size have zero length
+LENGTH_TOLERANCE = 1e-9
+#Stiffness / support blocks with a smallest to largest eigenvalue ratio below this are singular
+RANK_TOLERANCE = 1e-9
+#checkPivots factorizes K_ff + PIVOT_SHIFT*diag(K_ff), pivots below PIVOT_TOLERANCE {solverEngine.py} times their
+#diagonal are singular
+PIVOT_SHIFT = 1e-12
+#Most numbers written in a message
+LISTED = 10
+
+class ModelValidationError(ValueError):
+    #Raised by validateModel / checkPivots. problem is the name of the failed check ("zero_length", "rigid_body"...)
+    #and items the numbers of the elements or nodes at fault (the message says which)
+    def __reduce__(self):
+        #Keep problem and items when the error is sent to another process
+        return (ModelValidationError, (str(self), self.problem, self.items))
+
+    def __init__(self,message,problem,items=None):
+        ValueError.__init__(self, message)
+        self.problem = problem
+        self.items = [] if items is None else [int(item) for item in items]
+
+def listItems(items):
+    #"3, 7, 12 and 5 more" of a list of numbers
+    items = [str(int(item)) for item in items]
+    if len(items) > LISTED:
+        return "%s and %d more" % (", ".join(items[:LISTED]), len(items) - LISTED)
+    return ", ".join(items)
+
+def entryArray(IC,path):
+    #float array of the model entry at path ("element_params/E"), the entry must exist and be a rectangular list
+    value = IC
+    for key in path.split("/"):
+        if not isinstance(value, dict) or key not in value:
+            raise ModelValidationError('The model has no "%s" entry' % path, "schema")
+        value = value[key]
+    try:
+        return np.asarray(value, dtype=float)
+    except (TypeError, ValueError):
+        raise ModelValidationError('"%s" is not a rectangular list of numbers' % path, "schema")
+
+def checkShape(array,shape,path,description):
+    #shape may hold None for any size
+    if array.ndim != len(shape) or any(size not in (None, actual) for size, actual in zip(shape, array.shape)):
+        raise ModelValidationError('"%s" must be %s, got an array of shape %s' % (path, description, array.shape),
+                                   "schema")
+
+def checkFinite(array,path,problem,name):
+    #Entries of the first axis holding nan / inf values
+    bad = np.flatnonzero(~np.all(np.isfinite(array.reshape(array.shape[0], -1)), axis=1))
+    if bad.shape[0] > 0:
+        raise ModelValidationError('%s %s of "%s" are not finite numbers' % (name, listItems(bad), path), problem, bad)
+
+def rigidBodyText(mode,scale,center):
+    #Description of a rigid body motion (a, b, c) = x translation, y translation, rotation in scaled coordinates
+    a, b, c = mode
+    if abs(c) <= 1e-6 * np.linalg.norm(mode):
+        if abs(b) <= 1e-6 * abs(a):
+            return "translation in x"
+        if abs(a) <= 1e-6 * abs(b):
+            return "translation in y"
+        return "translation along (%.3g, %.3g)" % (a, b)
+    #The velocity (a - c*y, b + c*x) is zero at the center of rotation
+    point = center + scale * np.array([-b / c, a / c])
+    point[np.abs(point) <= 1e-9 * scale] = 0.0
+    return "rotation about (%.6g, %.6g)" % (point[0], point[1])
+
+def validateModel(IC):
+    #Linear time checks of a model dictionary (the "FEA" entry of a model file), raises ModelValidationError on the
+    #first problem found. Returns a report: sizes, number of connected parts, redundancy (members - free dofs, the
+    #degree of static indeterminacy of a stable truss) and warnings about problems that don't stop the solve
+    warnings = []
+    coords = entryArray(IC, "nodes")
+    checkShape(coords, (None, 2), "nodes", "a list of [x, y] node coordinates")
+    checkFinite(coords, "nodes", "nodes", "Nodes")
+    num_nodes = coords.shape[0]
+
+    connections = entryArray(IC, "element_params/node_connections")
+    if connections.size == 0:
+        connections = connections.reshape(0, 2)
+    checkShape(connections, (None, 2), "element_params/node_connections", "a list of [start, end] node numbers")
+    num_elements = connections.shape[0]
+    bad = np.flatnonzero(np.any((connections != np.floor(connections)) | (connections < 0) |
+                                (connections >= num_nodes) | ~np.isfinite(connections), axis=1))
+    if bad.shape[0] > 0:
+        raise ModelValidationError("Elements %s connect node numbers that are not in 0..%d" %
+                                   (listItems(bad), num_nodes - 1), "node_index", bad)
+    connectivity = connections.astype(np.int64)
+
+    #The optional mass density of the elements is only used by the modal analysis {modalAnalysis.py}
+    names = ("E", "D", "density") if "density" in IC.get("element_params", {}) else ("E", "D")
+    for name in names:
+        path = "element_params/" + name
+        values = entryArray(IC, path)
+        checkShape(values, (num_elements,), path, "one value per element (%d)" % num_elements)
+        bad = np.flatnonzero(~(values > 0) | ~np.isfinite(values))
+        if bad.shape[0] > 0:
+            raise ModelValidationError("Elements %s have %s <= 0 or not a finite number (no %s)" %
+                                       (listItems(bad), name, "mass" if name == "density" else "stiffness"),
+                                       "section", bad)
+    E = entryArray(IC, "element_params/E")
+    A = diaToArea(entryArray(IC, "element_params/D"))
+
+    flags = entryArray(IC, "initial_conds/displacement")
+    checkShape(flags, (num_nodes, 2), "initial_conds/displacement", "one [x, y] flag pair per node (%d)" % num_nodes)
+    free = flags != 0
+    load_path = "initial_conds/load_cases" if "load_cases" in IC.get("initial_conds", {}) else "initial_conds/force"
+    loads = entryArray(IC, load_path)
+    if load_path.endswith("force"):
+        loads = loads[None]
+    checkShape(loads, (None, num_nodes, 2), load_path, "one [force, angle] pair per node (%d) in every load case" %
+               num_nodes)
+    checkFinite(loads, load_path, "loads", "Load cases")
+    if "support_displacement" in IC["initial_conds"]:
+        settlement = entryArray(IC, "initial_conds/support_displacement")
+        checkShape(settlement, (num_nodes, 2), "initial_conds/support_displacement", "one [x, y] pair per node")
+        checkFinite(settlement, "initial_conds/support_displacement", "supports", "Nodes")
+
+    #Members: zero length and the same pair of nodes connected twice (parallel bars, their stiffnesses add up)
+    delta = coords[connectivity[:, 1]] - coords[connectivity[:, 0]]
+    length = np.hypot(delta[:, 0], delta[:, 1])
+    size = float(np.max(np.ptp(coords, axis=0))) if num_nodes > 0 else 0.0
+    bad = np.flatnonzero(length <= LENGTH_TOLERANCE * size)
+    if bad.shape[0] > 0:
+        raise ModelValidationError("Elements %s have zero length (their end nodes are at the same position)" %
+                                   listItems(bad), "zero_length", bad)
+    pairs = np.sort(connectivity, axis=1)
+    key = pairs[:, 0] * num_nodes + pairs[:, 1]
+    order = np.argsort(key, kind="stable")
+    repeated = np.flatnonzero(key[order][1:] == key[order][:-1])
+    if repeated.shape[0] > 0:
+        first, second = order[repeated], order[repeated + 1]
+        text = ", ".join("element %d = element %d (nodes %d-%d)" % (second[i], first[i], pairs[first[i], 0],
+                                                                    pairs[first[i], 1])
+                         for i in range(0, min(LISTED, first.shape[0])))
+        warnings.append("Duplicate members connect the same nodes: %s%s" %
+                        (text, " ..." if first.shape[0] > LISTED else ""))
+
+    #Nodes no element touches have no stiffness at all, they are only allowed when both of their dofs are fixed
+    degree = np.bincount(connectivity.reshape(-1), minlength=num_nodes)
+    unconnected = degree == 0
+    bad = np.flatnonzero(unconnected & np.any(free, axis=1))
+    if bad.shape[0] > 0:
+        raise ModelValidationError("Nodes %s are not connected to any element but have free dofs" % listItems(bad),
+                                   "unconnected_node", bad)
+    if np.any(unconnected):
+        warnings.append("Nodes %s are not connected to any element (fully fixed, ignored)" %
+                        listItems(np.flatnonzero(unconnected)))
+
+    #Connected parts of the truss, every part must be supported on its own
+    num_parts, part = connected_components(nodeGraph(connectivity, num_nodes), directed=False)
+    part_elements = np.bincount(part[connectivity[:, 0]], minlength=num_parts)
+    used = part_elements > 0
+    if np.count_nonzero(used) > 1:
+        warnings.append("The truss has %d parts that no element connects" % np.count_nonzero(used))
+
+    #Rigid body motions (x translation, y translation, rotation) of each part left free by its supports: a fixed x
+    #dof at (x, y) blocks the motions with a - c*y = 0, a fixed y dof those with b + c*x = 0. The 3x3 matrix
+    #G = sum r*r^T of these rows is singular exactly when a motion is left free (coordinates are taken about the
+    #center of the part and scaled by its size so G is well conditioned)
+    count = np.bincount(part, minlength=num_parts)
+    center = np.column_stack([np.bincount(part, coords[:, 0], num_parts),
+                              np.bincount(part, coords[:, 1], num_parts)]) / count[:, None]
+    relative = coords - center[part]
+    scale = np.sqrt(np.bincount(part, np.sum(relative ** 2, axis=1), num_parts) / count)
+    scale[scale == 0] = 1.0
+    x = relative[:, 0] / scale[part]
+    y = relative[:, 1] / scale[part]
+    fixed_x = (~free[:, 0]).astype(float)
+    fixed_y = (~free[:, 1]).astype(float)
+    G = np.zeros((num_parts, 3, 3))
+    G[:, 0, 0] = np.bincount(part, fixed_x, num_parts)
+    G[:, 1, 1] = np.bincount(part, fixed_y, num_parts)
+    G[:, 0, 2] = G[:, 2, 0] = np.bincount(part, -fixed_x * y, num_parts)
+    G[:, 1, 2] = G[:, 2, 1] = np.bincount(part, fixed_y * x, num_parts)
+    G[:, 2, 2] = np.bincount(part, fixed_x * y ** 2 + fixed_y * x ** 2, num_parts)
+    eigenvalues, eigenvectors = np.linalg.eigh(G)
+    trace = np.maximum(np.trace(G, axis1=1, axis2=2), 1.0)
+    num_modes = np.sum(eigenvalues <= RANK_TOLERANCE * trace[:, None], axis=1)
+    bad = np.flatnonzero(used & (num_modes > 0))
+    if bad.shape[0] > 0:
+        first = bad[0]
+        if num_modes[first] == 1:
+            motion = rigidBodyText(eigenvectors[first, :, 0], scale[first], center[first])
+        else:
+            motion = [name for name, fixed in (("translation in x", G[first, 0, 0]), ("translation in y",
+                      G[first, 1, 1])) if fixed == 0]
+            motion = ", ".join(motion + ["rotation"] * (num_modes[first] - len(motion)))
+        nodes = np.flatnonzero(part == first)
+        raise ModelValidationError("The supports don't hold the truss: the part made of nodes %s can move as a rigid "
+                                   "body (%s)%s" % (listItems(nodes), motion, " (%d more unsupported parts)" %
+                                                    (bad.shape[0] - 1) if bad.shape[0] > 1 else ""),
+                                   "rigid_body", nodes)
+
+    #Nodes whose members are all collinear have no stiffness across them: the 2x2 block of the free dofs of the
+    #node (sum of EA/L*[l^2, lm; lm, m^2] of its members) is singular
+    stiffness = E * A / length
+    l = delta[:, 0] / length
+    m = delta[:, 1] / length
+    ends = connectivity.reshape(-1)
+    block_xx = np.bincount(ends, np.repeat(stiffness * l * l, 2), num_nodes)
+    block_xy = np.bincount(ends, np.repeat(stiffness * l * m, 2), num_nodes)
+    block_yy = np.bincount(ends, np.repeat(stiffness * m * m, 2), num_nodes)
+    trace = block_xx + block_yy
+    singular = np.where(free[:, 0] & free[:, 1], block_xx * block_yy - block_xy ** 2 <= RANK_TOLERANCE * trace ** 2,
+                        (free[:, 0] & (block_xx <= RANK_TOLERANCE * trace)) |
+                        (free[:, 1] & (block_yy <= RANK_TOLERANCE * trace)))
+    bad = np.flatnonzero(singular & ~unconnected)
+    if bad.shape[0] > 0:
+        raise ModelValidationError("Nodes %s have no stiffness in a free direction: their members are all collinear "
+                                   "(or perpendicular to the free dof)" % listItems(bad), "unstable_node", bad)
+
+    #A stable part needs at least as many members as free dofs
+    part_free = np.bincount(part, np.sum(free, axis=1), num_parts)
+    bad = np.flatnonzero(used & (part_elements < part_free))
+    if bad.shape[0] > 0:
+        first = bad[0]
+        nodes = np.flatnonzero(part == first)
+        raise ModelValidationError("The part made of nodes %s is a mechanism: %d free dofs but only %d elements" %
+                                   (listItems(nodes), part_free[first], part_elements[first]), "mechanism", nodes)
+
+    return {
+        "num_nodes": num_nodes,
+        "num_elements": num_elements,
+        "num_cases": loads.shape[0],
+        "num_free_dofs": int(np.count_nonzero(free)),
+        "num_parts": int(np.count_nonzero(used)),
+        "redundancy": int(num_elements - np.count_nonzero(free)),
+        "warnings": warnings,
+    }
+
+def checkPivots(K_ff,dof_map,node_numbers=None):
+    #Rank check of the assembled free-free block {assembleReduced in projectFunc.py}: symmetric SuperLU factorization
+    #(pivots on the diagonal) of K_ff + PIVOT_SHIFT*diag(K_ff). A dof whose pivot is tiny next to its diagonal entry
+    #depends on the dofs eliminated before it, ie. the model has a mechanism there. The shift keeps an exactly
+    #singular matrix factorizable so those dofs can be named
+    #node_numbers: original number of each node when the model was renumbered {nodeOrdering.py}
+    #Returns the smallest pivot ratio, raises ModelValidationError when it is below PIVOT_TOLERANCE
+    if K_ff.shape[0] == 0:
+        return 1.0
+    diagonal = K_ff.diagonal()
+    scale = np.where(diagonal > 0, diagonal, 1.0)
+    matrix = sp.csc_matrix(K_ff + sp.diags(PIVOT_SHIFT * scale))
+    factor = spla.splu(matrix, permc_spec="MMD_AT_PLUS_A", diag_pivot_thresh=0.0, options={"SymmetricMode": True})
+    #Pivot j of U belongs to the free dof with perm_c[dof] = j (row and column permutations agree with diagonal
+    #pivoting)
+    dofs = np.argsort(factor.perm_c)
+    ratio = np.abs(factor.U.diagonal()) / scale[dofs]
+    ratio[diagonal[dofs] <= 0] = 0.0
+    bad = np.sort(dofs[ratio <= PIVOT_TOLERANCE])
+    if bad.shape[0] > 0:
+        global_dofs = dof_map.free[bad]
+        nodes = global_dofs // 2
+        if node_numbers is not None:
+            nodes = np.asarray(node_numbers)[nodes]
+        names = ["%d%s" % (node, "xy"[dof % 2]) for node, dof in zip(nodes, global_dofs)]
+        raise ModelValidationError("The stiffness matrix is singular, mechanism at the free dofs %s%s (node number and "
+                                   "direction)" % (", ".join(names[:LISTED]), " ..." if len(names) > LISTED else ""),
+                                   "singular", np.unique(nodes))
+    return float(np.min(ratio))
+
+def explainSingular(K_ff,dof_map,node_numbers=None,error=None):
+    #ModelValidationError of a K_ff whose factorization failed {SingularMatrixError in solverEngine.py}: the one of
+    #checkPivots naming the dofs, or a general one if the shifted factorization doesn't find them
+    try:
+        checkPivots(K_ff, dof_map, node_numbers)
+    except ModelValidationError as named:
+        return named
+    return ModelValidationError("The stiffness matrix is singular (%s)" % error, "singular")
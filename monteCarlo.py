@@ -0,0 +1,371 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import scipy.sparse as sp
+from projectFunc import *
+from solverEngine import *
+from dofMap import *
+from modelValidation import *
+from trussAnalysis import loadModel, buildModel, resultsToJSON
+#----------------------------------------------------------------------------------------------------------------------#
+#Monte Carlo analysis of a model with random scatter of E, D and the load magnitudes / angles
+#Usage: python monteCarlo.py initialConditions5.json -n 10000 --cov-E 0.05 --cov-D 0.03 --cov-force 0.1 -o mc.json
+#The geometry is the same for every sample, so each bar stiffness is k = E*A/L * b*b^T with only E*A/L random:
+#the stiffness matrices of a whole chunk of samples are built by one scatter of the (samples x elements) E*A/L values
+#and solved together, batched dense solves for small models or one block diagonal sparse factorization otherwise.
+#Chunks are sized to a memory budget and run across a process pool, each returns running statistics which are merged,
+#so the raw results of every sample are never kept. The quantile reservoirs count in the budget: they are only kept
+#for the displacements, stresses and element forces and take at most RESERVOIR_SHARE of it
+
+#Largest number of free dofs solved as a stack of dense matrices, larger models use the block diagonal sparse solve
+DENSE_BATCH_LIMIT = 300
+#Assumed fill of the sparse factorization (factor nonzeros / matrix nonzeros) when sizing the chunks
+SPARSE_FILL = 10
+#Quantiles reported from the reservoir samples
+QUANTILES = [0.01, 0.05, 0.5, 0.95, 0.99]
+#Largest fraction of the memory budget used by the reservoirs of the totals, a smaller reservoir is kept otherwise
+RESERVOIR_SHARE = 0.5
+#Largest number of samples in a chunk, so a run is split into chunks for the workers whatever its memory budget
+MAX_CHUNK_SAMPLES = 500
+
+def lognormalSample(rng,nominal,cov,shape):
+    #Positive random values with mean nominal and coefficient of variation cov (nominal if cov is 0)
+    if not cov:
+        return np.broadcast_to(nominal, shape).astype(float)
+    sigma = np.sqrt(np.log(1.0 + cov ** 2))
+    return nominal * np.exp(rng.normal(-sigma ** 2 / 2, sigma, shape))
+
+class RunningStatistics():
+    #Mean, variance (Welford / Chan merge), min, max, threshold exceedance counts and a bounded reservoir sample
+    #(for the quantiles) of an array quantity, updated one chunk of samples at a time
+    #reservoir_size 0 keeps no reservoir (quantities without quantiles)
+    def update(self,values,exceeded=None):
+        #values: (samples x ...) array of a chunk, exceeded: optional boolean array of the same shape
+        values = np.asarray(values, dtype=float)
+        count = values.shape[0]
+        if count == 0:
+            return
+        chunk = RunningStatistics(values.shape[1:], self.reservoir_size, self.rng)
+        chunk.count = count
+        chunk.mean = values.mean(axis=0)
+        chunk.M2 = ((values - chunk.mean) ** 2).sum(axis=0)
+        chunk.minimum = values.min(axis=0)
+        chunk.maximum = values.max(axis=0)
+        if exceeded is not None:
+            chunk.exceeded = np.count_nonzero(exceeded, axis=0)
+        if self.reservoir_size > 0:
+            keep = min(count, self.reservoir_size)
+            chunk.reservoir = values[self.rng.choice(count, keep, replace=False)] if keep < count else values.copy()
+        self.merge(chunk)
+
+    def merge(self,other):
+        #Add the statistics of another RunningStatistics of the same quantity
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.M2 = other.count, other.mean, other.M2
+            self.minimum, self.maximum = other.minimum, other.maximum
+            self.exceeded, self.reservoir = other.exceeded, other.reservoir
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / total)
+        self.M2 = self.M2 + other.M2 + delta ** 2 * (self.count * other.count / total)
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+        self.exceeded = self.exceeded + other.exceeded
+        self.count = total
+        if self.reservoir_size == 0:
+            return
+
+        #Each reservoir is a uniform sample of its own samples: draw from them in proportion to the counts
+        keep = min(self.reservoir_size, self.reservoir.shape[0] + other.reservoir.shape[0])
+        from_self = min(self.rng.binomial(keep, self.count / total), self.reservoir.shape[0])
+        from_other = min(keep - from_self, other.reservoir.shape[0])
+        from_self = keep - from_other
+        self.reservoir = np.concatenate([
+            self.reservoir[self.rng.choice(self.reservoir.shape[0], from_self, replace=False)],
+            other.reservoir[self.rng.choice(other.reservoir.shape[0], from_other, replace=False)]])
+
+    def variance(self):
+        return self.M2 / max(self.count - 1, 1)
+
+    def summary(self,quantiles=QUANTILES):
+        #Dictionary of the statistics, quantiles are estimated from the reservoir (if one is kept)
+        output = {
+            "mean": self.mean,
+            "std": np.sqrt(self.variance()),
+            "min": self.minimum,
+            "max": self.maximum,
+        }
+        if self.reservoir_size > 0:
+            output["quantiles"] = dict((q, np.quantile(self.reservoir, q, axis=0)) for q in quantiles)
+        return output
+
+    def __init__(self,shape,reservoir_size=1000,rng=None):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.M2 = np.zeros(shape)
+        self.minimum = np.full(shape, np.inf)
+        self.maximum = np.full(shape, -np.inf)
+        self.exceeded = np.zeros(shape, dtype=np.int64)
+        self.reservoir_size = reservoir_size
+        self.reservoir = np.zeros((0,) + tuple(shape))
+        self.rng = rng if rng is not None else np.random.default_rng(0)
+
+class StochasticModel():
+    #Deterministic data of a model shared by all samples, and the batched analysis of a chunk of samples
+    def sample(self,rng,count):
+        #Random E, A (from D) of every element and load arrays of every load case, for count samples
+        E = lognormalSample(rng, self.model.E, self.scatter.get("E", 0.0), (count, self.model.num_elements))
+        D = lognormalSample(rng, self.D, self.scatter.get("D", 0.0), (count, self.model.num_elements))
+        #Loads in the polar [force, angle] format of transformForce, magnitude and angle scatter on every load entry
+        shape = (count,) + self.polar_loads.shape[:-1]
+        magnitude = self.polar_loads[..., 0] * lognormalSample(rng, 1.0, self.scatter.get("force", 0.0), shape)
+        angle = self.polar_loads[..., 1] + rng.normal(0.0, 1.0, shape) * self.scatter.get("angle", 0.0)
+        radians = angle * 3.14159 / 180
+        forces = np.stack([magnitude * np.cos(radians), magnitude * np.sin(radians)], axis=-1)
+        return E, diaToArea(D), forces.reshape(count, self.num_cases, -1)
+
+    def rightHandSide(self,forces,stiffness):
+        #(samples x free dofs x cases) right hand sides f_f - K_fc*u_c of a chunk
+        rhs = np.transpose(forces[:, :, self.dof_map.free], (0, 2, 1))
+        if np.any(self.dof_map.prescribed != 0):
+            #K*u_c = sum k_e * b_e * (b_e . u_c) over the elements, the same prescribed values for every sample
+            support = np.zeros(self.dof_map.num_dofs)
+            support[self.dof_map.fixed] = self.dof_map.prescribed
+            elongation = np.einsum("ek,ek->e", self.model.strain_matrix, support[self.model.dofs])
+            values = (stiffness * elongation)[:, :, None] * self.model.strain_matrix
+            count = stiffness.shape[0]
+            rows = self.dof_map.free_index[self.model.dofs]
+            keep = rows >= 0
+            flat = (np.arange(count)[:, None] * self.dof_map.num_free + rows[keep][None, :]).ravel()
+            correction = np.bincount(flat, weights=values[:, keep].ravel(),
+                                     minlength=count * self.dof_map.num_free)
+            rhs = rhs - correction.reshape(count, self.dof_map.num_free)[:, :, None]
+        return rhs
+
+    def solveDense(self,stiffness,rhs):
+        #Stack of dense K_ff matrices, one per sample, filled by one bincount and solved by one batched solve
+        count = stiffness.shape[0]
+        size = self.dof_map.num_free * self.dof_map.num_free
+        flat = (np.arange(count)[:, None] * size + self.positions[None, :]).ravel()
+        values = (stiffness[:, self.entry_element] * self.entry_values[None, :]).ravel()
+        K = np.bincount(flat, weights=values, minlength=count * size)
+        K = K.reshape(count, self.dof_map.num_free, self.dof_map.num_free)
+        return np.linalg.solve(K, rhs)
+
+    def solveSparse(self,stiffness,rhs):
+        #Block diagonal matrix of the K_ff of every sample, factorized once for the whole chunk
+        count = stiffness.shape[0]
+        offset = (np.arange(count) * self.dof_map.num_free)[:, None]
+        values = (stiffness[:, self.entry_element] * self.entry_values[None, :]).ravel()
+        rows = (offset + self.entry_rows[None, :]).ravel()
+        cols = (offset + self.entry_cols[None, :]).ravel()
+        total = count * self.dof_map.num_free
+        K = sp.coo_matrix((values, (rows, cols)), shape=(total, total)).tocsr()
+        solution = Factorization(K, "cholesky").solve(rhs.reshape(total, self.num_cases))
+        return solution.reshape(count, self.dof_map.num_free, self.num_cases)
+
+    def analyzeChunk(self,rng,count,statistics):
+        #Analyze count random samples and add them to the statistics dictionary
+        E, A, forces = self.sample(rng, count)
+        stiffness = E * A / self.model.length
+        rhs = self.rightHandSide(forces, stiffness)
+        if self.dof_map.num_free <= DENSE_BATCH_LIMIT:
+            u_free = self.solveDense(stiffness, rhs)
+        else:
+            u_free = self.solveSparse(stiffness, rhs)
+
+        #(samples x cases x dofs) displacements, stresses sigma = E/L * b.u_e of every sample and load case
+        displacement = np.empty((count, self.num_cases, self.dof_map.num_dofs))
+        displacement[:, :, self.dof_map.free] = np.transpose(u_free, (0, 2, 1))
+        displacement[:, :, self.dof_map.fixed] = self.dof_map.prescribed
+        elongation = np.einsum("ek,scek->sce", self.model.strain_matrix, displacement[:, :, self.model.dofs])
+        stresses = (E / self.model.length)[:, None, :] * elongation
+
+        exceeded = None
+        if self.allowable_stress is not None:
+            exceeded = np.abs(stresses) > self.allowable_stress
+            #A member fails in a sample if it is overstressed in any load case, the system if any member fails
+            statistics["member_failure"].update(np.any(exceeded, axis=1).astype(float))
+            statistics["system_failure"].update(np.any(exceeded, axis=(1, 2)).astype(float)[:, None])
+        statistics["displacement"].update(displacement)
+        statistics["stress"].update(stresses, exceeded)
+        statistics["element_force"].update(stresses * A[:, None, :])
+
+    def newStatistics(self,rng):
+        #Empty statistics of every quantity
+        cases = self.num_cases
+        statistics = {
+            "displacement": RunningStatistics((cases, self.dof_map.num_dofs), self.reservoir_size, rng),
+            "stress": RunningStatistics((cases, self.model.num_elements), self.reservoir_size, rng),
+            "element_force": RunningStatistics((cases, self.model.num_elements), self.reservoir_size, rng),
+        }
+        if self.allowable_stress is not None:
+            #Only the mean (failure probability) is reported, no reservoir
+            statistics["member_failure"] = RunningStatistics((self.model.num_elements,), 0, rng)
+            statistics["system_failure"] = RunningStatistics((1,), 0, rng)
+        return statistics
+
+    def reservoirBytes(self):
+        #Memory of one sample in the reservoirs (displacements, stresses and element forces of every load case)
+        return 8 * self.num_cases * (self.dof_map.num_dofs + 2 * self.model.num_elements)
+
+    def sampleBytes(self):
+        #Approximate memory used per sample of a chunk, used to size the chunks
+        #(work arrays, the chunk's reservoirs are up to one copy of its results)
+        cases = self.num_cases
+        per_sample = 8 * (10 * self.model.num_elements + 6 * cases * self.dof_map.num_dofs
+                          + 8 * cases * self.model.num_elements + 3 * self.entry_values.shape[0])
+        per_sample = per_sample + self.reservoirBytes()
+        if self.dof_map.num_free <= DENSE_BATCH_LIMIT:
+            return per_sample + 8 * 2 * self.dof_map.num_free ** 2
+        return per_sample + 8 * SPARSE_FILL * self.entry_values.shape[0]
+
+    def __init__(self,IC,scatter,allowable_stress=None,reservoir_size=1000):
+        #scatter: {"E": cov, "D": cov, "force": cov, "angle": standard deviation in degrees}, missing entries are 0
+        #allowable_stress: optional |stress| limit, members above it count as failed
+        self.model = buildModel(IC)
+        self.D = np.asarray(IC['element_params']["D"], dtype=float)
+        self.dof_map = dofMapFromConditions(IC['initial_conds'])
+        self.polar_loads = np.asarray(readLoadCases(IC["initial_conds"]), dtype=float).reshape(
+            -1, self.model.num_nodes, 2)
+        self.num_cases = self.polar_loads.shape[0]
+        self.scatter = dict(scatter)
+        self.allowable_stress = allowable_stress
+        self.reservoir_size = reservoir_size
+
+        #Entries of the 4x4 matrices b*b^T landing in K_ff: their element, free row / column and value
+        #A sample's K_ff entries are then its E*A/L of the element times the value
+        outer = self.model.strain_matrix[:, :, None] * self.model.strain_matrix[:, None, :]
+        rows = np.repeat(self.dof_map.free_index[self.model.dofs], 4, axis=1).ravel()
+        cols = np.tile(self.dof_map.free_index[self.model.dofs], (1, 4)).ravel()
+        keep = (rows >= 0) & (cols >= 0)
+        self.entry_element = np.repeat(np.arange(self.model.num_elements), 16)[keep]
+        self.entry_rows = rows[keep]
+        self.entry_cols = cols[keep]
+        self.entry_values = outer.ravel()[keep]
+        self.positions = self.entry_rows * self.dof_map.num_free + self.entry_cols
+
+#Model of the worker process, built once by its initializer
+worker_model = None
+
+def initWorker(IC,scatter,allowable_stress,reservoir_size):
+    global worker_model
+    worker_model = StochasticModel(IC, scatter, allowable_stress, reservoir_size)
+
+def chunkStatistics(stochastic,task):
+    #Statistics of one chunk, task is (seed sequence, number of samples)
+    seed, count = task
+    rng = np.random.default_rng(seed)
+    statistics = stochastic.newStatistics(rng)
+    stochastic.analyzeChunk(rng, count, statistics)
+    return statistics
+
+def runChunk(task):
+    #chunkStatistics in a worker process
+    return chunkStatistics(worker_model, task)
+
+def mergeStatistics(statistics,chunk):
+    #Merge the statistics of a chunk into the totals
+    for name, values in chunk.items():
+        statistics[name].merge(values)
+
+def chunkSizes(num_samples,chunk_size):
+    #Split num_samples into chunks of at most chunk_size
+    sizes = [chunk_size] * (num_samples // chunk_size)
+    if num_samples % chunk_size:
+        sizes.append(num_samples % chunk_size)
+    return sizes
+
+def monteCarlo(IC,num_samples,scatter,allowable_stress=None,seed=0,workers=1,memory_budget=256 * 2 ** 20,
+               reservoir_size=1000):
+    #Monte Carlo analysis of a model dictionary (IC = loadModel(file)) with num_samples random samples
+    #workers: number of processes (None = number of CPUs, 1 runs in this process)
+    #memory_budget: approximate bytes used by the reservoirs of the totals and one chunk of samples (every worker
+    #process analyzes one chunk at a time)
+    #reservoir_size: samples kept for the quantiles, reduced to fit RESERVOIR_SHARE of the memory budget
+    #The chunks get independent random streams from seed and their size only depends on the model and the memory
+    #budget, so the results depend on seed, memory_budget and reservoir_size but not on the number of workers
+    #The model is checked first like in analyzeModel (its "validation" entry, ModelValidationError)
+    #Returns {"num_samples", "chunk_size", "time", "displacement", "stress", "element_force", ...}: each quantity
+    #has its mean, std, min, max and quantiles, stress also has "exceedance_probability" of |stress| > allowable,
+    #and "member_failure" / "system_failure" give the failure probability of each member / of any member
+    start = time.perf_counter()
+    validation = IC.get("validation", "basic")
+    if validation not in VALIDATION_LEVELS:
+        raise ValueError("Unknown validation '%s', expected one of %s" % (validation, VALIDATION_LEVELS))
+    if validation != "none":
+        validateModel(IC)
+    stochastic = StochasticModel(IC, scatter, allowable_stress, reservoir_size)
+    #The reservoirs of the totals reach three times their size while a chunk is merged (old, new and drawn samples)
+    reservoir_size = int(min(reservoir_size, RESERVOIR_SHARE * memory_budget // (3 * stochastic.reservoirBytes())))
+    stochastic.reservoir_size = max(reservoir_size, 1)
+    chunk_budget = memory_budget - 3 * stochastic.reservoir_size * stochastic.reservoirBytes()
+    workers = workers or os.cpu_count() or 1
+    chunk_size = int(max(1, min(chunk_budget // stochastic.sampleBytes(), MAX_CHUNK_SAMPLES, num_samples)))
+    sizes = chunkSizes(num_samples, chunk_size)
+    tasks = list(zip(np.random.SeedSequence(seed).spawn(len(sizes)), sizes))
+
+    #Merge in chunk order so the result does not depend on which worker finished first
+    statistics = stochastic.newStatistics(np.random.default_rng(seed))
+    if workers == 1:
+        for task in tasks:
+            mergeStatistics(statistics, chunkStatistics(stochastic, task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=initWorker,
+                                 initargs=(IC, scatter, allowable_stress, stochastic.reservoir_size)) as pool:
+            for chunk in pool.map(runChunk, tasks):
+                mergeStatistics(statistics, chunk)
+
+    results = {"num_samples": num_samples, "chunk_size": chunk_size, "num_chunks": len(sizes),
+               "reservoir_size": stochastic.reservoir_size}
+    for name, values in statistics.items():
+        results[name] = values.summary()
+    if allowable_stress is not None:
+        results["stress"]["exceedance_probability"] = statistics["stress"].exceeded / float(num_samples)
+        results["member_failure"] = results["member_failure"]["mean"]
+        results["system_failure"] = float(results["system_failure"]["mean"][0])
+    results["time"] = time.perf_counter() - start
+    return results
+
+def main(argv=None):
+    #Command line interface of the Monte Carlo analysis
+    parser = argparse.ArgumentParser(description="Monte Carlo analysis of a truss model with random E, D and loads")
+    parser.add_argument("model", help="model .json file")
+    parser.add_argument("-n", "--samples", type=int, default=1000, help="number of random samples")
+    parser.add_argument("--cov-E", type=float, default=0.0, help="coefficient of variation of E")
+    parser.add_argument("--cov-D", type=float, default=0.0, help="coefficient of variation of D")
+    parser.add_argument("--cov-force", type=float, default=0.0, help="coefficient of variation of the load magnitudes")
+    parser.add_argument("--std-angle", type=float, default=0.0, help="standard deviation of the load angles (degrees)")
+    parser.add_argument("--allowable", type=float, default=None, help="allowable |stress| for failure probabilities")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all CPUs)")
+    parser.add_argument("--memory", type=float, default=256,
+                        help="memory budget in MB: quantile reservoirs and one chunk of samples (per worker)")
+    parser.add_argument("-o", "--output", default="monte_carlo.json", help="statistics file to write")
+    args = parser.parse_args(argv)
+
+    scatter = {"E": args.cov_E, "D": args.cov_D, "force": args.cov_force, "angle": args.std_angle}
+    results = monteCarlo(loadModel(args.model), args.samples, scatter, allowable_stress=args.allowable,
+                         seed=args.seed, workers=args.workers, memory_budget=int(args.memory * 2 ** 20))
+    with open(args.output, "w") as output:
+        json.dump(resultsToJSON(results), output)
+    print("%d samples in %d chunks, %.3f s" % (results["num_samples"], results["num_chunks"], results["time"]))
+    if args.allowable is not None:
+        print("System failure probability: %.6f" % results["system_failure"])
+    print("Wrote %s" % args.output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,8 @@
 
 class Node():
     #Create object for each node
+    __slots__ = ("node_coords", "node_num")
+
     def __init__(self,coords,node_num):
         #Holds coordinates of the node
         self.node_coords = coords
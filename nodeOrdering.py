@@ -0,0 +1,109 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+from scipy.sparse.csgraph import reverse_cuthill_mckee
+from trussModel import TrussModel
+#----------------------------------------------------------------------------------------------------------------------#
+#Bandwidth / fill reducing renumbering of the nodes before assembly
+#An ordering is an array "order" of old node numbers, order[new] = old. The results are mapped back to the user's
+#numbering with restoreNodes, element numbering is never changed
+
+#Names of the available orderings
+ORDERINGS = ["none", "rcm", "amd"]
+
+def nodeGraph(connectivity,num_nodes):
+    #Symmetric node adjacency pattern of the truss from node_connections, as a CSR matrix (1 = nodes share a bar)
+    connectivity = np.asarray(connectivity, dtype=np.int64).reshape(-1, 2)
+    rows = np.concatenate([connectivity[:, 0], connectivity[:, 1]])
+    cols = np.concatenate([connectivity[:, 1], connectivity[:, 0]])
+    graph = sp.coo_matrix((np.ones(rows.shape[0]), (rows, cols)), shape=(num_nodes, num_nodes)).tocsr()
+    graph.data[:] = 1.0
+    return graph
+
+def graphSurrogate(graph):
+    #SPD matrix with the sparsity of the node graph (graph Laplacian + identity), factorized to measure fill
+    degree = np.asarray(graph.sum(axis=1)).ravel()
+    return sp.csc_matrix(sp.diags(degree + 1.0) - graph)
+
+def dofBandwidth(connectivity,old_to_new):
+    #Half bandwidth of the global stiffness matrix: largest |i - j| between two dofs of the same element
+    connectivity = np.asarray(connectivity, dtype=np.int64).reshape(-1, 2)
+    if connectivity.shape[0] == 0:
+        return 1
+    node_bandwidth = np.max(np.abs(old_to_new[connectivity[:, 0]] - old_to_new[connectivity[:, 1]]))
+    #two dofs per node: u of the lower node to v of the higher node
+    return int(2 * node_bandwidth + 1)
+
+def factorFill(graph,order):
+    #Number of non-zeros of the Cholesky factor of the stiffness matrix when the nodes are numbered in this order
+    #Measured on the node level surrogate (no pivoting, natural order), each node pair expands to a 2x2 dof block
+    surrogate = graphSurrogate(graph)[order][:, order]
+    lu = spla.splu(sp.csc_matrix(surrogate), permc_spec="NATURAL", diag_pivot_thresh=0.0,
+                   options={"SymmetricMode": True})
+    node_nnz = lu.L.nnz
+    num_nodes = graph.shape[0]
+    return int(4 * (node_nnz - num_nodes) + 3 * num_nodes)
+
+def reverseCuthillMcKee(graph):
+    #Reverse Cuthill-McKee ordering of the node graph (bandwidth / profile reduction)
+    return np.asarray(reverse_cuthill_mckee(sp.csr_matrix(graph), symmetric_mode=True), dtype=np.int64)
+
+def minimumDegree(graph):
+    #Approximate minimum degree ordering of the node graph (fill reduction), computed by SuperLU's multiple minimum
+    #degree ordering of the graph surrogate. perm_c maps old -> new, invert it for the order
+    lu = spla.splu(graphSurrogate(graph), permc_spec="MMD_AT_PLUS_A", diag_pivot_thresh=0.0,
+                   options={"SymmetricMode": True})
+    return np.argsort(lu.perm_c).astype(np.int64)
+
+def inverseOrder(order):
+    #old_to_new[old] = new for an order with order[new] = old
+    old_to_new = np.empty(order.shape[0], dtype=np.int64)
+    old_to_new[order] = np.arange(order.shape[0])
+    return old_to_new
+
+def orderNodes(model,method="rcm",report=True):
+    #Compute the node ordering of a TrussModel, returns the order and a dictionary with the bandwidth and
+    #Cholesky fill of the stiffness matrix before and after the renumbering (fill only if report is True)
+    if method not in ORDERINGS:
+        raise ValueError("Unknown ordering '%s', expected one of %s" % (method, ORDERINGS))
+    graph = nodeGraph(model.connectivity, model.num_nodes)
+    natural = np.arange(model.num_nodes)
+    if method == "rcm":
+        order = reverseCuthillMcKee(graph)
+    elif method == "amd":
+        order = minimumDegree(graph)
+    else:
+        order = natural
+
+    info = {
+        "method": method,
+        "bandwidth_before": dofBandwidth(model.connectivity, natural),
+        "bandwidth_after": dofBandwidth(model.connectivity, inverseOrder(order)),
+    }
+    if report:
+        info["fill_before"] = factorFill(graph, natural)
+        info["fill_after"] = factorFill(graph, order)
+    return order, info
+
+def renumberModel(model,order):
+    #New TrussModel with the nodes numbered in the given order, elements keep their numbering
+    old_to_new = inverseOrder(order)
+    return TrussModel(model.coords[order], old_to_new[model.connectivity], model.E, model.A, model.D)
+
+def permuteNodes(values,order):
+    #Reorder node based data into the new numbering: [[x,y],...] node lists (nodes x 2), or dof vectors and
+    #(cases x dofs) arrays with the two dofs of each node next to each other
+    values = np.asarray(values)
+    if values.ndim >= 2 and values.shape[-2:] == (order.shape[0], 2):
+        return values[..., order, :]
+    shape = values.shape
+    return values.reshape(shape[:-1] + (-1, 2))[..., order, :].reshape(shape)
+
+def restoreNodes(values,order):
+    #Inverse of permuteNodes, maps node based results back to the user's original node numbering
+    return permuteNodes(values, inverseOrder(order))
@@ -0,0 +1,245 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import time
+import numpy as np
+import scipy.sparse as sp
+from solverEngine import *
+#----------------------------------------------------------------------------------------------------------------------#
+#Geometrically nonlinear (large displacement) analysis of a TrussModel {trussModel.py} by load stepping
+#Each bar uses the Green-Lagrange strain of its current length, e = (l^2 - L^2) / (2 L^2), and the axial force
+#N = E*A*e (small strains, large rotations). With b = [-d, d] / L (d: current bar vector) the bar gives
+#   internal forces  f = N * b
+#   tangent          K_t = E*A/L * b*b^T + N/L * [[I, -I], [-I, I]]   (material + geometric stiffness)
+#which are the linear element force / stiffness {elementKernel in elementClass.py} at zero displacement
+#The loads (and prescribed support displacements) are applied in increments, every increment is solved by
+#Newton-Raphson iterations on the out of balance forces:
+#   "full"      new tangent factorization every iteration (quadratic convergence)
+#   "modified"  the factorized tangent is reused by the following iterations and load steps, it is only
+#               factorized again when an iteration reduces the out of balance forces by less than CONTRACTION
+#   "quasi"     as "modified" with BFGS updates of the factorized tangent (one solve per iteration, few iterations)
+#Every step starts from the previous converged one extrapolated along the last increment, a step that does not
+#converge is retried with half the increment. Load control stops at limit points (snap-through is not followed)
+
+#Analysis types of a model and Newton-Raphson variants
+ANALYSIS_TYPES = ["linear", "nonlinear"]
+NEWTON_METHODS = ["full", "modified", "quasi"]
+#A load step has converged when |f_ext - f_int| at the free dofs is below NEWTON_TOLERANCE times the larger of
+#|f_ext| and |f_int| (the reactions count for models only loaded by support displacements)
+NEWTON_TOLERANCE = 1e-8
+MAX_NEWTON_ITERATIONS = 30
+#Times the increment of a load step is halved before the analysis stops at the last converged load factor
+MAX_CUTBACKS = 8
+#Number of BFGS updates kept by the quasi-Newton method
+BFGS_MEMORY = 20
+#"modified" / "quasi" factorize a new tangent when an iteration leaves more than this fraction of the residual
+CONTRACTION = 0.5
+#Geometric part of the tangent of a bar, [[I, -I], [-I, I]]
+GEOMETRIC_MATRIX = np.kron(np.array([[1.0, -1.0], [-1.0, 1.0]]), np.eye(2))
+
+def elementState(model,displacement):
+    #Green-Lagrange strain, axial force and b = [-d, d] / L of every element at a full dof displacement vector
+    #e = (d0.du + du.du/2) / L^2 with du the elongation vector, without the cancellation of l^2 - L^2 under small
+    #displacements (d0 = L * [l, m] from the strain matrix {trussModel.py})
+    u = displacement[model.dofs]
+    change = u[:, 2:] - u[:, :2]
+    initial = model.strain_matrix[:, 2:] * model.length[:, None]
+    delta = initial + change
+    strain = (np.einsum("ij,ij->i", initial, change) + 0.5 * np.einsum("ij,ij->i", change, change)) / model.length ** 2
+    axial = model.E * model.A * strain
+    b = np.hstack([-delta, delta]) / model.length[:, None]
+    return strain, axial, b
+
+class NewtonSolver():
+    #Load stepping Newton-Raphson solver of one model, the sparsity of the tangent is set up once for all iterations
+    def internalForces(self,axial,b):
+        #Sum of the element forces N*b at every dof
+        return np.bincount(self.model.dofs.ravel(), (axial[:, None] * b).ravel(), minlength=self.dof_map.num_dofs)
+
+    def assembleTangent(self,axial,b):
+        #Free-free block of the tangent stiffness: the element matrices are summed into the fixed csr pattern
+        model = self.model
+        stiff = (model.E * model.A / model.length)[:, None, None] * b[:, :, None] * b[:, None, :]
+        stiff = stiff + (axial / model.length)[:, None, None] * GEOMETRIC_MATRIX
+        data = np.bincount(self.slots, stiff.reshape(-1)[self.keep], minlength=self.indices.shape[0])
+        return sp.csr_matrix((data, self.indices, self.indptr), shape=(self.dof_map.num_free, self.dof_map.num_free))
+
+    def factorize(self,axial,b):
+        #Factorize the tangent of the current configuration, clears the BFGS updates
+        start = time.perf_counter()
+        tangent = self.assembleTangent(axial, b)
+        self.assembly_time = self.assembly_time + time.perf_counter() - start
+        self.factorization = Factorization(tangent, self.solver, self.precision, definite=False)
+        self.factor_time = self.factor_time + self.factorization.factor_time
+        self.factorizations = self.factorizations + 1
+        self.updates = []
+
+    def correction(self,residual):
+        #Displacement correction of the free dofs: K_t^-1 * residual, with the BFGS updates for "quasi"
+        #(two-loop recursion on the pairs s = correction, y = decrease of the residual over the iteration)
+        q = residual.copy()
+        alphas = []
+        for s, y, rho in reversed(self.updates):
+            alpha = rho * s.dot(q)
+            q = q - alpha * y
+            alphas.append(alpha)
+        z = self.factorization.solve(q)
+        for (s, y, rho), alpha in zip(self.updates, reversed(alphas)):
+            z = z + s * (alpha - rho * y.dot(z))
+        return z
+
+    def iterate(self,displacement,load_factor,forces):
+        #Newton-Raphson iterations of one load step from the starting displacement (changed in place)
+        #Returns whether the step converged, its iterations, relative residual and out of balance force norm
+        #A step that fails keeps the tangent of its last iteration, the retry starts from the last converged step
+        free = self.dof_map.free
+        displacement[self.dof_map.fixed] = load_factor * self.dof_map.prescribed
+        external = load_factor * forces[free]
+        previous = None
+        step = None
+        previous_residual = None
+        for iteration in range(0, self.max_iterations + 1):
+            strain, axial, b = elementState(self.model, displacement)
+            internal = self.internalForces(axial, b)
+            residual = external - internal[free]
+            reference = max(np.linalg.norm(external), np.linalg.norm(internal))
+            norm = np.linalg.norm(residual)
+            relative = norm / reference if reference > 0 else 0.0
+            self.iterations = self.iterations + 1
+            if self.callback is not None:
+                self.callback(self.iterations, relative)
+            if relative <= self.tolerance:
+                return True, iteration, relative, norm
+            if iteration == self.max_iterations or not np.isfinite(relative):
+                return False, iteration, relative, norm
+
+            if self.method == "full" or self.factorization is None or \
+                    (previous is not None and relative > CONTRACTION * previous):
+                #New tangent every iteration ("full"), or when the reused one converges too slowly
+                try:
+                    self.factorize(axial, b)
+                except RuntimeError:
+                    #Singular tangent (SuperLU), the step is retried with a smaller increment
+                    return False, iteration, relative, norm
+            elif self.method == "quasi" and previous_residual is not None:
+                y = previous_residual - residual
+                curvature = y.dot(step)
+                if curvature > 0:
+                    self.updates = (self.updates + [(step, y, 1.0 / curvature)])[-BFGS_MEMORY:]
+            step = self.correction(residual)
+            displacement[free] = displacement[free] + step
+            previous = relative
+            previous_residual = residual
+
+    def solveCase(self,forces):
+        #Load stepping of one (dofs) force vector, returns the final displacement and the report of every step
+        displacement = np.zeros(self.dof_map.num_dofs)
+        load_factor = 0.0
+        increment = 1.0 / self.steps
+        last_step = None
+        steps = []
+        cutbacks = 0
+        while load_factor < 1.0 - 1e-12:
+            target = load_factor + increment
+            if target > 1.0 - 1e-12:
+                target = 1.0
+            trial = displacement.copy()
+            if last_step is not None:
+                #Warm start: the previous converged step extrapolated along the last increment
+                trial = trial + last_step * (target - load_factor)
+            factorizations = self.factorizations
+            converged, iterations, relative, norm = self.iterate(trial, target, forces)
+            if not converged and cutbacks < MAX_CUTBACKS:
+                cutbacks = cutbacks + 1
+                increment = increment / 2
+                continue
+            steps.append({"load_factor": target, "iterations": iterations, "residual_norm": float(norm),
+                          "relative_residual": float(relative), "factorizations": self.factorizations - factorizations,
+                          "converged": converged})
+            if not converged:
+                break
+            last_step = (trial - displacement) / (target - load_factor)
+            displacement = trial
+            load_factor = target
+        return displacement, steps
+
+    def solve(self,case_forces):
+        #Solve every (cases x dofs) load case, each one is stepped from the unloaded structure
+        #Returns the (cases x dofs) displacements and reactions, the (cases x elements) Green-Lagrange strains and
+        #axial forces, the solver diagnostics and the step reports of every case
+        start = time.perf_counter()
+        case_forces = np.atleast_2d(np.asarray(case_forces, dtype=float))
+        displacement = np.zeros(case_forces.shape)
+        reactions = np.zeros(case_forces.shape)
+        strain = np.zeros((case_forces.shape[0], self.model.num_elements))
+        axial = np.zeros(strain.shape)
+        load_steps = []
+        for case in range(0, case_forces.shape[0]):
+            displacement[case], steps = self.solveCase(case_forces[case])
+            strain[case], axial[case], b = elementState(self.model, displacement[case])
+            reactions[case, self.dof_map.fixed] = self.internalForces(axial[case], b)[self.dof_map.fixed]
+            load_steps.append(steps)
+
+        last = [steps[-1] for steps in load_steps if steps]
+        #Out of balance forces of the last step of every case (absolute and relative), the worst case is reported
+        relative = max([step["relative_residual"] for step in last] + [0.0])
+        norm = max([step["residual_norm"] for step in last] + [0.0])
+        info = {
+            "method": self.factorization.method if self.factorization is not None else self.solver,
+            "backend": self.factorization.kind if self.factorization is not None else "none",
+            "newton": self.method,
+            "residual_norm": norm,
+            "relative_residual": relative,
+            "iterations": self.iterations,
+            "converged": all(step["converged"] and step["load_factor"] == 1.0 for step in last),
+            "load_steps": sum(len(steps) for steps in load_steps),
+            "factorizations": self.factorizations,
+            "assembly_time": self.assembly_time,
+            "factor_time": self.factor_time,
+            "time": time.perf_counter() - start,
+        }
+        return displacement, reactions, strain, axial, info, load_steps
+
+    def __init__(self,model,dof_map,steps=10,method="full",solver="auto",precision="double",
+                 tolerance=NEWTON_TOLERANCE,max_iterations=MAX_NEWTON_ITERATIONS,callback=None):
+        #model: TrussModel, dof_map: its DofMap {dofMap.py}, steps: number of equal load increments
+        #solver / precision: direct backend of the tangent factorizations {solverEngine.py}
+        #callback(iteration, relative residual) is called for every Newton iteration
+        if method not in NEWTON_METHODS:
+            raise ValueError("Unknown Newton method '%s', expected one of %s" % (method, NEWTON_METHODS))
+        if int(steps) < 1:
+            raise ValueError("The number of load steps must be at least 1, got %s" % steps)
+        self.model = model
+        self.dof_map = dof_map
+        self.steps = int(steps)
+        self.method = method
+        self.solver = solver
+        self.precision = precision
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.callback = callback
+        self.factorization = None
+        self.updates = []
+        self.iterations = 0
+        self.factorizations = 0
+        self.assembly_time = 0.0
+        self.factor_time = 0.0
+
+        #Csr pattern of the free-free block: entry [i,j] of each element matrix (row-major like the element
+        #matrices) lands in slot slots[k] of the csr data, entries at constrained dofs are dropped {assembleReduced}
+        rows = dof_map.free_index[np.repeat(model.dofs, 4, axis=1).ravel()]
+        cols = dof_map.free_index[np.tile(model.dofs, (1, 4)).ravel()]
+        self.keep = np.flatnonzero((rows >= 0) & (cols >= 0))
+        keys, self.slots = np.unique(rows[self.keep] * dof_map.num_free + cols[self.keep], return_inverse=True)
+        self.indices = keys % max(dof_map.num_free, 1)
+        self.indptr = np.zeros(dof_map.num_free + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // max(dof_map.num_free, 1), minlength=dof_map.num_free), out=self.indptr[1:])
+
+def solveNonlinear(model,dof_map,case_forces,steps=10,method="full",solver="auto",precision="double",callback=None):
+    #Geometrically nonlinear solve of every load case {NewtonSolver}, solver must be a direct backend
+    if solver not in SOLVERS or solver == "gauss_seidel":
+        direct = [name for name in SOLVERS if name != "gauss_seidel"]
+        raise ValueError("The nonlinear analysis needs a direct solver, expected one of %s" % direct)
+    return NewtonSolver(model, dof_map, steps, method, solver, precision, callback=callback).solve(case_forces)
@@ -5,21 +5,13 @@
 #----------------------------------------------------------------------------------------------------------------------#
 import numpy as np
 import math
-import matplotlib.pyplot as plt
+import scipy.sparse as sp
+from trussModel import TrussModel
 #----------------------------------------------------------------------------------------------------------------------#
 def transformForce(force_list):
-    transformed_forces = []
-
-    for node_force in force_list:
-        angle = node_force[1]*3.14159/180
-        force = []
-        force_x = node_force[0]*math.cos(angle)
-        force_y = node_force[0]*math.sin(angle)
-        force.append(force_x)
-        force.append(force_y)
-        transformed_forces.append(force)
-
-    return transformed_forces
+    #Convert the [[force, angle],...] list of each node into a (nodes x 2) array of x,y force components
+    #{transformLoadCases in this file, with a single load case}
+    return transformLoadCases([force_list]).reshape(-1, 2)
 
 def diaToArea(diameter):
     area = pow(diameter,2)*3.14159/4
@@ -94,137 +86,188 @@ def combineAugmented(elementList):
 
     return global_k
 
+def elementArray(elements,name,shape):
+    # Return an element attribute of all elements as one array, elements is a list of Element objects or a TrussModel
+    # A TrussModel already holds the attribute as a contiguous array {trussModel.py}, no copy is made
+    if isinstance(elements, TrussModel):
+        return getattr(elements, name)
+    return np.array([getattr(element, name) for element in elements], dtype=float).reshape(shape)
+
+def elementDofs(elements):
+    # Build a (num_elements x 4) array holding the global dof indices [u_start, v_start, u_end, v_end] of each element
+    if isinstance(elements, TrussModel):
+        return elements.dofs
+    connections = np.array([element.connecting_nodes for element in elements], dtype=np.int64).reshape(-1, 2)
+    dofs = np.empty((connections.shape[0], 4), dtype=np.int64)
+    # need to multiply the node index by 2, since transforming from u -> u,v
+    dofs[:, 0] = connections[:, 0] * 2
+    dofs[:, 1] = dofs[:, 0] + 1
+    dofs[:, 2] = connections[:, 1] * 2
+    dofs[:, 3] = dofs[:, 2] + 1
+    return dofs
+
+def elementTriplets(elements,element_matrices=None):
+    # COO triplets (rows, columns, values) of all element stiffness matrices in global dof numbering
+    # element_matrices: (elements x 4 x 4) matrices assembled instead of the stiffness matrices (ie. mass matrices)
+    dofs = elementDofs(elements)
+    stiff = elementArray(elements, "stiff_matrix", (-1, 4, 4)) if element_matrices is None else element_matrices
+
+    # Entry [i,j] of each element matrix lands on row dofs[i], column dofs[j] of the global matrix
+    # stiff.ravel() is ordered i-major, so rows repeat each dof 4 times and columns tile the 4 dofs
+    rows = np.repeat(dofs, 4, axis=1).ravel()
+    cols = np.tile(dofs, (1, 4)).ravel()
+    return rows, cols, stiff.ravel()
+
+def assembleSparse(elements,num_nodes):
+    # elements is a list of Element objects or a TrussModel
+    # Scatters every element's 4x4 stiff_matrix directly into a sparse global stiffness matrix in one pass
+    # Replaces augmentMatrix + combineAugmented, which need a dense (2*num_nodes x 2*num_nodes) array per element
+    rows, cols, values = elementTriplets(elements)
+
+    # COO -> CSR conversion sums the duplicate entries of elements sharing a node
+    global_k = sp.coo_matrix((values, (rows, cols)), shape=(num_nodes * 2, num_nodes * 2))
+    return global_k.tocsr()
+
+def assembleReduced(elements,dof_map,element_matrices=None):
+    # Scatters the element stiffness matrices straight into the blocks of the reduced system {dofMap.py}
+    # Returns K_ff (free x free) for the solve, and K_cf (constrained x free), K_cc (constrained x constrained)
+    # which are only kept for the reaction forces and prescribed support displacements
+    # element_matrices: other (elements x 4 x 4) element matrices to assemble the same way {elementTriplets}
+    rows, cols, values = elementTriplets(elements, element_matrices)
+    free_rows = dof_map.free_index[rows]
+    free_cols = dof_map.free_index[cols]
+    fixed_rows = dof_map.fixed_index[rows]
+    fixed_cols = dof_map.fixed_index[cols]
+
+    # Keep the entries whose row and column both belong to the block, COO -> CSR sums the duplicates
+    def block(block_rows,block_cols,shape):
+        keep = (block_rows >= 0) & (block_cols >= 0)
+        return sp.coo_matrix((values[keep], (block_rows[keep], block_cols[keep])), shape=shape).tocsr()
+
+    K_ff = block(free_rows, free_cols, (dof_map.num_free, dof_map.num_free))
+    K_cf = block(fixed_rows, free_cols, (dof_map.num_fixed, dof_map.num_free))
+    K_cc = block(fixed_rows, fixed_cols, (dof_map.num_fixed, dof_map.num_fixed))
+    return K_ff, K_cf, K_cc
+
 def flattenList(list):
-    # Required to merge 2D lists created in JSON file into a 1D list
-    flattened = []
-    for node in list:
-        for point in node:
-            flattened.append(point)
-    return flattened
+    # Required to merge 2D lists created in JSON file into a 1D array
+    return np.asarray(list).reshape(-1)
 
-def trimMatrix(initial_disp,matrix,vector=False):
-    # Condenses input matrix by removing rows and columns corresponding to 0 entries of the initial displacement vector
+def freeDofs(initial_disp):
+    # Boolean mask of the dofs that are solved for (non-zero entries of the initial displacement lists)
+    return flattenList(initial_disp) != 0
 
-    #Flatten the initial displacement vector {flattenList definined in this file}
-    initial_disp = flattenList(initial_disp)
+def trimMatrix(initial_disp,matrix,vector=False):
+    # Condenses input matrix by keeping only the rows and columns corresponding to non-zero entries of the initial
+    # displacement vector {freeDofs in this file}
+    keep = freeDofs(initial_disp)
 
     # Since function is used for vectors and matrices, only flatten vectors
     if vector == True:
-        matrix = flattenList(matrix)
+        return flattenList(matrix)[keep]
 
-    # Create a list to hold indexes of rows and columns to delete
-    to_delete = []
-    # Iterate through the initial displacement vector, append indexes to delete into to_delete list
-    for i in range(0,len(initial_disp)):
-        if initial_disp[i] == 0:
-            to_delete.append(i)
+    # Sparse matrices are trimmed by indexing the kept rows and columns, the result stays sparse
+    if sp.issparse(matrix):
+        return matrix.tocsr()[keep][:, keep]
 
-    # Delete columns of matrix / vector corresponding to entries of to_delete list
-    matrix = np.delete(matrix,to_delete,0)
-
-    # If the input matrix is not a vector, delete the rows as well
-    if vector == False:
-        matrix = np.delete(matrix, to_delete, 1)
-
-    return matrix
+    # Dense matrices keep the free rows and columns in a single gather
+    index = np.flatnonzero(keep)
+    return np.asarray(matrix)[np.ix_(index, index)]
 
 def recompileMatrix(initial_disp,result_vector):
     #Re-introduces previously deleted 0 entries of initial_disp vector into the final_disp vector
+    #result_vector is either a vector of free dofs or a (free dofs x cases) matrix from a batch solve,
+    #the latter is returned as a (cases x dofs) array
 
-    #Flatten the initial displacement vector {flattenList defined in this file}
-    initial_disp = flattenList(initial_disp)
+    #Mask of the dofs that were solved for {freeDofs defined in this file}
+    free = freeDofs(initial_disp)
 
-    #Create a list to hold the recompiled result vector
-    output = []
-    #Create a counter to track which entries from the result_vector have been appended to the output list
-    counter = 0
-    for i in range(0,len(initial_disp)):
-        if initial_disp[i] == 0:
-            output.append(0)
-        else:
-            output.append(result_vector[counter])
-            counter = counter +1
+    #Scatter the solved entries back into their dof positions, the fixed dofs stay 0
+    result_vector = np.asarray(result_vector, dtype=float)
+    if result_vector.ndim == 2:
+        output = np.zeros((result_vector.shape[1], free.shape[0]))
+        output[:, free] = result_vector.T
+    else:
+        output = np.zeros(free.shape[0])
+        output[free] = result_vector
 
     return output
 
-def calcStrain(elements,disp_vector):
-    element_strain = []
-    for element in elements:
-        disp = []
-        # Get order of nodes in element
-        start_node = element.connecting_nodes[0] * 2
-        end_node = element.connecting_nodes[1] * 2
-
-        # Slice the corresponding displacements of each node from the displacement vector
-        # Extend method appends each entry in the list (as opposed to appending the list)
-        disp.extend(disp_vector[start_node:start_node + 2])
-        disp.extend(disp_vector[end_node:end_node + 2])
+def transformLoadCases(load_cases):
+    #Convert a list of load cases, each in the polar [[force, angle],...] format of transformForce,
+    #into a (cases x dofs) array of x,y force components
+    load_cases = np.asarray(load_cases, dtype=float).reshape(len(load_cases), -1, 2)
+    angle = load_cases[:, :, 1]*3.14159/180
+    forces = np.empty(load_cases.shape)
+    forces[:, :, 0] = load_cases[:, :, 0]*np.cos(angle)
+    forces[:, :, 1] = load_cases[:, :, 0]*np.sin(angle)
+    return forces.reshape(load_cases.shape[0], -1)
+
+def readLoadCases(initial_conds):
+    #Return the list of load cases of a model, the "load_cases" list if given, otherwise the single "force" list
+    if "load_cases" in initial_conds:
+        return initial_conds["load_cases"]
+    return [initial_conds["force"]]
+
+def trimLoadCases(initial_disp,forces):
+    #Keep the free dof entries of a (cases x dofs) force array, returned as a (free dofs x cases) right hand side
+    return np.asarray(forces, dtype=float)[:, freeDofs(initial_disp)].T
+
+def elementDisplacements(elements,disp_vector):
+    #Gather the [u_start, v_start, u_end, v_end] displacements of every element {elementDofs in this file}
+    #disp_vector is a dof vector or a (cases x dofs) array, result is (elements x 4) or (cases x elements x 4)
+    return np.asarray(disp_vector, dtype=float)[..., elementDofs(elements)]
 
-        # Perform the dot product of the transformation matrix and the resulting displacements
-        # to find deflection in local coordinate system
-        local_deflection = np.dot(element.strain_matrix, disp)
-        element_strain.append(local_deflection/element.length)
+def calcStrain(elements,disp_vector):
+    #Input a list of elements (or a TrussModel) and the final_disp vector (or a cases x dofs array), return strain in each element
+    strain_matrix = elementArray(elements, "strain_matrix", (-1, 4))
+    length = elementArray(elements, "length", -1)
 
-    return element_strain
+    # Perform the dot product of the transformation matrix and the corresponding displacements of all elements
+    # to find deflection in local coordinate system, divide by the length for the strain
+    local_deflection = np.einsum("...ej,ej->...e", elementDisplacements(elements, disp_vector), strain_matrix)
+    return local_deflection/length
 
 def calcStress(elements,disp_vector):
-    #Input a list of elements and the final_disp vector, return stress in each element
-
-    #Create a list to store stresses in each element
-    stress = []
-    for element in elements:
-        disp = []
-        #Get order of nodes in element
-        start_node = element.connecting_nodes[0]*2
-        end_node = element.connecting_nodes[1]*2
+    #Input a list of elements (or a TrussModel) and the final_disp vector (or a cases x dofs array), return stress in each element
+    stress_matrix = elementArray(elements, "stress_matrix", (-1, 4))
 
-        #Slice the corresponding displacements of each node from the displacement vector
-        #Extend method appends each entry in the list (as opposed to appending the list)
-        disp.extend(disp_vector[start_node:start_node+2])
-        disp.extend(disp_vector[end_node:end_node+2])
-
-        #Perform the dot product of the stress transformation matrix and the corresponding displacements,
-        #append to stress list after each iteration
-        stress.append(np.dot(element.stress_matrix,disp))
-
-    return stress
+    #Perform the dot product of the stress transformation matrix and the corresponding displacements of all elements
+    return np.einsum("...ej,ej->...e", elementDisplacements(elements, disp_vector), stress_matrix)
 
 def calcElementForces(stresses,diameters):
+    #Axial force = stress * area, stresses may be a vector or a (cases x elements) array
+    #diameters may also be a TrussModel, its areas are used directly
+    if isinstance(diameters, TrussModel):
+        return np.asarray(stresses, dtype=float) * diameters.A
+    return np.asarray(stresses, dtype=float) * diaToArea(np.asarray(diameters, dtype=float))
 
-    element_forces = []
-    for i in range(0,len(stresses)):
-        force = stresses[i] * diaToArea(diameters[i])
-        element_forces.append(force)
-    return element_forces
-
-def reactionForces(global_stiffness,disp_vector):
+def reactionForces(global_stiffness,disp_vector,initial_disp=None):
     #Find the reaction forces at each boundary given the global stiffness matrix and the displacement vector
     #R_force = [K]*[U]
-
-    #Find the indexes of the displacement vector that are non-zero (ie not a boundary)
-    #Use to create list of indexes of columns to delete from global stiffness matrix
-    to_delete = []
-    for i in range(0,len(disp_vector)):
-        if disp_vector[i] != 0:
-            to_delete.append(i)
-
-    #Delete the columns from the global stiffness matrix corresponding to the to_delete list
-    global_stiffness = np.delete(global_stiffness,to_delete,0)
-
-    #Calculate the reaction forces using the dot product
-    r_forces = np.dot(global_stiffness,disp_vector)
-
-    #Recompile the r_forces by adding 0s where the columns were deleted
-    #Output list holds the final reaction force vector
-    output = []
-    #Counter tracks which entries from r_forces vector have been appended to output list
-    counter = 0
-    for i in range(0,len(disp_vector)):
-        if i in to_delete:
-            output.append(0)
-        else:
-            output.append(r_forces[counter])
-            counter = counter +1
+    #disp_vector may be a dof vector or a (cases x dofs) array, the result has the same shape
+
+    disp_vector = np.asarray(disp_vector, dtype=float)
+    #Find the boundary dofs, from the initial displacement conditions if given,
+    #otherwise the entries of the displacement vector that are zero (in every case)
+    if initial_disp is not None:
+        boundary = ~freeDofs(initial_disp)
+    else:
+        boundary = np.all(disp_vector.reshape(-1, disp_vector.shape[-1]) == 0, axis=0)
+    rows = np.flatnonzero(boundary)
+
+    #Keep only the boundary rows of the global stiffness matrix
+    if sp.issparse(global_stiffness):
+        global_stiffness = global_stiffness.tocsr()[rows]
+    else:
+        global_stiffness = np.asarray(global_stiffness)[rows]
+
+    #Calculate the reaction forces using the dot product, every load case at once
+    r_forces = global_stiffness.dot(disp_vector.T).T
+
+    #Recompile the r_forces by adding 0s at the free dofs
+    output = np.zeros(disp_vector.shape)
+    output[..., rows] = r_forces
 
     return output
 
@@ -232,6 +275,12 @@ def reactionForces(global_stiffness,disp_vector):
 def printTable(name,vector):
     #Print out final results from analysis
 
+    if name == "solver":
+        print("Solver")
+        for key in vector:
+            print(key, " : ", vector[key])
+        print("\n")
+
     if name == "disp":
         print("Final Displacements")
         for i in range(0,len(vector)):
@@ -259,6 +308,15 @@ def printTable(name,vector):
             print("Element %d" %i, " : ", vector[i])
         print("\n")
 
+    if name == "load_steps":
+        print("Load Steps")
+        for i in range(0,len(vector)):
+            step = vector[i]
+            print("Step %d" %i, " : ", "load factor %.4g, %d iterations, residual %.3e, %d factorizations%s" %
+                  (step["load_factor"], step["iterations"], step["relative_residual"], step["factorizations"],
+                   "" if step["converged"] else ", not converged"))
+        print("\n")
+
     if name == "reaction":
         print("Reaction Forces")
         for i in range(0,len(vector)):
@@ -269,95 +327,12 @@ def printTable(name,vector):
         print("\n")
 
 
-def plotTruss(node_list,element_list,i_disp,i_force):
+def plotTruss(node_list,element_list,i_disp,i_force,filename=None):
     #Plot a schematic view of the analyzed structure using matplotlib
-
-    #Plot the elements used in simulation
-    for i in range(0,len(element_list)):
-        #Create lists to hold the start and finish point of each element, reset after each iteration for new element
-        x = []
-        y = []
-        #Get coords of starting node and ending node
-        node1 = element_list[i].connecting_nodes[0]
-        node2 = element_list[i].connecting_nodes[1]
-
-        #Append the coordinates of the start point
-        x.append(node_list[node1].node_coords[0])
-        y.append(node_list[node1].node_coords[1])
-        #Append coordinates of end point
-        x.append(node_list[node2].node_coords[0])
-        y.append(node_list[node2].node_coords[1])
-        #Plot the line corresponding to the element
-        plt.plot(x,y)
-        #Annotate at the middle of the element the element number
-        midpoint = element_list[i].midpoint
-        plt.annotate("E%d" % i,(midpoint[0],midpoint[1]))
-
-    #Plot the nodes and forces used in the simulation
-    for i in range(0,len(node_list)):
-        #Get the x,y coordinate of the node
-        x = node_list[i].node_coords[0]
-        y = node_list[i].node_coords[1]
-        #Annotate at the node location its number
-        plt.annotate("N%d" % node_list[i].node_num,(x,y))
-
-        #Get the x,y components of the force at the i'th node
-        force = i_force[i]
-        print(force)
-        #Create lists to hold the start and end points of the force vector
-        force_x = []
-        force_y = []
-        #Append the current node coordinates as the start point of the force vector
-        force_x.append(x)
-        force_y.append(y)
-
-        #Scale the force using a log function (to maintain some relativity of magnitude)
-        #If force is between -1 < F < 1 then dont use log function
-        #Append the end x coordinate
-        if abs(force[0] + force[1]) > 0 :
-            if force[0] > 1:
-                force_x.append(math.log(force[0]) + x)
-            elif force[0] < -1:
-                force_x.append(-1*math.log(-1*force[0]) + x)
-            else:
-                force_x.append(force[0] + x)
-        else:
-            force_x.append(x)
-
-        # Append the end y coordinate
-        if abs(force[1]) > 0:
-            if force[1] > 1:
-                force_y.append(math.log(force[1]) + y)
-            elif force[1] < -1:
-                force_y.append(-1*math.log(-1*force[1]) + y)
-            else:
-                force_y.append(force[1]+ y)
-        else:
-            force_y.append(y)
-
-        #Calculate the netforce of the vector, if non-zero then plot
-        net_force = math.ceil(pow(pow(force[0],2) + pow(force[1],2),0.5))
-        if net_force > 0:
-            plt.plot(force_x, force_y, linewidth='5', linestyle='--', marker="P", markersize='15', markevery=[1])
-            #Annotate the net force of the vector at the end point of the force
-            plt.annotate("F: %d" % (net_force),(force_x[1],force_y[1]))
-
-    #Print the location of boundary conditions, indicate which type
-    for t in range(0,len(i_disp)):
-        #Get x and y coordinates of the current node
-        x = node_list[t].node_coords[0]
-        y = node_list[t].node_coords[1]
-
-        #If the initial displacement is set to 0, plot a marker showing which type of boundary condition exists
-        if i_disp[t][0] == 0 and i_disp[t][1] == 0:
-            #Circle marker indicates a pinned joint
-            plt.plot(x,y,"o",markersize=15)
-        elif i_disp[t][0] == 0:
-            # Horizontal triangle indicates rolling pinned joint restricted to y translation(fixed in x direction)
-            plt.plot(x, y, ">",markersize=15)
-        elif i_disp[t][1] == 0:
-            #Vertical triangle indicates rolling pinned joint restricted to x translation (fixed in y direction)
-            plt.plot(x, y, "^",markersize=15)
-
-    #Show the figure
-    plt.show()
+    #If filename is given the figure is saved to the file instead of shown, so it can be used without a display
+    #All elements are drawn as one line collection and the numbers are only written on small models
+    #{drawTruss in trussPlot.py}, plotModel there plots a TrussModel directly from its arrays
+    from trussPlot import drawTruss
+    coords = np.array([node.node_coords for node in node_list], dtype=float).reshape(-1, 2)
+    connectivity = np.array([element.connecting_nodes for element in element_list], dtype=np.int64).reshape(-1, 2)
+    drawTruss(coords, connectivity, i_disp, i_force, filename=filename)
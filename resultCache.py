@@ -0,0 +1,241 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+import scipy.sparse as sp
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from projectFunc import readLoadCases
+#----------------------------------------------------------------------------------------------------------------------#
+#Content addressed on-disk cache of analysis results and assembled matrices
+#Entries are named by the sha256 of the canonicalized model (the numbers of the model, not the text of its file),
+#written to a temporary file and renamed into place so readers never see a partial entry, and evicted least recently
+#used first when the cache grows over its size limit. Writers and eviction hold a lock file (fcntl), so several
+#worker processes can share one cache directory
+
+#Changing the layout of the entries changes every key, old entries are then never read and get evicted
+CACHE_VERSION = 1
+#Result arrays of analyzeModel {trussAnalysis.py} stored in a result entry
+RESULT_ARRAYS = ["displacement", "strain", "stress", "element_force", "reaction"]
+#Sparse matrices stored in a matrix entry
+MATRIX_NAMES = ["K_ff", "K_cf", "K_cc"]
+
+def canonicalArray(value,dtype=float):
+    #Contiguous float64 / int64 array of a list, -0.0 becomes 0.0 so equal models give equal bytes
+    array = np.ascontiguousarray(value, dtype=dtype)
+    if dtype == float:
+        array = array + 0.0
+    return array
+
+def hashArrays(items,options):
+    #sha256 of named arrays (name, dtype, shape and data) and a dictionary of options
+    digest = hashlib.sha256()
+    digest.update(("truss-cache-%d" % CACHE_VERSION).encode())
+    for name, array in items:
+        digest.update(("%s|%s|%s|" % (name, array.dtype.str, array.shape)).encode())
+        digest.update(array.tobytes())
+    digest.update(json.dumps(options, sort_keys=True).encode())
+    return digest.hexdigest()
+
+def stiffnessItems(IC):
+    #The model data the stiffness matrix depends on: geometry, sections and which dofs are free
+    element_params = IC['element_params']
+    return [
+        ("nodes", canonicalArray(IC['nodes']).reshape(-1, 2)),
+        ("node_connections", canonicalArray(element_params["node_connections"], np.int64).reshape(-1, 2)),
+        ("E", canonicalArray(element_params["E"]).reshape(-1)),
+        ("D", canonicalArray(element_params["D"]).reshape(-1)),
+        ("free", (canonicalArray(IC['initial_conds']["displacement"]).reshape(-1) != 0).astype(np.int64)),
+    ]
+
+def matrixKey(IC,ordering="none"):
+    #Key of the assembled matrices of a model, loads and solver settings do not change them
+    return hashArrays(stiffnessItems(IC), {"kind": "matrices", "ordering": ordering})
+
+def modelKey(IC,solver="auto",ordering="none",preconditioner=None,precision="double",nonlinear=None):
+    #Key of the results of a model: the stiffness data, every load case, support displacements and solver settings
+    items = stiffnessItems(IC)
+    items.append(("load_cases", canonicalArray(readLoadCases(IC["initial_conds"]))))
+    support_displacement = IC['initial_conds'].get("support_displacement")
+    if support_displacement is not None:
+        items.append(("support_displacement", canonicalArray(support_displacement).reshape(-1)))
+    options = {"kind": "results", "solver": solver, "ordering": ordering, "preconditioner": preconditioner,
+               "precision": precision, "nonlinear": nonlinear}
+    return hashArrays(items, options)
+
+def jsonDefault(value):
+    #numpy scalars / arrays in the solver and ordering information
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("%s is not JSON serializable" % type(value).__name__)
+
+class ResultCache():
+    #Cache directory shared by any number of processes, each keeps its own hit/miss counters
+    def path(self,key,kind):
+        #Entries are spread over 256 sub directories by the first two hex digits of their key
+        return os.path.join(self.directory, key[:2], "%s.%s.npz" % (key, kind))
+
+    @contextlib.contextmanager
+    def locked(self):
+        #Exclusive lock of the cache directory (no locking where fcntl is not available)
+        with open(os.path.join(self.directory, ".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self,key,kind):
+        #Arrays and metadata dictionary of an entry, None if it is not cached
+        file = self.path(key, kind)
+        try:
+            with np.load(file, allow_pickle=False) as data:
+                arrays = dict((name, data[name]) for name in data.files if name != "metadata")
+                metadata = json.loads(str(data["metadata"]))
+        except (OSError, ValueError, KeyError):
+            #Missing, evicted by another process meanwhile, or unreadable
+            self.misses[kind] = self.misses.get(kind, 0) + 1
+            return None
+        #Mark the entry as recently used for the eviction
+        try:
+            os.utime(file)
+        except OSError:
+            pass
+        self.hits[kind] = self.hits.get(kind, 0) + 1
+        return arrays, metadata
+
+    def store(self,key,kind,arrays,metadata):
+        #Write an entry atomically: to a temporary file in the cache directory, then renamed to its name
+        file = self.path(key, kind)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as output:
+                np.savez(output, metadata=np.array(json.dumps(metadata, default=jsonDefault)), **arrays)
+            with self.locked():
+                os.replace(temporary, file)
+                self.stores = self.stores + 1
+                self.evict()
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def entries(self):
+        #(last use time, size, file) of every entry
+        found = []
+        for sub_directory in os.scandir(self.directory):
+            if not sub_directory.is_dir():
+                continue
+            for entry in os.scandir(sub_directory.path):
+                if entry.name.endswith(".npz"):
+                    try:
+                        status = entry.stat()
+                    except OSError:
+                        continue
+                    found.append((status.st_mtime, status.st_size, entry.path))
+        return found
+
+    def evict(self):
+        #Remove the least recently used entries until the cache fits in max_bytes (called with the lock held)
+        found = sorted(self.entries())
+        total = sum(size for _, size, _ in found)
+        for _, size, file in found:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(file)
+            except OSError:
+                continue
+            total = total - size
+            self.evictions = self.evictions + 1
+
+    def getResults(self,key):
+        #Result dictionary of analyzeModel stored under key, None on a miss
+        entry = self.load(key, "results")
+        if entry is None:
+            return None
+        arrays, metadata = entry
+        results = dict(metadata)
+        for name in RESULT_ARRAYS:
+            results[name] = arrays[name]
+        return results
+
+    def putResults(self,key,results):
+        #Store the result dictionary of analyzeModel under key
+        arrays = dict((name, np.asarray(results[name])) for name in RESULT_ARRAYS)
+        metadata = dict((name, value) for name, value in results.items() if name not in RESULT_ARRAYS)
+        self.store(key, "results", arrays, metadata)
+
+    def getMatrices(self,key):
+        #Dictionary of the K_ff, K_cf, K_cc blocks, the extra arrays and "metadata" stored under key, None on a miss
+        entry = self.load(key, "matrices")
+        if entry is None:
+            return None
+        arrays, metadata = entry
+        output = {"metadata": metadata}
+        for name in MATRIX_NAMES:
+            parts = [arrays.pop(name + suffix) for suffix in ("_data", "_indices", "_indptr", "_shape")]
+            output[name] = sp.csr_matrix(tuple(parts[:3]), shape=tuple(parts[3]))
+        output.update(arrays)
+        return output
+
+    def putMatrices(self,key,K_ff,K_cf,K_cc,metadata=None,**arrays):
+        #Store the assembled blocks of the reduced system, with optional extra arrays (ie. the node ordering)
+        for name, matrix in zip(MATRIX_NAMES, (K_ff, K_cf, K_cc)):
+            matrix = sp.csr_matrix(matrix)
+            arrays[name + "_data"] = matrix.data
+            arrays[name + "_indices"] = matrix.indices
+            arrays[name + "_indptr"] = matrix.indptr
+            arrays[name + "_shape"] = np.array(matrix.shape)
+        self.store(key, "matrices", arrays, metadata or {})
+
+    def size(self):
+        #Total bytes of the entries in the cache directory
+        return sum(size for _, size, _ in self.entries())
+
+    def clear(self):
+        #Remove every entry
+        with self.locked():
+            for _, _, file in self.entries():
+                try:
+                    os.remove(file)
+                except OSError:
+                    pass
+
+    def stats(self):
+        #Counters of this ResultCache object, hits and misses are also given per kind of entry
+        hits = sum(self.hits.values())
+        lookups = hits + sum(self.misses.values())
+        return {
+            "hits": hits,
+            "misses": lookups - hits,
+            "hit_rate": hits / float(lookups) if lookups else 0.0,
+            "hits_by_kind": dict(self.hits),
+            "misses_by_kind": dict(self.misses),
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+    def __init__(self,directory,max_bytes=2 ** 30):
+        #directory: cache directory (created if needed), max_bytes: size limit of all entries together
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self.hits = {}
+        self.misses = {}
+        self.stores = 0
+        self.evictions = 0
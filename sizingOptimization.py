@@ -0,0 +1,216 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import minimize
+from projectFunc import *
+from solverEngine import *
+from dofMap import *
+from trussAnalysis import buildModel
+#----------------------------------------------------------------------------------------------------------------------#
+#Minimum weight sizing of the member diameters D under stress (and displacement) limits, with adjoint sensitivities
+#K = sum A_j*K0_j with K0_j = E_j/L_j * b_j*b_j^T, so for any response r = a^T u (a stress or a displacement):
+#   dr/dA_j = -lambda^T (dK/dA_j) u = -sigma_j * (b_j . lambda_j),   K*lambda = a   (one adjoint solve per response)
+#   d(compliance)/dA_j = -u_j^T K0_j u_j = -sigma_j^2 * L_j / E_j
+#Areas come from the diameters with diaToArea, dA/dD = 2*(3.14159/4)*D
+
+def areaDerivative(D):
+    #dA/dD of diaToArea {projectFunc.py}
+    return 2.0 * D * 3.14159 / 4
+
+def complianceSensitivity(model,displacement):
+    #Compliance f^T u and its derivative with respect to the element areas, for every load case
+    #displacement is a (cases x dofs) array of the current design
+    stresses = calcStress(model, displacement)
+    sensitivity = -stresses ** 2 * (model.length / model.E)
+    #f^T u = u^T K u = sum over elements A_j * sigma_j^2 * L_j / E_j
+    compliance = np.sum(model.A * stresses ** 2 * (model.length / model.E), axis=-1)
+    return compliance, sensitivity
+
+def adjointGather(model,dof_map,adjoint):
+    #b_j . lambda_j for every element j and every adjoint vector: adjoint is (free dofs x n), result is (n x elements)
+    full = np.zeros((dof_map.num_dofs, adjoint.shape[1]))
+    full[dof_map.free] = adjoint
+    return np.einsum("jk,jkn->nj", model.strain_matrix, full[model.dofs])
+
+def stressRows(model,dof_map):
+    #(elements x free dofs) sparse matrix S with sigma = S*u_f (+ the prescribed support displacement part)
+    rows = np.repeat(np.arange(model.num_elements), 4)
+    columns = dof_map.free_index[model.dofs].ravel()
+    keep = columns >= 0
+    return sp.csr_matrix((model.stress_matrix.ravel()[keep], (rows[keep], columns[keep])),
+                         shape=(model.num_elements, dof_map.num_free))
+
+def stressSensitivity(model,dof_map,factorization,stresses):
+    #Derivative of every member stress of every load case with respect to every area, (cases x elements x elements)
+    #The adjoint vectors K^-1 s_i do not depend on the load case, all of them are found in one batch solve
+    adjoint = factorization.solve(stressRows(model, dof_map).T.toarray())
+    gathered = adjointGather(model, dof_map, adjoint.reshape(dof_map.num_free, -1))
+    return -gathered[None, :, :] * stresses[:, None, :]
+
+def displacementSensitivity(model,dof_map,factorization,stresses,dofs):
+    #Derivative of the given global dofs of every load case with respect to every area, (cases x len(dofs) x elements)
+    dofs = np.asarray(dofs, dtype=np.int64).reshape(-1)
+    unit = np.zeros((dof_map.num_free, dofs.shape[0]))
+    unit[dof_map.free_index[dofs], np.arange(dofs.shape[0])] = 1.0
+    gathered = adjointGather(model, dof_map, factorization.solve(unit).reshape(unit.shape))
+    return -gathered[None, :, :] * stresses[:, None, :]
+
+def ksAggregate(values,rho=50.0):
+    #Kreisselmeier-Steinhauser smooth maximum of an array, returns the value and its derivative (softmax weights)
+    peak = np.max(values)
+    weights = np.exp(rho * (values - peak))
+    total = np.sum(weights)
+    return peak + np.log(total) / rho, weights / total
+
+class SizingProblem():
+    #Evaluates weight, stresses, displacements and their adjoint sensitivities for a vector of diameters
+    def evaluate(self,D):
+        #Analyze the design D (cached, the optimizer asks for values and gradients of the same design)
+        D = np.asarray(D, dtype=float)
+        if self.last_D is not None and np.array_equal(D, self.last_D):
+            return
+        self.model.section_update(np.arange(self.model.num_elements), A=diaToArea(D), D=D)
+        K_ff, K_cf, K_cc = assembleReduced(self.model, self.dof_map)
+        self.factorization = Factorization(K_ff, self.solver)
+        u_free = self.factorization.solve(self.dof_map.reduceForces(self.case_forces, K_cf))
+        self.displacement = self.dof_map.expand(u_free.reshape(self.dof_map.num_free, -1))
+        self.stresses = calcStress(self.model, self.displacement)
+        self.last_D = D.copy()
+        self.evaluations = self.evaluations + 1
+
+    def weight(self,D):
+        return float(np.sum(self.density * self.model.length * diaToArea(np.asarray(D, dtype=float))))
+
+    def weightGradient(self,D):
+        return self.density * self.model.length * areaDerivative(np.asarray(D, dtype=float))
+
+    def constraints(self,D):
+        #Constraint values, all >= 0 when feasible: 1 - sigma/allowable_tension, 1 + sigma/allowable_compression,
+        #and 1 -/+ u/limit for the limited dofs. With aggregate=True a single constraint -log(KS(ratios)), the log
+        #keeps it close to linear for the optimizer since the ratios scale roughly with 1/A
+        self.evaluate(D)
+        ratios = self.ratios()
+        if self.aggregate:
+            return np.array([-np.log(ksAggregate(ratios, self.rho)[0])])
+        return 1.0 - ratios
+
+    def ratios(self):
+        #Response / limit ratios of the current design (feasible when all <= 1)
+        parts = [self.stresses / self.allowable_tension, -self.stresses / self.allowable_compression]
+        if self.displacement_dofs is not None:
+            limited = self.displacement[:, self.displacement_dofs]
+            parts.extend([limited / self.displacement_limits, -limited / self.displacement_limits])
+        return np.concatenate([part.ravel() for part in parts])
+
+    def constraintJacobian(self,D):
+        #Derivative of the constraints with respect to the diameters (constraints x elements)
+        self.evaluate(D)
+        scale = areaDerivative(np.asarray(D, dtype=float))
+        if self.aggregate:
+            value = ksAggregate(self.ratios(), self.rho)[0]
+            return -self.aggregatedGradient()[None, :] * scale / value
+        stress_gradient = stressSensitivity(self.model, self.dof_map, self.factorization, self.stresses)
+        parts = [stress_gradient / self.allowable_tension, -stress_gradient / self.allowable_compression]
+        if self.displacement_dofs is not None:
+            displacement_gradient = displacementSensitivity(self.model, self.dof_map, self.factorization,
+                                                            self.stresses, self.displacement_dofs)
+            limits = self.displacement_limits[None, :, None]
+            parts.extend([displacement_gradient / limits, -displacement_gradient / limits])
+        jacobian = np.concatenate([part.reshape(-1, self.model.num_elements) for part in parts])
+        return -jacobian * scale
+
+    def aggregatedGradient(self):
+        #Derivative of KS(ratios) with respect to the areas with one adjoint solve per load case:
+        #the KS weights combine all stress / displacement rows into one adjoint right hand side
+        value, weights = ksAggregate(self.ratios(), self.rho)
+        cases = self.stresses.shape[0]
+        elements = self.model.num_elements
+        stress_weights = (weights[:cases * elements].reshape(cases, elements) / self.allowable_tension
+                          - weights[cases * elements:2 * cases * elements].reshape(cases, elements)
+                          / self.allowable_compression)
+        rhs = stressRows(self.model, self.dof_map).T.dot(stress_weights.T)
+        if self.displacement_dofs is not None:
+            count = self.displacement_dofs.shape[0]
+            offset = 2 * cases * elements
+            positive = weights[offset:offset + cases * count].reshape(cases, count)
+            negative = weights[offset + cases * count:].reshape(cases, count)
+            rows = self.dof_map.free_index[self.displacement_dofs]
+            np.add.at(rhs, rows, ((positive - negative) / self.displacement_limits).T)
+        gathered = adjointGather(self.model, self.dof_map,
+                                 self.factorization.solve(rhs).reshape(self.dof_map.num_free, cases))
+        return -np.sum(gathered * self.stresses, axis=0)
+
+    def __init__(self,IC,allowable_tension,allowable_compression=None,density=1.0,displacement_limits=None,
+                 aggregate=False,rho=50.0,solver="auto"):
+        #IC: model dictionary, its "D" values are the starting design
+        #allowable_tension / allowable_compression: stress limits (compression defaults to the tension limit)
+        #density: weight per unit volume, scalar or per element (weight = sum density*L*A)
+        #displacement_limits: optional {global dof: limit of |u|}
+        #aggregate: replace the member constraints by one KS constraint (one adjoint solve per load case)
+        self.model = buildModel(IC)
+        self.dof_map = dofMapFromConditions(IC['initial_conds'])
+        self.case_forces = transformLoadCases(readLoadCases(IC["initial_conds"]))
+        self.allowable_tension = float(allowable_tension)
+        self.allowable_compression = float(allowable_compression or allowable_tension)
+        self.density = np.broadcast_to(np.asarray(density, dtype=float), (self.model.num_elements,))
+        self.displacement_dofs = None
+        if displacement_limits:
+            self.displacement_dofs = np.array(sorted(displacement_limits), dtype=np.int64)
+            self.displacement_limits = np.array([displacement_limits[dof] for dof in self.displacement_dofs],
+                                                dtype=float)
+        self.aggregate = aggregate
+        self.rho = rho
+        self.solver = solver
+        self.last_D = None
+        self.evaluations = 0
+
+def sizeMembers(IC,allowable_tension,allowable_compression=None,D_min=0.01,D_max=10.0,density=1.0,
+                displacement_limits=None,aggregate=False,rho=50.0,max_iter=100,tolerance=1e-6,callback=None):
+    #Minimize the weight over the member diameters with SLSQP, using the adjoint constraint gradients
+    #aggregate=True trades the (constraints x elements) jacobian and one adjoint per member for a single KS constraint,
+    #slightly conservative (by about log(constraints)/rho) and needing more iterations, for models too large for the
+    #member constraints
+    #The optimizer works on x = log(D): stresses scale with 1/D^2, so the log of the ratios is close to linear in x
+    #(exactly linear for a statically determinate truss) and the steps stay reasonable
+    #callback(iteration, D, weight, max_ratio) is called after every optimizer iteration
+    #Returns a dictionary with the final diameters, weight, largest response/limit ratio and the weight history
+    problem = SizingProblem(IC, allowable_tension, allowable_compression, density, displacement_limits, aggregate,
+                           rho)
+    x0 = np.log(np.clip(np.asarray(IC['element_params']["D"], dtype=float), D_min, D_max))
+    history = []
+
+    def record(x):
+        D = np.exp(x)
+        problem.evaluate(D)
+        entry = {"iteration": len(history), "weight": problem.weight(D),
+                 "max_ratio": float(np.max(problem.ratios())), "evaluations": problem.evaluations}
+        history.append(entry)
+        if callback is not None:
+            callback(entry["iteration"], D, entry["weight"], entry["max_ratio"])
+
+    #Chain rule d/dx = D * d/dD
+    constraints = {"type": "ineq", "fun": lambda x: problem.constraints(np.exp(x)),
+                   "jac": lambda x: problem.constraintJacobian(np.exp(x)) * np.exp(x)}
+    record(x0)
+    result = minimize(lambda x: problem.weight(np.exp(x)), x0,
+                      jac=lambda x: problem.weightGradient(np.exp(x)) * np.exp(x), method="SLSQP",
+                      bounds=[(np.log(D_min), np.log(D_max))] * x0.shape[0], constraints=[constraints],
+                      options={"maxiter": max_iter, "ftol": tolerance}, callback=record)
+    D = np.exp(result.x)
+    problem.evaluate(D)
+    return {
+        "D": D,
+        "weight": problem.weight(D),
+        "max_ratio": float(np.max(problem.ratios())),
+        "success": bool(result.success),
+        "message": result.message,
+        "iterations": int(result.nit),
+        "evaluations": problem.evaluations,
+        "history": history,
+        "stress": problem.stresses,
+        "displacement": problem.displacement,
+    }
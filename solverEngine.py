@@ -0,0 +1,272 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import time
+import numpy as np
+import scipy.linalg as la
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+from gaussSeidel import calcGS
+#----------------------------------------------------------------------------------------------------------------------#
+#Optional CHOLMOD bindings (python -m pip install scikit-sparse), SuperLU from scipy is used when not installed
+try:
+    from sksparse.cholmod import cholesky as cholmod_cholesky
+except ImportError:
+    cholmod_cholesky = None
+
+#Names of the available solver backends
+SOLVERS = ["auto", "cholesky", "dense", "gauss_seidel"]
+#Largest number of unknowns solved with the dense LAPACK backend when "auto" is selected
+DENSE_LIMIT = 500
+#Precision of the direct factorizations: "double" (float64) or "mixed" (float32 factors, half the memory, refined
+#to float64 accuracy against the float64 matrix)
+PRECISIONS = ["double", "mixed"]
+#Mixed precision refinement stops once every load case is solved to double precision backward error,
+#|f - K*u| <= |u| * |K| * eps * sqrt(n) in the infinity norm (the test of LAPACK dsgesv), and falls back to a
+#double precision factorization when a step reduces the residual by less than STALL_RATIO or after MAX_REFINEMENTS
+STALL_RATIO = 0.5
+MAX_REFINEMENTS = 20
+#A stiffness matrix is singular when a pivot of its factorization is below PIVOT_TOLERANCE times its diagonal entry
+#(a mechanism the validation counts can't see), checkPivots {modelValidation.py} then names the dofs at fault
+PIVOT_TOLERANCE = 1e-9
+
+class SingularMatrixError(la.LinAlgError):
+    #Raised by Factorization when a stiffness matrix that should be positive definite is singular
+    pass
+
+def chooseSolver(matrix,method="auto"):
+    #Resolve the "auto" backend from the size of the system, check that the requested backend exists
+    if method not in SOLVERS:
+        raise ValueError("Unknown solver '%s', expected one of %s" % (method, SOLVERS))
+    if method == "auto":
+        if matrix.shape[0] <= DENSE_LIMIT:
+            return "dense"
+        return "cholesky"
+    return method
+
+class Factorization():
+    #Holds the factorization of a symmetric positive definite stiffness matrix so it can be reused for many solves
+    #With precision "mixed" the factors are float32 and every solve is refined against the float64 matrix
+    #A definite matrix that turns out singular raises SingularMatrixError, matrices that may be indefinite
+    #(nonlinear tangents, shifted modal systems) are created with definite=False
+    def factorDense(self,matrix,dtype=float):
+        #Dense LAPACK Cholesky (potrf), an indefinite matrix falls back to an LU factorization (getrf)
+        if sp.issparse(matrix):
+            matrix = matrix.toarray()
+        matrix = np.asarray(matrix, dtype=dtype)
+        try:
+            self.factor = la.cho_factor(matrix)
+            self.kind = "dense_cholesky"
+        except la.LinAlgError:
+            if self.definite:
+                raise SingularMatrixError("The stiffness matrix is not positive definite (Cholesky failed)")
+            self.factor = la.lu_factor(matrix)
+            self.kind = "dense_lu"
+
+    def factorSparse(self,matrix,dtype=float):
+        #Sparse Cholesky (CHOLMOD) if available, otherwise a symmetric mode SuperLU factorization (LDL^T like pivoting
+        #on the diagonal with a fill reducing ordering of K + K^T). CHOLMOD is double only, float32 uses SuperLU
+        matrix = sp.csc_matrix(matrix, dtype=dtype)
+        if cholmod_cholesky is not None and matrix.dtype == np.float64 and self.definite:
+            try:
+                self.factor = cholmod_cholesky(matrix)
+            except Exception as error:
+                #CholmodNotPositiveDefiniteError
+                raise SingularMatrixError("The stiffness matrix is not positive definite (%s)" % error)
+            self.kind = "cholmod"
+        else:
+            try:
+                self.factor = spla.splu(matrix, permc_spec="MMD_AT_PLUS_A", diag_pivot_thresh=0.0,
+                                        options={"SymmetricMode": True})
+            except RuntimeError as error:
+                #"Factor is exactly singular"
+                if self.definite:
+                    raise SingularMatrixError("The stiffness matrix is singular (%s)" % error)
+                raise
+            self.kind = "superlu"
+
+    def pivots(self):
+        #Pivots of the factorization in the dof order of the matrix (d_j of K = L*D*L^T)
+        if self.kind == "dense_cholesky":
+            return np.diagonal(self.factor[0]) ** 2
+        if self.kind == "cholmod":
+            return self.factor.D()[np.argsort(self.factor.P())]
+        #Symmetric mode SuperLU pivots on the diagonal: pivot j of U belongs to the dof with perm_c[dof] = j
+        #(builds U, a copy of about half of the factors, only for the time of the check)
+        return self.factor.U.diagonal()[self.factor.perm_c]
+
+    def checkPivots(self,matrix):
+        #Raise SingularMatrixError when a pivot is tiny next to its diagonal entry (the factorization of a mechanism
+        #only succeeds through round off)
+        if matrix.shape[0] == 0:
+            return
+        diagonal = matrix.diagonal() if sp.issparse(matrix) else np.diagonal(matrix)
+        ratio = np.abs(self.pivots()) / np.where(diagonal > 0, diagonal, 1.0)
+        ratio[diagonal <= 0] = 0.0
+        if np.min(ratio) <= PIVOT_TOLERANCE:
+            raise SingularMatrixError("The stiffness matrix is singular: %d pivots below %g times their diagonal" %
+                                      (np.count_nonzero(ratio <= PIVOT_TOLERANCE), PIVOT_TOLERANCE))
+
+    def factorize(self,matrix,dtype):
+        #Factorize with the selected backend in dtype (float or np.float32), the time adds up over refactorizations
+        #float32 factors of a definite matrix that look singular are replaced by float64 ones, which are checked
+        start = time.perf_counter()
+        try:
+            if self.method == "dense":
+                self.factorDense(matrix, dtype)
+            else:
+                self.factorSparse(matrix, dtype)
+            if self.definite and dtype != np.float32:
+                self.checkPivots(matrix)
+        except SingularMatrixError:
+            if dtype != np.float32:
+                raise
+            self.factor_time = self.factor_time + time.perf_counter() - start
+            self.fallback = True
+            self.factorize(matrix, float)
+            return
+        self.dtype = dtype
+        self.factor_time = self.factor_time + time.perf_counter() - start
+
+    def solveFactor(self,rhs):
+        #Solve with the factors in their own precision, the solution is returned as float64
+        rhs = np.asarray(rhs, dtype=self.dtype)
+        if self.kind == "dense_cholesky":
+            solution = la.cho_solve(self.factor, rhs)
+        elif self.kind == "dense_lu":
+            solution = la.lu_solve(self.factor, rhs)
+        elif self.kind == "cholmod":
+            solution = self.factor(rhs)
+        else:
+            solution = self.factor.solve(rhs)
+        return np.asarray(solution, dtype=float)
+
+    def refine(self,rhs):
+        #Iterative refinement: the float32 factors give the correction of the float64 residual f - K*u at every step
+        #Each residual is scaled to a largest entry of 1 before it is rounded to float32 so it can't underflow
+        solution = self.solveFactor(rhs)
+        residual = rhs - self.matrix.dot(solution)
+        size = np.max(np.abs(residual), axis=0)
+        iterations = 0
+        while True:
+            converged = np.all(size <= np.max(np.abs(solution), axis=0) * self.tolerance)
+            if converged or iterations == MAX_REFINEMENTS:
+                break
+            scale = np.where(size > 0, size, 1.0)
+            solution = solution + self.solveFactor(residual / scale) * scale
+            residual = rhs - self.matrix.dot(solution)
+            previous = size
+            size = np.max(np.abs(residual), axis=0)
+            iterations = iterations + 1
+            if np.any(size > STALL_RATIO * previous):
+                converged = np.all(size <= np.max(np.abs(solution), axis=0) * self.tolerance)
+                break
+        self.refinements = self.refinements + iterations
+        if not converged:
+            #Too ill conditioned for float32 factors: factorize again in double precision, used for every later solve
+            self.factorize(self.matrix, float)
+            self.fallback = True
+            return self.solveFactor(rhs)
+        return solution
+
+    def solve(self,rhs):
+        #Solve K*u = rhs, rhs may be a vector or a (dofs x cases) matrix
+        rhs = np.asarray(rhs, dtype=float)
+        if self.dtype == np.float32:
+            return self.refine(rhs)
+        return self.solveFactor(rhs)
+
+    def __init__(self,matrix,method="auto",precision="double",definite=True):
+        #Function called when object is created, factorizes the matrix with the selected backend
+        #definite: the matrix is a stiffness matrix (symmetric positive definite), singular ones raise
+        #SingularMatrixError. With False an indefinite matrix is factorized by LU (dense backend)
+        self.method = chooseSolver(matrix, method)
+        if self.method == "gauss_seidel":
+            raise ValueError("Gauss-Seidel is iterative and has no factorization, use solveSystem instead")
+        if precision not in PRECISIONS:
+            raise ValueError("Unknown precision '%s', expected one of %s" % (precision, PRECISIONS))
+        self.precision = precision
+        self.definite = definite
+        #Refinement steps taken by all solves so far and whether the mixed precision factors were replaced
+        self.refinements = 0
+        self.fallback = False
+        self.factor_time = 0.0
+        #The float64 matrix is kept (not copied) for the residuals of the refinement
+        self.matrix = matrix if precision == "mixed" else None
+        if precision == "mixed":
+            #|K| * eps * sqrt(n) of the convergence test of the refinement
+            norm = abs(matrix).sum(axis=1).max() if matrix.shape[0] > 0 else 0.0
+            self.tolerance = float(norm) * np.finfo(float).eps * np.sqrt(matrix.shape[0])
+        self.factorize(matrix, np.float32 if precision == "mixed" else float)
+        self.shape = matrix.shape
+
+def residualNorm(matrix,solution,forces):
+    #Return the 2-norm of the residual f - K*u and the residual relative to the norm of f
+    #For a (dofs x cases) batch the largest value over all load cases is returned
+    forces = np.asarray(forces, dtype=float)
+    residual = forces - matrix.dot(solution)
+    norm = np.linalg.norm(residual, axis=0)
+    force_norm = np.linalg.norm(forces, axis=0)
+    relative = np.where(force_norm > 0, norm / np.where(force_norm > 0, force_norm, 1), norm)
+    return float(np.max(norm, initial=0.0)), float(np.max(relative, initial=0.0))
+
+def solveSystem(matrix,forces,method="auto",initial=None,tolerance=1e-8,callback=None,precision="double"):
+    #Solve the reduced system K*u = f with the selected backend
+    #precision "mixed" factorizes the direct backends in float32 and refines the solution {Factorization}
+    #forces may be a vector or a (dofs x cases) matrix, direct backends factorize once and solve all cases together
+    #callback(iteration, change) is passed to the iterative Gauss-Seidel backend {calcGS in gaussSeidel.py}
+    #Returns the solution and a dictionary of diagnostics (backend, residual norm, iterations, time, convergence)
+    method = chooseSolver(matrix, method)
+    forces = np.asarray(forces, dtype=float)
+    start = time.perf_counter()
+
+    if method == "gauss_seidel":
+        #Reference solver, entries of the starting vector that are 0 are treated as fixed by calcGS so start from 1s
+        if initial is None:
+            initial = np.ones(matrix.shape[0])
+        initial = np.asarray(initial, dtype=float)
+        if forces.ndim == 1:
+            solution, gs_info = calcGS(matrix, initial, forces, info=True, callback=callback)
+            iterations = gs_info["iterations"]
+            converged = gs_info["converged"]
+        else:
+            #Gauss-Seidel has no factorization to share, every load case is swept on its own
+            columns = []
+            iterations = 0
+            converged = True
+            for case in range(0, forces.shape[1]):
+                start_vector = initial if initial.ndim == 1 else initial[:, case]
+                column, gs_info = calcGS(matrix, start_vector, forces[:, case], info=True, callback=callback)
+                columns.append(column)
+                iterations = max(iterations, gs_info["iterations"])
+                converged = converged and gs_info["converged"]
+            solution = np.column_stack(columns)
+        factor_time = 0.0
+        kind = "gauss_seidel"
+    else:
+        factorization = Factorization(matrix, method, precision)
+        solution = factorization.solve(forces)
+        iterations = 1 + factorization.refinements
+        factor_time = factorization.factor_time
+        kind = factorization.kind
+
+    elapsed = time.perf_counter() - start
+    norm, relative = residualNorm(matrix, solution, forces)
+    info = {
+        "method": method,
+        "backend": kind,
+        "residual_norm": norm,
+        "relative_residual": relative,
+        "iterations": iterations,
+        "converged": bool(relative <= tolerance) if method != "gauss_seidel" else bool(converged),
+        "factor_time": factor_time,
+        "time": elapsed,
+    }
+    if precision == "mixed" and method != "gauss_seidel":
+        #Precision of the factors that gave the solution ("double" after a fallback) and the refinement steps
+        info["precision"] = "mixed" if factorization.dtype == np.float32 else "double"
+        info["refinements"] = factorization.refinements
+        info["precision_fallback"] = factorization.fallback
+    return solution, info
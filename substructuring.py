@@ -0,0 +1,362 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import multiprocessing
+import os
+import time
+import traceback
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+from projectFunc import elementTriplets
+from trussModel import TrussModel
+from matrixFree import applyStiffness
+from solverEngine import Factorization
+from nodeOrdering import nodeGraph, minimumDegree
+#----------------------------------------------------------------------------------------------------------------------#
+#Substructuring (Schur complement) solve for models too large for one factorization
+#The elements are split into subdomains, the nodes shared by several subdomains are the interface. Each subdomain
+#builds and assembles its own elements {TrussModel in trussModel.py, elementTriplets in projectFunc.py} and condenses
+#itself onto its interface dofs with one partial factorization {Subdomain in this file}:
+#   S_s = K_BB - K_BI*K_II^-1*K_IB,   h_s = K_BI*K_II^-1*f_I
+#The interface system (sum S_s)*u_B = f_B - sum h_s is solved once, then every subdomain back substitutes its
+#interior u_I = K_II^-1*(f_I - K_IB*u_B). Subdomains live in worker processes (one each) that keep their
+#factorization between solves, so only interface sized arrays go through the pipes
+
+#Names of the substructuring solvers
+SUBSTRUCTURE_SOLVERS = ["substructure"]
+
+def partitionElements(model,num_parts):
+    #Recursive coordinate bisection of the element midpoints: the elements are split across the longer side of their
+    #bounding box into halves sized for the number of parts on each side, until there are num_parts parts
+    #Returns the part number of every element
+    midpoints = model.coords[model.connectivity].mean(axis=1)
+    part = np.zeros(model.num_elements, dtype=np.int64)
+    pending = [(np.arange(model.num_elements), 0, min(num_parts, max(model.num_elements, 1)))]
+    while pending:
+        indices, first, count = pending.pop()
+        if count == 1 or indices.shape[0] == 0:
+            part[indices] = first
+            continue
+        points = midpoints[indices]
+        axis = int(np.argmax(np.ptp(points, axis=0)))
+        left = count // 2
+        cut = indices.shape[0] * left // count
+        order = np.argpartition(points[:, axis], cut)
+        pending.append((indices[order[:cut]], first, left))
+        pending.append((indices[order[cut:]], first + left, count - left))
+    return part
+
+class Subdomain():
+    #One subdomain in local numbering: the interior dofs come first (0..num_interior-1), the interface dofs after
+    #them, constrained dofs have code -1. Runs in a worker process {subdomainWorker in this file} or in-process
+    #The subdomain matrix M = [[K_II, K_IB], [K_BI, K_BB + sigma*I]] is factorized once with the interior dofs
+    #eliminated first (minimum degree order of the interior nodes {minimumDegree in nodeOrdering.py}) and the
+    #interface dofs last, the trailing blocks of the factors then hold S_s + sigma*I = L_BB*U_BB, so S_s costs no
+    #solve per interface dof. sigma*I lets a floating subdomain (no supports, singular K_s) factorize, it doesn't
+    #change the elimination of the interior. K_II is a principal block of K_ff, so it is positive definite and no
+    #pivoting happens. Solves of M give the interior solves: M*[y; z] = [r; w] has z = 0 and y = K_II^-1*r when
+    #w = K_BI*K_II^-1*r, which the condensation already knows
+    def solveFull(self,r,w):
+        #Solution [y; z] of M*[y; z] = [r; w] (r: interior x cases, w: interface x cases)
+        rhs = np.concatenate([r, w], axis=0)[self.permutation]
+        solution = np.empty(rhs.shape)
+        solution[self.permutation] = self.factor.solve(rhs)
+        return solution[:self.num_interior], solution[self.num_interior:]
+
+    def condense(self):
+        #Assemble and factorize the subdomain, return the dense Schur complement S_s of the interface dofs and the
+        #time taken
+        start = time.perf_counter()
+        rows, cols, values = elementTriplets(self.model)
+        rows = self.code[rows]
+        cols = self.code[cols]
+        keep = (rows >= 0) & (cols >= 0)
+        num_interior = self.num_interior
+        size = num_interior + self.num_interface
+        matrix = sp.coo_matrix((values[keep], (rows[keep], cols[keep])), shape=(size, size)).tocsr()
+        interface = slice(num_interior, size)
+        self.K_IB = matrix[:num_interior, interface].tocsc()
+        self.K_BB = matrix[interface, interface].toarray()
+        if num_interior == 0:
+            self.schur = self.K_BB
+            return self.schur, time.perf_counter() - start
+
+        if self.num_interface == 0:
+            #Nothing to condense (single subdomain): SuperLU orders the dofs itself, as in Factorization
+            self.permutation = np.arange(size)
+            self.factor = spla.splu(sp.csc_matrix(matrix), permc_spec="MMD_AT_PLUS_A", diag_pivot_thresh=0.0,
+                                    options={"SymmetricMode": True})
+            self.schur = self.K_BB
+            return self.schur, time.perf_counter() - start
+
+        node_code = self.code.reshape(-1, 2)
+        interior_nodes = np.flatnonzero(np.any((node_code >= 0) & (node_code < num_interior), axis=1))
+        order = interior_nodes
+        if interior_nodes.shape[0] > 1:
+            graph = nodeGraph(self.model.connectivity, self.model.num_nodes)
+            order = interior_nodes[minimumDegree(graph[interior_nodes][:, interior_nodes])]
+        dofs = node_code[order].reshape(-1)
+        self.permutation = np.concatenate([dofs[(dofs >= 0) & (dofs < num_interior)], np.arange(num_interior, size)])
+        self.sigma = float(np.max(np.diagonal(self.K_BB), initial=0.0)) or 1.0
+        shift = np.zeros(size)
+        shift[num_interior:] = self.sigma
+        self.factor = spla.splu(sp.csc_matrix(matrix[self.permutation][:, self.permutation] + sp.diags(shift)),
+                                permc_spec="NATURAL", diag_pivot_thresh=0.0, options={"SymmetricMode": True})
+        L_BB = self.factor.L.tocsr()[interface, interface]
+        U_BB = self.factor.U.tocsc()[interface, interface]
+        self.schur = L_BB.dot(U_BB).toarray() - self.sigma * np.eye(self.num_interface)
+        return self.schur, time.perf_counter() - start
+
+    def localForces(self,displacement):
+        #K*u of a full local dof vector split into its interior and interface entries
+        forces = applyStiffness(self.model, displacement)
+        keep = self.code >= 0
+        output = np.zeros(self.num_interior + self.num_interface)
+        output[self.code[keep]] = forces[keep]
+        return output[:self.num_interior], output[self.num_interior:]
+
+    def reduceLoads(self,f_I):
+        #Condensed loads h_s = K_BI*K_II^-1*f_I + K_BC*u_C of the (interior x cases) loads, prescribed support
+        #displacements u_C move to the right hand side of the interior rows first
+        self.f_I = np.asarray(f_I, dtype=float)
+        num_cases = self.f_I.shape[1]
+        p_B = np.zeros((self.num_interface, 1))
+        if self.prescribed:
+            p_I, p_B = self.localForces(self.prescribed_values)
+            self.f_I = self.f_I - p_I[:, None]
+            p_B = p_B[:, None]
+        #K_BI*K_II^-1*f_I = -(S_s + sigma*I)*z of the solve with w = 0
+        self.condensed = np.zeros((self.num_interface, num_cases))
+        if self.num_interior > 0 and self.num_interface > 0:
+            _, z = self.solveFull(self.f_I, np.zeros((self.num_interface, num_cases)))
+            self.condensed = -(self.schur + self.sigma * np.eye(self.num_interface)).dot(z)
+        return self.condensed + p_B
+
+    def backSubstitute(self,u_B):
+        #Interior displacements u_I = K_II^-1*(f_I - K_IB*u_B) of every case and the contribution of this subdomain
+        #to the reactions (K*u at its constrained dofs), as (global dof numbers, cases x constrained values)
+        u_B = np.asarray(u_B, dtype=float)
+        if self.num_interior > 0:
+            #K_BI*K_II^-1*(f_I - K_IB*u_B) = h - (K_BB - S_s)*u_B, one solve of M
+            w = self.condensed - (self.K_BB - self.schur).dot(u_B)
+            u_I, _ = self.solveFull(self.f_I - self.K_IB.dot(u_B), w)
+        else:
+            u_I = np.zeros((0, self.f_I.shape[1]))
+        fixed = self.code < 0
+        reactions = np.empty((u_I.shape[1], np.count_nonzero(fixed)))
+        for case in range(0, u_I.shape[1]):
+            displacement = self.prescribed_values.copy()
+            displacement[~fixed] = np.concatenate([u_I[:, case], u_B[:, case]])[self.code[~fixed]]
+            reactions[case] = applyStiffness(self.model, displacement)[fixed]
+        return u_I, self.global_dofs[fixed], reactions
+
+    def __init__(self,coords,connectivity,E,A,code,num_interior,prescribed_values,global_dofs):
+        #coords / connectivity / E / A: the nodes and elements of the subdomain in local numbering
+        #code: position of each local dof in [interior, interface], -1 for constrained dofs
+        #prescribed_values: support displacement of each local dof (0 at free dofs), global_dofs: number of each local
+        #dof in the whole model
+        self.model = TrussModel(coords, connectivity, E, A)
+        self.code = np.asarray(code, dtype=np.int64)
+        self.num_interior = int(num_interior)
+        self.num_interface = int(np.count_nonzero(self.code >= 0)) - self.num_interior
+        self.prescribed_values = np.asarray(prescribed_values, dtype=float)
+        self.prescribed = bool(np.any(self.prescribed_values != 0))
+        self.global_dofs = np.asarray(global_dofs, dtype=np.int64)
+        self.sigma = 0.0
+        self.f_I = None
+
+def subdomainWorker(connection):
+    #Worker process loop: the first message creates the Subdomain, every next one is (method name, arguments) and is
+    #answered with ("ok", result) or ("error", traceback). None stops the worker
+    subdomain = None
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        command, arguments = message
+        try:
+            if command == "create":
+                subdomain = Subdomain(*arguments)
+                result = None
+            else:
+                result = getattr(subdomain, command)(*arguments)
+            connection.send(("ok", result))
+        except Exception:
+            connection.send(("error", traceback.format_exc()))
+    connection.close()
+
+class SubstructureSolver():
+    #Partition of a TrussModel with its subdomains condensed in worker processes, solve() can be called for any
+    #number of load sets while the workers keep their factorizations. Call close() to stop the workers
+    def call(self,command,arguments):
+        #Run a Subdomain method on every subdomain (arguments: one tuple per subdomain), the workers run in parallel:
+        #every message is sent before any answer is read
+        if self.connections is None:
+            return [getattr(subdomain, command)(*argument) for subdomain, argument in zip(self.subdomains, arguments)]
+        for connection, argument in zip(self.connections, arguments):
+            connection.send((command, argument))
+        results = []
+        for number, connection in enumerate(self.connections):
+            status, result = connection.recv()
+            if status == "error":
+                raise RuntimeError("Subdomain %d failed in %s:\n%s" % (number, command, result))
+            results.append(result)
+        return results
+
+    def solve(self,case_forces):
+        #Displacements and reactions (both cases x dofs) of a (cases x dofs) array of nodal forces, and a dictionary
+        #of diagnostics like solveSystem {solverEngine.py}
+        start = time.perf_counter()
+        case_forces = np.asarray(case_forces, dtype=float).reshape(-1, self.dof_map.num_dofs)
+        num_cases = case_forces.shape[0]
+        h = self.call("reduceLoads", [(case_forces[:, interior].T,) for interior in self.interior_dofs])
+        g = case_forces[:, self.interface_dofs].T.copy()
+        for boundary, h_s in zip(self.boundaries, h):
+            g[boundary] -= h_s
+        u_B = self.interface.solve(g).reshape(-1, num_cases) if self.interface is not None else g
+        parts = self.call("backSubstitute", [(u_B[boundary],) for boundary in self.boundaries])
+
+        displacement = np.empty((num_cases, self.dof_map.num_dofs))
+        displacement[:, self.dof_map.fixed] = self.dof_map.prescribed
+        displacement[:, self.interface_dofs] = u_B.T
+        reactions = np.zeros((num_cases, self.dof_map.num_dofs))
+        for interior, (u_I, fixed, values) in zip(self.interior_dofs, parts):
+            displacement[:, interior] = u_I.T
+            reactions[:, fixed] += values
+
+        #Residual of the free dofs of the whole model, applied element by element {applyStiffness in matrixFree.py}
+        residual = np.empty(num_cases)
+        force_norm = np.empty(num_cases)
+        for case in range(0, num_cases):
+            forces = case_forces[case, self.dof_map.free]
+            residual[case] = np.linalg.norm(forces - applyStiffness(self.model, displacement[case])[self.dof_map.free])
+            force_norm[case] = np.linalg.norm(forces)
+        relative = np.where(force_norm > 0, residual / np.where(force_norm > 0, force_norm, 1), residual)
+        info = {
+            "method": "substructure",
+            "backend": "schur_" + (self.interface.kind if self.interface is not None else "none"),
+            "residual_norm": float(np.max(residual, initial=0.0)),
+            "relative_residual": float(np.max(relative, initial=0.0)),
+            "iterations": 1,
+            "converged": bool(np.max(relative, initial=0.0) <= 1e-8),
+            "factor_time": self.factor_time,
+            "time": time.perf_counter() - start,
+            "num_subdomains": len(self.boundaries),
+            "interface_dofs": int(self.interface_dofs.shape[0]),
+            "processes": self.connections is not None,
+        }
+        return displacement, reactions, info
+
+    def close(self):
+        #Stop the worker processes, also the ones of a solver that failed while starting (a worker that died or is
+        #still busy is terminated)
+        if self.connections is not None:
+            for connection in self.connections:
+                try:
+                    connection.send(None)
+                except (EOFError, OSError):
+                    pass
+                connection.close()
+            for process in self.processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+            self.connections = None
+            self.processes = []
+        self.subdomains = []
+
+    def __init__(self,model,dof_map,num_parts=None,processes=None,solver="auto"):
+        #model: the TrussModel, dof_map: its DofMap {dofMap.py}
+        #num_parts: number of subdomains (default: one per core), processes: run every subdomain in its own worker
+        #process (default: when there are several subdomains), solver: backend of the interface system {solverEngine.py}
+        start = time.perf_counter()
+        self.model = model
+        self.dof_map = dof_map
+        if num_parts is None:
+            num_parts = os.cpu_count() or 1
+        part = partitionElements(model, num_parts)
+        num_parts = int(part.max()) + 1 if model.num_elements > 0 else 1
+        if processes is None:
+            processes = num_parts > 1
+
+        #Interface nodes are touched by the elements of more than one part, their free dofs are the interface dofs
+        node_part = np.stack([model.connectivity.reshape(-1), np.repeat(part, 2)], axis=1)
+        node_part = np.unique(node_part, axis=0)
+        shared = np.bincount(node_part[:, 0], minlength=model.num_nodes) > 1
+        free = dof_map.free_mask
+        interface_mask = free & np.repeat(shared, 2)
+        self.interface_dofs = np.flatnonzero(interface_mask)
+        interface_index = np.full(dof_map.num_dofs, -1, dtype=np.int64)
+        interface_index[self.interface_dofs] = np.arange(self.interface_dofs.shape[0])
+        prescribed = np.zeros(dof_map.num_dofs)
+        prescribed[dof_map.fixed] = dof_map.prescribed
+
+        self.boundaries = []
+        self.interior_dofs = []
+        arguments = []
+        for number in range(0, num_parts):
+            elements = np.flatnonzero(part == number)
+            nodes, connectivity = np.unique(model.connectivity[elements], return_inverse=True)
+            dofs = (2 * nodes[:, None] + np.arange(2)).reshape(-1)
+            interior = dofs[free[dofs] & ~interface_mask[dofs]]
+            boundary = np.unique(interface_index[dofs[interface_mask[dofs]]])
+            code = np.full(dofs.shape[0], -1, dtype=np.int64)
+            is_interior = free[dofs] & ~interface_mask[dofs]
+            code[is_interior] = np.arange(interior.shape[0])
+            is_interface = interface_mask[dofs]
+            code[is_interface] = interior.shape[0] + np.searchsorted(boundary, interface_index[dofs[is_interface]])
+            self.boundaries.append(boundary)
+            self.interior_dofs.append(interior)
+            arguments.append((model.coords[nodes], connectivity.reshape(-1, 2), model.E[elements], model.A[elements],
+                              code, interior.shape[0], prescribed[dofs], dofs))
+
+        self.connections = None
+        self.processes = []
+        self.subdomains = []
+        try:
+            if processes:
+                self.connections = []
+                for argument in arguments:
+                    parent, child = multiprocessing.Pipe()
+                    process = multiprocessing.Process(target=subdomainWorker, args=(child,), daemon=True)
+                    #Kept before starting so close() also closes the pipe of a worker that fails to start
+                    self.connections.append(parent)
+                    try:
+                        process.start()
+                    finally:
+                        child.close()
+                    self.processes.append(process)
+                self.call("create", arguments)
+            else:
+                self.subdomains = [Subdomain(*argument) for argument in arguments]
+
+            #Condense every subdomain in parallel and assemble the interface system from the dense S_s blocks
+            condensed = self.call("condense", [()] * num_parts)
+            rows = [np.repeat(boundary, boundary.shape[0]) for boundary in self.boundaries]
+            cols = [np.tile(boundary, boundary.shape[0]) for boundary in self.boundaries]
+            values = [schur.reshape(-1) for schur, _ in condensed]
+            size = self.interface_dofs.shape[0]
+            self.interface = None
+            if size > 0:
+                S = sp.coo_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                                  shape=(size, size)).tocsr()
+                self.interface = Factorization(S, solver)
+        except BaseException:
+            #A worker that can't start or a singular subdomain / interface: don't leave the processes and pipes behind
+            self.close()
+            raise
+        self.condense_time = max(seconds for _, seconds in condensed)
+        self.factor_time = time.perf_counter() - start
+
+def solveSubstructured(model,dof_map,case_forces,num_parts=None,processes=None,solver="auto"):
+    #Solve a (cases x dofs) array of nodal forces by substructuring, the workers are stopped afterwards
+    #Returns the displacements and reactions (cases x dofs) and the solver diagnostics
+    substructure = SubstructureSolver(model, dof_map, num_parts, processes, solver)
+    try:
+        return substructure.solve(case_forces)
+    finally:
+        substructure.close()
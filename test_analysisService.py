@@ -0,0 +1,99 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import asyncio
+import copy
+import http.client
+import json
+import socket
+import threading
+import numpy as np
+from trussAnalysis import *
+from analysisService import AnalysisService
+#----------------------------------------------------------------------------------------------------------------------#
+#Requests to a running analysisService.py, run with python -m pytest test_analysisService.py
+
+def freePort():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+def startService(workers=2):
+    #Serve on a free port in a thread, returns the port and a function stopping the service
+    service = AnalysisService(workers)
+    port = freePort()
+    ready = threading.Event()
+    state = {}
+
+    async def run():
+        state["loop"] = asyncio.get_running_loop()
+        state["task"] = asyncio.current_task()
+        await service.serve(port=port, ready=ready.set)
+
+    def serve():
+        try:
+            asyncio.run(run())
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    ready.wait(30)
+
+    def stop():
+        state["loop"].call_soon_threadsafe(state["task"].cancel)
+        thread.join(30)
+        service.close()
+    return port, stop
+
+def post(port,IC):
+    #(status, json body) of one /analyze request
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    try:
+        connection.request("POST", "/analyze", body=json.dumps({"FEA": IC}).encode() if isinstance(IC, dict) else IC)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+def test_service():
+    IC = loadModel("initialConditions5.json")
+    expected = analyzeModel(IC)
+    port, stop = startService()
+    try:
+        #Substructure requests start subdomain processes from the worker
+        status, body = post(port, dict(IC, solver="substructure", subdomains=2))
+        assert status == 200, body
+        assert body["solver"]["num_subdomains"] == 2
+        assert np.allclose(body["displacement"], expected["displacement"], rtol=1e-8, atol=1e-12)
+
+        #The second request of the same structure is solved by its session, with the entries of analyzeModel
+        for session in ("miss", "hit"):
+            status, body = post(port, IC)
+            assert status == 200, body
+            assert body["session"] == session
+            assert set(body) - {"worker", "session"} == set(expected)
+            assert np.allclose(body["displacement"], expected["displacement"], rtol=1e-8, atol=1e-12)
+
+        status, body = post(port, b"{not json")
+        assert status == 400
+
+        #Malformed and unsolvable models are rejected by the validation before their session key is computed
+        malformed = copy.deepcopy(IC)
+        del malformed["element_params"]
+        status, body = post(port, malformed)
+        assert status == 422 and body["problem"] == "schema"
+        mechanism = copy.deepcopy(IC)
+        mechanism["initial_conds"]["displacement"] = [[1, 1]] * len(IC["nodes"])
+        status, body = post(port, mechanism)
+        assert status == 422 and body["problem"] == "rigid_body"
+
+        #A Content-Length that isn't a number still gets an answer
+        with socket.create_connection(("127.0.0.1", port), timeout=30) as client:
+            client.sendall(b"POST /analyze HTTP/1.1\r\nContent-Length: ten\r\n\r\n")
+            reply = client.makefile("rb").readline()
+        assert reply.startswith(b"HTTP/1.1 400")
+    finally:
+        stop()
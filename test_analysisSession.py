@@ -0,0 +1,62 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import copy
+import numpy as np
+import pytest
+from trussAnalysis import *
+from trussGenerator import generateModel
+from analysisSession import AnalysisSession
+#----------------------------------------------------------------------------------------------------------------------#
+#Low rank updates of an AnalysisSession {analysisSession.py} against a full analysis of the changed model
+
+def changedModel(IC,indices,E,D):
+    changed = copy.deepcopy(IC)
+    params = changed["element_params"]
+    params["E"] = np.array(params["E"], dtype=float)
+    params["D"] = np.array(params["D"], dtype=float)
+    params["E"][indices] = E
+    params["D"][indices] = D
+    return changed
+
+def assertSameResults(results,expected):
+    for name in ("displacement", "stress", "element_force", "reaction"):
+        assert np.allclose(results[name], expected[name], rtol=1e-8, atol=1e-10 * np.max(np.abs(expected[name])))
+
+@pytest.mark.parametrize("max_rank", [64, 4])
+def test_update_elements(max_rank):
+    #Updates within max_rank are solved with the Woodbury identity, more are refactorized
+    IC = generateModel("warren", 400)
+    IC = IC.get("FEA", IC)
+    session = AnalysisSession(IC, max_rank=max_rank)
+    rng = np.random.default_rng(0)
+    indices = rng.choice(len(IC["element_params"]["E"]), 10, replace=False)
+    E = np.asarray(IC["element_params"]["E"])[indices]
+    D = np.asarray(IC["element_params"]["D"])[indices]
+    E[:5] = E[:5] * rng.uniform(0.5, 2.0, 5)
+    D[5:] = D[5:] * rng.uniform(0.5, 2.0, 5)
+    session.updateElements(indices[:5], E=E[:5])
+    session.updateElements(indices[5:], D=D[5:])
+    results = session.solve()
+    assertSameResults(results, analyzeModel(changedModel(IC, indices, E, D)))
+    #The initial factorization, and one for each update above max_rank
+    assert results["solver"]["refactorizations"] == (1 if max_rank == 64 else 3)
+
+def test_new_load_cases():
+    #Load cases given to solve replace the cases of the model
+    IC = loadModel("initialConditions5.json")
+    session = AnalysisSession(IC)
+    force = np.asarray(IC["initial_conds"]["force"], dtype=float) * [3, 1]
+    changed = copy.deepcopy(IC)
+    changed["initial_conds"]["force"] = force.tolist()
+    assertSameResults(session.solve([force.tolist()]), analyzeModel(changed))
+
+def test_zero_stiffness_update():
+    #An element updated to zero stiffness that leaves a mechanism is reported when the session refactorizes
+    IC = loadModel("initialConditions5.json")
+    session = AnalysisSession(IC, max_rank=0)
+    with pytest.raises(ModelValidationError) as error:
+        session.updateElements(range(0, len(IC["element_params"]["E"])), E=0.0)
+    assert error.value.problem == "singular"
@@ -0,0 +1,65 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import json
+import os
+import numpy as np
+from trussAnalysis import *
+from trussGenerator import generateModel
+from batchRunner import runBatch
+#----------------------------------------------------------------------------------------------------------------------#
+#Batch analysis of model files in a process pool {batchRunner.py}
+
+def writeModels(directory):
+    #Two generated models in two directories with the same file name, an invalid model and a broken file
+    for kind in ("warren", "grid"):
+        os.makedirs(str(directory / kind))
+        with open(str(directory / kind / "model.json"), "w") as output:
+            json.dump(generateModel(kind, 200), output)
+    invalid = generateModel("warren", 50)
+    IC = invalid.get("FEA", invalid)
+    IC["initial_conds"]["displacement"] = [[1, 1]] * len(IC["nodes"])
+    with open(str(directory / "invalid.json"), "w") as output:
+        json.dump(invalid, output)
+    (directory / "broken.json").write_text("{\"FEA\": ")
+    return [str(directory / "warren"), str(directory / "grid" / "model.json"), str(directory / "*.json")]
+
+def test_batch(tmp_path):
+    paths = writeModels(tmp_path / "models")
+    output_dir = str(tmp_path / "results")
+    cache_dir = str(tmp_path / "cache")
+    summary = runBatch(paths, output_dir, workers=2, cache_dir=cache_dir, profile=True)
+    assert summary["num_models"] == 4
+    assert summary["num_failed"] == 2 and summary["num_invalid"] == 1
+    entries = dict((os.path.basename(os.path.dirname(entry["model"])) + "/" + os.path.basename(entry["model"]),
+                    entry) for entry in summary["models"])
+    assert entries["models/invalid.json"]["problem"] == "rigid_body"
+    assert entries["models/broken.json"]["status"] == "failed"
+    for name in ("grid/model.json", "warren/model.json"):
+        entry = entries[name]
+        assert entry["status"] == "ok"
+        assert os.path.exists(entry["profile"])
+        with open(entry["result"]) as result_file:
+            written = json.load(result_file)
+        expected = analyzeModel(loadModel(entry["model"]))
+        assert np.allclose(written["displacement"], expected["displacement"], rtol=1e-12, atol=0)
+    #Same file names get different result files
+    assert len(set(entry["result"] for entry in summary["models"])) == 4
+    with open(os.path.join(output_dir, "summary.json")) as summary_file:
+        assert json.load(summary_file)["num_models"] == 4
+
+    #Second run of the same models is read from the cache
+    summary = runBatch(paths, output_dir, workers=1, cache_dir=cache_dir, binary=True)
+    assert summary["cache_hits"] == 2
+    for entry in summary["models"]:
+        if entry["status"] == "ok":
+            assert entry["result"].endswith(".result.npz") and os.path.exists(entry["result"])
+
+def test_plots(tmp_path):
+    #Headless plots of the results next to the result files
+    paths = writeModels(tmp_path / "models")[:1]
+    summary = runBatch(paths, str(tmp_path / "results"), workers=1, plot="png")
+    assert summary["num_failed"] == 0
+    assert os.path.getsize(os.path.splitext(summary["models"][0]["result"])[0] + ".png") > 0
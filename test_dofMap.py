@@ -0,0 +1,45 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import numpy as np
+from trussAnalysis import *
+from trussGenerator import generateModel
+#----------------------------------------------------------------------------------------------------------------------#
+#Reduced system of a DofMap {dofMap.py} against the global matrix trimmed with np.delete style indexing
+
+def test_reduced_blocks():
+    IC = generateModel("grid", 300)["FEA"]
+    model = buildModel(IC)
+    displacement = IC["initial_conds"]["displacement"]
+    dof_map = DofMap(displacement)
+    K_ff, K_cf, K_cc = assembleReduced(model, dof_map)
+    global_k = assembleSparse(model, model.num_nodes).toarray()
+    assert np.allclose(K_ff.toarray(), trimMatrix(displacement, global_k), rtol=1e-14, atol=0)
+    assert np.allclose(K_cf.toarray(), global_k[np.ix_(dof_map.fixed, dof_map.free)], rtol=1e-14, atol=0)
+    assert np.allclose(K_cc.toarray(), global_k[np.ix_(dof_map.fixed, dof_map.fixed)], rtol=1e-14, atol=0)
+    forces = transformForce(IC["initial_conds"]["force"])
+    assert np.array_equal(dof_map.reduceForces(forces.ravel()), trimMatrix(displacement, forces, vector=True))
+    values = np.arange(dof_map.num_free, dtype=float)
+    assert np.array_equal(dof_map.expand(values), recompileMatrix(displacement, values))
+
+def test_support_displacement():
+    #Settled supports: K_ff*u_f = f_f - K_fc*u_c solved on the partitioned global matrix
+    IC = generateModel("warren", 200)["FEA"]
+    displacement = np.asarray(IC["initial_conds"]["displacement"])
+    settlement = np.where(displacement == 0, -0.01, 0.0)
+    settlement[0] = 0
+    IC["initial_conds"]["support_displacement"] = settlement.tolist()
+    results = analyzeModel(IC)
+
+    global_k = assembleSparse(buildModel(IC), len(IC["nodes"])).toarray()
+    free = np.flatnonzero(displacement.ravel())
+    fixed = np.flatnonzero(displacement.ravel() == 0)
+    u = settlement.ravel().copy()
+    f = transformForce(IC["initial_conds"]["force"]).ravel()
+    u[free] = np.linalg.solve(global_k[np.ix_(free, free)], f[free] - global_k[np.ix_(free, fixed)].dot(u[fixed]))
+    assert np.allclose(results["displacement"][0], u, rtol=1e-9, atol=1e-12 * np.max(np.abs(u)))
+    reactions = global_k.dot(u)
+    assert np.allclose(results["reaction"][0][fixed], reactions[fixed], rtol=1e-8, atol=1e-8 * np.max(np.abs(f)))
+    assert np.all(results["reaction"][0][free] == 0)
@@ -0,0 +1,56 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import json
+import numpy as np
+import pytest
+from trussAnalysis import *
+from trussGenerator import generateModel
+#----------------------------------------------------------------------------------------------------------------------#
+#Profile of an analysis {instrumentation.py}
+
+def generated():
+    IC = generateModel("grid", 500)
+    return IC.get("FEA", IC)
+
+def test_direct_profile(tmp_path):
+    IC = generated()
+    instrumentation = Instrumentation(track_memory=True)
+    events = []
+    instrumentation.addCallback(lambda event, data: events.append(event), ["stage_start", "stage_end"])
+    try:
+        results = analyzeModel(IC, solver="cholesky", instrumentation=instrumentation)
+    finally:
+        instrumentation.close()
+    report = instrumentation.report()
+    stages = [entry["stage"] for entry in report["stages"]]
+    for stage in ("validate", "element_build", "dof_map", "assembly", "solve", "reactions", "post_process"):
+        assert stage in stages
+    assert all("peak_traced" in entry for entry in report["stages"])
+    assert events == ["stage_start", "stage_end"] * len(stages)
+    assert report["metrics"]["num_elements"] == results["num_elements"]
+    assert report["metrics"]["solver_backend"] == results["solver"]["backend"]
+    assert report["metrics"]["num_free_dofs"] == int(np.count_nonzero(IC["initial_conds"]["displacement"]))
+    #Profiling doesn't change the results
+    assert np.array_equal(results["displacement"], analyzeModel(IC, solver="cholesky")["displacement"])
+    file = str(tmp_path / "profile.json")
+    instrumentation.exportReport(file)
+    with open(file) as profile:
+        assert json.load(profile)["metrics"]["nnz"] == report["metrics"]["nnz"]
+
+def test_residual_history():
+    #The iterative solver reports every iteration
+    instrumentation = Instrumentation()
+    norms = []
+    instrumentation.addCallback(lambda event, data: norms.append(data["norm"]), ["residual"])
+    results = analyzeModel(generated(), solver="pcg", instrumentation=instrumentation)
+    history = instrumentation.report()["residual_history"]
+    assert len(history) == results["solver"]["iterations"] > 0
+    assert norms == [norm for _, norm in history]
+    assert history[-1][1] < history[0][1]
+
+def test_unknown_event():
+    with pytest.raises(ValueError):
+        Instrumentation().addCallback(print, ["finished"])
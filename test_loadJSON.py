@@ -0,0 +1,50 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import json
+import numpy as np
+import pytest
+from loadJSON import StreamingJSON
+from modelFormat import convertModel
+from trussAnalysis import *
+from trussGenerator import generateModel
+#----------------------------------------------------------------------------------------------------------------------#
+#Streaming .json reader {loadJSON.py} and binary model files {modelFormat.py}
+
+def writeText(tmp_path,text):
+    path = tmp_path / "model.json"
+    path.write_text(text)
+    return str(path)
+
+@pytest.mark.parametrize("chunk_size", [3, 7, 1000])
+@pytest.mark.parametrize("text", ["[[1,2],[3,4]]", "[ [ 1 , 2 ] ,\n [ 3 , 4 ] ]", "[1.5e3, -2, 0.25]",
+                                  "[[[1,2],[3,4]],[[5,6],[7,8]]]", "[5]"])
+def test_numeric_arrays(tmp_path,text,chunk_size):
+    data = StreamingJSON(writeText(tmp_path, text), chunk_size).data
+    assert np.array_equal(data, np.array(json.loads(text)))
+
+@pytest.mark.parametrize("chunk_size", [3, 7, 1000])
+@pytest.mark.parametrize("text", ["[[1,2,3],[4]]", "[[1,2],[3,4],[5]]", "[[1],2]", "[1,[2]]", "[[1],[]]",
+                                  "[[[1,2],[3,4]],[[5,6]]]"])
+def test_ragged_arrays(tmp_path,text,chunk_size):
+    #Same number of values as a rectangular array of the first row's length, but not rectangular
+    with pytest.raises(ValueError):
+        StreamingJSON(writeText(tmp_path, text), chunk_size)
+
+def test_model_files(tmp_path):
+    #The streaming reader and the binary file give the arrays of json.load and the same results
+    path = str(tmp_path / "warren.json")
+    with open(path, "w") as output:
+        json.dump(generateModel("warren", 2000), output)
+    IC = loadModel(path)
+    streamed = StreamingJSON(path, chunk_size=4096).data["FEA"]
+    binary = str(tmp_path / "warren.npz")
+    convertModel(path, binary)
+    for other in (streamed, loadModel(binary)):
+        assert np.array_equal(other["nodes"], IC["nodes"])
+        assert np.array_equal(other["element_params"]["node_connections"], IC["element_params"]["node_connections"])
+        assert np.array_equal(other["initial_conds"]["displacement"], IC["initial_conds"]["displacement"])
+    assert np.allclose(analyzeModel(loadModel(binary))["displacement"], analyzeModel(IC)["displacement"],
+                       rtol=1e-12, atol=0)
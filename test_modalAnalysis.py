@@ -0,0 +1,57 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import numpy as np
+import scipy.linalg as la
+import pytest
+from trussAnalysis import *
+from trussGenerator import generateModel
+from modalAnalysis import analyzeModes, assembleMass
+#----------------------------------------------------------------------------------------------------------------------#
+#Natural frequencies and mode shapes {modalAnalysis.py}
+
+def withDensity(IC,density=7.3e-4):
+    IC["element_params"]["density"] = [density] * len(IC["element_params"]["E"])
+    return IC
+
+@pytest.mark.parametrize("mass,factor", [("lumped", 2.0), ("consistent", 3.0)])
+def test_bar(mass,factor):
+    #Axial vibration of one bar with a free end: w^2 = 2E/(rho L^2) lumped, 3E/(rho L^2) consistent
+    IC = withDensity({"nodes": [[0, 0], [2, 0]],
+                      "element_params": {"node_connections": [[0, 1]], "E": [1e6], "D": [0.5]},
+                      "initial_conds": {"displacement": [[0, 0], [1, 0]], "force": [[0, 0], [0, 0]]}}, 0.01)
+    results = analyzeModes(IC, mass=mass)
+    assert results["num_modes"] == 1
+    assert np.isclose(results["angular_frequency"][0], np.sqrt(factor * 1e6 / (0.01 * 2 ** 2)), rtol=1e-12)
+
+def test_effective_mass():
+    #The effective masses of all modes add up to the mass that moves with the free dofs
+    IC = withDensity(loadModel("initialConditions5.json"))
+    results = analyzeModes(IC, num_modes=100)
+    assert results["num_modes"] == 5
+    assert np.allclose(results["effective_mass"].sum(axis=0), results["total_mass"], rtol=1e-10)
+
+@pytest.mark.parametrize("mass", ["lumped", "consistent"])
+def test_shift_invert(mass):
+    #Lanczos iterations on the factorization give the lowest eigenvalues of the dense solver
+    IC = generateModel("grid", 1500)
+    IC = withDensity(IC.get("FEA", IC))
+    results = analyzeModes(IC, num_modes=4, mass=mass)
+    assert results["solver"]["method"] == "shift_invert"
+    assert results["solver"]["relative_residual"] < 1e-8
+    model = buildModel(IC)
+    dof_map = dofMapFromConditions(IC["initial_conds"])
+    K_ff = assembleReduced(model, dof_map)[0]
+    M_ff = assembleMass(model, dof_map, IC["element_params"]["density"], mass)
+    expected = la.eigh(K_ff.toarray(), M_ff.toarray(), eigvals_only=True, subset_by_index=[0, 3])
+    assert np.allclose(results["eigenvalue"], expected, rtol=1e-8)
+    #Modes near a shift include the eigenvalue next to it
+    shifted = analyzeModes(IC, num_modes=2, mass=mass, shift=expected[3] * 1.01)
+    assert np.min(np.abs(shifted["eigenvalue"] / expected[3] - 1)) < 1e-8
+
+def test_missing_density():
+    with pytest.raises(ModelValidationError) as error:
+        analyzeModes(loadModel("initialConditions5.json"))
+    assert error.value.problem == "schema"
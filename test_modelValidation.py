@@ -0,0 +1,74 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import copy
+import numpy as np
+import pytest
+from trussAnalysis import *
+from analysisSession import AnalysisSession
+#----------------------------------------------------------------------------------------------------------------------#
+#Model checks of modelValidation.py and the singular stiffness matrices found by the solvers
+
+def hingedModel():
+    #Two braced squares joined only at node 2: the upper one rotates about it. The counts pass (12 members for 11 free
+    #dofs, no rigid body motion of the whole truss, no collinear node), only the stiffness matrix is singular
+    nodes = [[0, 0], [1, 0], [1, 1], [0, 1], [2, 1], [2, 2], [1, 2]]
+    connections = [[0, 1], [1, 2], [2, 3], [3, 0], [0, 2], [1, 3], [2, 4], [4, 5], [5, 6], [6, 2], [2, 5], [4, 6]]
+    displacement = [[1, 1]] * len(nodes)
+    displacement[0] = [0, 0]
+    displacement[1] = [1, 0]
+    force = [[0, 0]] * len(nodes)
+    force[5] = [1000, 0]
+    return {"nodes": nodes,
+            "element_params": {"node_connections": connections, "E": [2e11] * len(connections),
+                               "D": [0.01] * len(connections)},
+            "initial_conds": {"displacement": displacement, "force": force}}
+
+def test_valid_model():
+    report = validateModel(loadModel("initialConditions5.json"))
+    assert report["warnings"] == []
+    assert report["num_parts"] == 1
+
+@pytest.mark.parametrize("solver", ["dense", "cholesky", "pcg"])
+@pytest.mark.parametrize("precision", ["double", "mixed"])
+def test_mechanism(solver,precision):
+    IC = hingedModel()
+    validateModel(IC)
+    with pytest.raises(ModelValidationError) as error:
+        analyzeModel(dict(IC, solver=solver, precision=precision))
+    assert error.value.problem == "singular"
+    if solver != "pcg":
+        assert error.value.items == [5]
+
+def test_mechanism_session():
+    with pytest.raises(ModelValidationError):
+        AnalysisSession(hingedModel())
+
+def test_duplicate_member_warns():
+    IC = loadModel("initialConditions5.json")
+    expected = analyzeModel(IC)
+    params = IC["element_params"]
+    #A second bar on element 0 with half of its area: the pair is as stiff as the original element
+    params["node_connections"] = list(params["node_connections"]) + [params["node_connections"][0]]
+    params["E"] = list(params["E"]) + [params["E"][0]]
+    params["D"] = list(params["D"]) + [params["D"][0] / np.sqrt(2)]
+    params["D"][0] = params["D"][0] / np.sqrt(2)
+    assert any("Duplicate" in warning for warning in validateModel(IC)["warnings"])
+    results = analyzeModel(IC)
+    assert np.allclose(results["displacement"], expected["displacement"], rtol=1e-9, atol=1e-15)
+
+def test_rigid_body():
+    IC = hingedModel()
+    IC["initial_conds"]["displacement"][1] = [1, 1]
+    with pytest.raises(ModelValidationError) as error:
+        validateModel(IC)
+    assert error.value.problem == "rigid_body"
+
+def test_zero_length():
+    IC = hingedModel()
+    IC["nodes"][6] = [1, 1]
+    with pytest.raises(ModelValidationError) as error:
+        validateModel(IC)
+    assert error.value.problem == "zero_length"
@@ -0,0 +1,58 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import copy
+import numpy as np
+import pytest
+from trussAnalysis import *
+from monteCarlo import monteCarlo, RunningStatistics
+#----------------------------------------------------------------------------------------------------------------------#
+#Monte Carlo analysis {monteCarlo.py}
+
+SCATTER = {"E": 0.05, "D": 0.03, "force": 0.1, "angle": 2.0}
+
+def test_no_scatter():
+    #Every sample is the deterministic model
+    IC = loadModel("initialConditions5.json")
+    expected = analyzeModel(IC)
+    results = monteCarlo(IC, 20, {})
+    for name in ("displacement", "stress"):
+        for statistic in ("mean", "min", "max"):
+            assert np.allclose(results[name][statistic], expected[name], rtol=1e-9, atol=1e-12)
+        assert np.allclose(results[name]["std"], 0.0, atol=1e-9 * np.max(np.abs(expected[name])))
+
+def test_workers_and_chunks():
+    #Same samples and statistics for any number of workers, the chunks are sized by the memory budget only
+    IC = loadModel("initialConditions5.json")
+    single = monteCarlo(IC, 300, SCATTER, allowable_stress=1e4, memory_budget=2 ** 16)
+    pooled = monteCarlo(IC, 300, SCATTER, allowable_stress=1e4, memory_budget=2 ** 16, workers=2)
+    assert single["num_chunks"] > 2
+    assert single["chunk_size"] == pooled["chunk_size"]
+    for name in ("displacement", "stress", "element_force"):
+        for statistic in ("mean", "std", "min", "max"):
+            assert np.array_equal(single[name][statistic], pooled[name][statistic])
+        for q in single[name]["quantiles"]:
+            assert np.array_equal(single[name]["quantiles"][q], pooled[name]["quantiles"][q])
+    assert single["system_failure"] == pooled["system_failure"]
+
+def test_running_statistics():
+    #Merged chunk statistics agree with the statistics of all the values
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=(1000, 3))
+    statistics = RunningStatistics((3,), reservoir_size=100)
+    for chunk in np.array_split(values, 7):
+        statistics.update(chunk)
+    summary = statistics.summary()
+    assert np.allclose(summary["mean"], values.mean(axis=0))
+    assert np.allclose(summary["std"], values.std(axis=0, ddof=1))
+    assert np.array_equal(summary["max"], values.max(axis=0))
+    assert statistics.reservoir.shape == (100, 3)
+
+def test_invalid_model():
+    IC = loadModel("initialConditions5.json")
+    bad = copy.deepcopy(IC)
+    del bad["element_params"]["E"]
+    with pytest.raises(ModelValidationError):
+        monteCarlo(bad, 10, SCATTER)
@@ -0,0 +1,66 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import copy
+import numpy as np
+import pytest
+from trussAnalysis import *
+from trussGenerator import generateModel
+#----------------------------------------------------------------------------------------------------------------------#
+#Large displacement analysis {nonlinearAnalysis.py}
+
+def barModel(force):
+    #One bar of unit length and area along x, loaded in x at its free end (only u of node 1 is free)
+    return {"nodes": [[0, 0], [1, 0]],
+            "element_params": {"node_connections": [[0, 1]], "E": [1e6], "D": [np.sqrt(4 / np.pi)]},
+            "initial_conds": {"displacement": [[0, 0], [1, 0]], "force": [[0, 0], [force, 0]]},
+            "analysis": "nonlinear"}
+
+@pytest.mark.parametrize("method", ["full", "modified", "quasi"])
+def test_bar(method):
+    #Equilibrium of the Green-Lagrange bar: N*(1+u) = P with N = EA*((1+u)^2 - 1)/2, ie. u^3/2 + 3u^2/2 + u = P/EA
+    force = 2e5
+    IC = barModel(force)
+    results = analyzeModel(dict(IC, newton=method))
+    EA = 1e6 * diaToArea(IC["element_params"]["D"][0])
+    roots = np.roots([0.5, 1.5, 1.0, -force / EA])
+    expected = float(np.real(roots[np.argmin(np.abs(roots.imag) + (roots.real < 0))]))
+    assert results["solver"]["converged"]
+    assert np.isclose(results["displacement"][0][2], expected, rtol=1e-7)
+    assert np.isclose(results["element_force"][0][0], force / (1 + expected), rtol=1e-7)
+
+def test_small_loads():
+    #Under small loads the large displacement analysis gives the linear results
+    IC = generateModel("pratt", 300)
+    IC = IC.get("FEA", IC)
+    IC["initial_conds"]["force"] = (np.asarray(IC["initial_conds"]["force"], dtype=float) * [1e-4, 1]).tolist()
+    expected = analyzeModel(IC)
+    results = analyzeModel(dict(IC, analysis="nonlinear", load_steps=1))
+    assert results["solver"]["converged"]
+    for name in ("displacement", "stress", "reaction"):
+        assert np.allclose(results[name], expected[name], rtol=1e-4, atol=1e-4 * np.max(np.abs(expected[name])))
+
+def test_newton_methods():
+    #Every Newton variant converges to the same state, the modified and quasi-Newton methods reuse the tangent
+    IC = generateModel("warren", 200)
+    IC = IC.get("FEA", IC)
+    IC["initial_conds"]["force"] = (np.asarray(IC["initial_conds"]["force"], dtype=float) * [50, 1]).tolist()
+    IC = dict(IC, analysis="nonlinear", load_steps=4)
+    linear = analyzeModel(dict(IC, analysis="linear"))
+    full = analyzeModel(IC)
+    assert full["solver"]["converged"]
+    #Loads large enough for a nonlinear response (about 20% from the linear displacements)
+    assert not np.allclose(full["displacement"], linear["displacement"], rtol=0.1, atol=0)
+    for method in ("modified", "quasi"):
+        results = analyzeModel(dict(IC, newton=method))
+        assert results["solver"]["converged"]
+        assert results["solver"]["factorizations"] < full["solver"]["factorizations"]
+        assert np.allclose(results["displacement"], full["displacement"], rtol=1e-6,
+                           atol=1e-8 * np.max(np.abs(full["displacement"])))
+    assert len(full["load_steps"][0]) == 4
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        analyzeModel(dict(barModel(1.0), newton="secant"))
@@ -0,0 +1,53 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import numpy as np
+import pytest
+from trussAnalysis import *
+from trussGenerator import generateModel
+#----------------------------------------------------------------------------------------------------------------------#
+#Vectorized post-processing of projectFunc.py against one element at a time
+
+def loopResults(elements,displacement):
+    #Strain, stress and force of each element from its own four displacements
+    strains = []
+    stresses = []
+    for element in elements:
+        start = element.connecting_nodes[0] * 2
+        end = element.connecting_nodes[1] * 2
+        local = np.concatenate([displacement[start:start + 2], displacement[end:end + 2]])
+        strains.append(np.dot(element.strain_matrix, local) / element.length)
+        stresses.append(np.dot(element.stress_matrix, local))
+    return np.array(strains), np.array(stresses)
+
+@pytest.mark.parametrize("container", ["elements", "model"])
+def test_post_processing(container):
+    IC = generateModel("pratt", 200)["FEA"]
+    model = buildModel(IC)
+    nodes, elements = buildElements(IC)
+    displacement = np.random.default_rng(0).normal(size=(3, 2 * model.num_nodes))
+    source = elements if container == "elements" else model
+    strains = calcStrain(source, displacement)
+    stresses = calcStress(source, displacement)
+    assert strains.shape == stresses.shape == (3, model.num_elements)
+    for case in range(0, 3):
+        expected_strains, expected_stresses = loopResults(elements, displacement[case])
+        assert np.allclose(strains[case], expected_strains, rtol=1e-12, atol=1e-15)
+        assert np.allclose(stresses[case], expected_stresses, rtol=1e-12, atol=1e-9)
+        #A single displacement vector gives the same values
+        assert np.allclose(calcStress(source, displacement[case]), stresses[case], rtol=1e-14, atol=1e-9)
+    forces = calcElementForces(stresses, model if container == "model" else IC["element_params"]["D"])
+    assert np.allclose(forces, stresses * model.A, rtol=1e-15, atol=0)
+
+def test_reactions():
+    #Reactions from the constrained blocks of the dof map and from the rows of the global matrix
+    IC = generateModel("howe", 200)["FEA"]
+    model = buildModel(IC)
+    dof_map = dofMapFromConditions(IC["initial_conds"])
+    displacement = np.random.default_rng(1).normal(size=(2, 2 * model.num_nodes))
+    displacement[:, dof_map.fixed] = 0
+    K_ff, K_cf, K_cc = assembleReduced(model, dof_map)
+    expected = reactionForces(assembleSparse(model, model.num_nodes), displacement, IC["initial_conds"]["displacement"])
+    assert np.allclose(dof_map.reactions(K_cf, K_cc, displacement), expected, rtol=1e-12, atol=1e-6)
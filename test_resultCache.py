@@ -0,0 +1,59 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import copy
+import os
+import numpy as np
+from trussAnalysis import *
+from trussGenerator import generateModel
+from resultCache import ResultCache, modelKey
+#----------------------------------------------------------------------------------------------------------------------#
+#On-disk result cache {resultCache.py} used by analyzeModel {trussAnalysis.py}
+
+def test_hit_and_miss(tmp_path):
+    IC = loadModel("initialConditions5.json")
+    cache = ResultCache(str(tmp_path))
+    first = analyzeModel(IC, cache=cache)
+    assert not first["cached"]
+    assert cache.stats()["hits"] == 0 and cache.stats()["stores"] == 2
+    second = analyzeModel(IC, cache=cache)
+    assert second["cached"] and cache.stats()["hits_by_kind"] == {"results": 1}
+    for name in ("displacement", "stress", "reaction"):
+        assert np.array_equal(second[name], first[name])
+
+    #Changed loads miss the results but reuse the assembled matrices
+    loaded = copy.deepcopy(IC)
+    loaded["initial_conds"]["force"] = (np.asarray(IC["initial_conds"]["force"], dtype=float) * [2, 1]).tolist()
+    results = analyzeModel(loaded, cache=cache)
+    assert not results["cached"]
+    assert cache.stats()["hits_by_kind"] == {"results": 1, "matrices": 1}
+    assert np.allclose(results["displacement"], 2 * first["displacement"], rtol=1e-10, atol=0)
+
+    #A changed stiffness misses both
+    stiffer = copy.deepcopy(IC)
+    stiffer["element_params"]["E"] = (np.asarray(IC["element_params"]["E"], dtype=float) * 2).tolist()
+    results = analyzeModel(stiffer, cache=cache)
+    assert cache.stats()["hits"] == 2
+    assert np.allclose(results["displacement"], first["displacement"] / 2, rtol=1e-10, atol=0)
+
+def test_canonical_key():
+    #The key depends on the numbers of the model, not on how they are stored
+    IC = loadModel("initialConditions5.json")
+    arrays = copy.deepcopy(IC)
+    arrays["nodes"] = np.asarray(IC["nodes"], dtype=float)
+    arrays["element_params"]["E"] = np.asarray(IC["element_params"]["E"], dtype=np.float32).astype(float)
+    assert modelKey(arrays) == modelKey(IC)
+    assert modelKey(IC, solver="pcg") != modelKey(IC)
+
+def test_eviction(tmp_path):
+    #Least recently used entries are removed once the cache is over its size limit
+    cache = ResultCache(str(tmp_path), max_bytes=1)
+    IC = generateModel("warren", 100)
+    IC = IC.get("FEA", IC)
+    analyzeModel(IC, cache=cache)
+    #Every entry is over the limit on its own
+    assert cache.stats()["evictions"] == cache.stats()["stores"] == 2
+    assert cache.size() == 0
+    assert not analyzeModel(IC, cache=cache)["cached"]
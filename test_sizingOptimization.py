@@ -0,0 +1,57 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import numpy as np
+import pytest
+from trussAnalysis import *
+from trussGenerator import generateModel
+from sizingOptimization import SizingProblem, sizeMembers
+#----------------------------------------------------------------------------------------------------------------------#
+#Member sizing {sizingOptimization.py}: adjoint sensitivities against finite differences, and the optimized design
+
+def generated():
+    IC = generateModel("pratt", 60)
+    return IC.get("FEA", IC)
+
+def allowableStress(IC,factor):
+    return factor * float(np.max(np.abs(analyzeModel(IC)["stress"])))
+
+@pytest.mark.parametrize("aggregate", [False, True])
+def test_sensitivities(aggregate):
+    IC = generated()
+    free_dofs = np.flatnonzero(np.asarray(IC["initial_conds"]["displacement"]).ravel())
+    limits = {int(free_dofs[3]): 0.01, int(free_dofs[-2]): 0.02}
+    problem = SizingProblem(IC, allowableStress(IC, 0.8), allowableStress(IC, 0.5), displacement_limits=limits,
+                            aggregate=aggregate)
+    rng = np.random.default_rng(0)
+    D = np.asarray(IC["element_params"]["D"], dtype=float) * rng.uniform(0.7, 1.3, len(IC["element_params"]["D"]))
+    jacobian = problem.constraintJacobian(D)
+    #Central differences of every diameter
+    step = 1e-6 * D
+    differences = np.empty(jacobian.shape)
+    weight_differences = np.empty(D.shape)
+    for j in range(0, D.shape[0]):
+        upper = D.copy()
+        lower = D.copy()
+        upper[j] = upper[j] + step[j]
+        lower[j] = lower[j] - step[j]
+        differences[:, j] = (problem.constraints(upper) - problem.constraints(lower)) / (2 * step[j])
+        weight_differences[j] = (problem.weight(upper) - problem.weight(lower)) / (2 * step[j])
+    assert np.allclose(jacobian, differences, rtol=1e-5, atol=1e-6 * np.max(np.abs(differences)))
+    assert np.allclose(problem.weightGradient(D), weight_differences, rtol=1e-6)
+
+def test_size_members():
+    #An over designed truss gets lighter and ends at (not over) the stress limit
+    IC = generated()
+    allowable = allowableStress(IC, 2.0)
+    start = SizingProblem(IC, allowable).weight(IC["element_params"]["D"])
+    result = sizeMembers(IC, allowable, max_iter=200)
+    assert result["success"], result["message"]
+    assert result["weight"] < start
+    assert result["max_ratio"] <= 1 + 1e-6
+    assert result["max_ratio"] > 0.99
+    assert np.allclose(result["stress"], analyzeModel(dict(IC, element_params=dict(IC["element_params"],
+                                                                                    D=result["D"].tolist())))
+                       ["stress"], rtol=1e-8, atol=1e-8 * allowable)
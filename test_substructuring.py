@@ -0,0 +1,54 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import numpy as np
+import pytest
+from trussAnalysis import *
+from trussGenerator import generateModel
+#----------------------------------------------------------------------------------------------------------------------#
+#Schur complement substructuring {substructuring.py} against the direct solve of the whole model
+
+def generated(kind):
+    IC = generateModel(kind, 600)
+    return IC.get("FEA", IC)
+
+def assertSameResults(results,expected):
+    for name in ("displacement", "stress", "reaction"):
+        assert np.allclose(results[name], expected[name], rtol=1e-8, atol=1e-10 * np.max(np.abs(expected[name])))
+
+@pytest.mark.parametrize("kind", ["warren", "grid", "delaunay"])
+@pytest.mark.parametrize("subdomains", [1, 3])
+def test_substructure(kind,subdomains):
+    IC = generated(kind)
+    expected = analyzeModel(IC, solver="cholesky")
+    results = analyzeModel(dict(IC, subdomains=subdomains), solver="substructure")
+    assert results["solver"]["num_subdomains"] == subdomains
+    assert (results["solver"]["interface_dofs"] > 0) == (subdomains > 1)
+    assertSameResults(results, expected)
+
+def test_support_displacement():
+    #Settlement of the supports inside and on the interface of the subdomains
+    IC = generated("grid")
+    displacement = np.asarray(IC["initial_conds"]["displacement"])
+    settlement = np.where(displacement == 0, 0.001, 0.0) * np.arange(displacement.shape[0])[:, None] / \
+        displacement.shape[0]
+    IC["initial_conds"]["support_displacement"] = settlement.tolist()
+    assertSameResults(analyzeModel(dict(IC, subdomains=3), solver="substructure"), analyzeModel(IC, solver="cholesky"))
+
+def test_solver_reuse():
+    #The subdomain factorizations are kept by the worker processes between solves
+    IC = generated("warren")
+    model = buildModel(IC)
+    dof_map = dofMapFromConditions(IC["initial_conds"])
+    case_forces = transformLoadCases(readLoadCases(IC["initial_conds"]))
+    expected = analyzeModel(IC, solver="cholesky")
+    substructure = SubstructureSolver(model, dof_map, 2)
+    try:
+        for scale in (1.0, -2.0):
+            displacement, reactions, solver_info = substructure.solve(case_forces * scale)
+            assert np.allclose(displacement, scale * np.asarray(expected["displacement"]), rtol=1e-8,
+                               atol=1e-10 * np.max(np.abs(expected["displacement"])))
+    finally:
+        substructure.close()
@@ -0,0 +1,117 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import numpy as np
+import pytest
+from trussAnalysis import *
+from trussGenerator import generateModel
+#----------------------------------------------------------------------------------------------------------------------#
+#Results of analyzeModel {trussAnalysis.py} on the example model and generated trusses {trussGenerator.py}
+
+def generated(kind,num_elements=300):
+    IC = generateModel(kind, num_elements)
+    return IC.get("FEA", IC)
+
+def referenceDisplacement(IC):
+    #Original algorithm of main.py: one dense augmented matrix per element added into the global stiffness matrix,
+    #trimmed to the free dofs and solved densely
+    nodes, elements = buildElements(IC)
+    for element in elements:
+        element.augMatrix = augmentMatrix(element, len(nodes))
+    global_k = combineAugmented(elements)
+    displacement = IC["initial_conds"]["displacement"]
+    forces = trimMatrix(displacement, transformForce(IC["initial_conds"]["force"]), vector=True)
+    return recompileMatrix(displacement, np.linalg.solve(trimMatrix(displacement, global_k), forces)), global_k
+
+@pytest.mark.parametrize("kind", ["example", "warren", "grid"])
+def test_sparse_assembly(kind):
+    #Sparse assembly, the element kernel of TrussModel, the dof map and the vectorized post-processing give the
+    #results of the original per element dense matrices
+    IC = loadModel("initialConditions5.json") if kind == "example" else generated(kind, 150)
+    expected, global_k = referenceDisplacement(IC)
+    results = analyzeModel(IC)
+    scale = np.max(np.abs(expected))
+    assert np.allclose(results["displacement"], expected, rtol=1e-9, atol=1e-12 * scale)
+    nodes, elements = buildElements(IC)
+    assert np.allclose(results["stress"], calcStress(elements, expected), rtol=1e-8, atol=1e-6)
+    assert np.allclose(results["reaction"], reactionForces(global_k, expected, IC["initial_conds"]["displacement"]),
+                       rtol=1e-8, atol=1e-6)
+    assert np.allclose(assembleSparse(buildModel(IC), len(IC["nodes"])).toarray(), global_k, rtol=1e-12, atol=0)
+
+@pytest.mark.parametrize("kind", ["warren", "pratt", "howe", "grid", "delaunay"])
+@pytest.mark.parametrize("solver", ["dense", "auto"])
+def test_solver_agreement(kind,solver):
+    #Every direct backend gives the displacements of the sparse Cholesky factorization
+    IC = generated(kind)
+    expected = analyzeModel(IC, solver="cholesky")
+    results = analyzeModel(IC, solver=solver)
+    assert results["solver"]["converged"]
+    assert np.allclose(results["displacement"], expected["displacement"], rtol=1e-9,
+                       atol=1e-12 * np.max(np.abs(expected["displacement"])))
+
+def test_gauss_seidel():
+    #The original iterative solver is still available as the reference backend, it stops when a sweep changes the
+    #displacements by less than 1e-6 so only agrees to a few digits
+    IC = loadModel("initialConditions5.json")
+    expected = analyzeModel(IC, solver="cholesky")
+    results = analyzeModel(IC, solver="gauss_seidel")
+    assert results["solver"]["backend"] == "gauss_seidel"
+    assert np.allclose(results["displacement"], expected["displacement"], rtol=0,
+                       atol=1e-3 * np.max(np.abs(expected["displacement"])))
+
+def test_unknown_solver():
+    with pytest.raises(ValueError):
+        analyzeModel(loadModel("initialConditions5.json"), solver="lu")
+
+def test_load_cases():
+    #All load cases are solved with one factorization and give the results of one analysis per case
+    IC = generated("warren")
+    force = np.asarray(IC["initial_conds"]["force"], dtype=float)
+    cases = [force.tolist(), (force * [2, 1]).tolist(), (force * [1, 0] + [0, 45]).tolist()]
+    results = analyzeModel(dict(IC, initial_conds=dict(IC["initial_conds"], load_cases=cases)))
+    assert results["num_cases"] == 3
+    for case, case_force in enumerate(cases):
+        single = analyzeModel(dict(IC, initial_conds=dict(IC["initial_conds"], force=case_force)))
+        for name in ("displacement", "stress", "reaction"):
+            assert np.allclose(results[name][case], np.reshape(single[name], -1), rtol=1e-10,
+                               atol=1e-12 * np.max(np.abs(single[name])))
+
+@pytest.mark.parametrize("ordering", ["rcm", "amd"])
+def test_ordering(ordering):
+    #Renumbered nodes reduce the bandwidth, the results come back in the original node numbering
+    IC = generated("delaunay")
+    expected = analyzeModel(IC)
+    results = analyzeModel(IC, ordering=ordering)
+    assert results["ordering"]["method"] == ordering
+    if ordering == "rcm":
+        assert results["ordering"]["bandwidth_after"] < results["ordering"]["bandwidth_before"]
+    assert results["ordering"]["fill_after"] <= results["ordering"]["fill_before"]
+    for name in ("displacement", "stress", "reaction"):
+        assert np.allclose(results[name], expected[name], rtol=1e-9, atol=1e-12 * np.max(np.abs(expected[name])))
+
+@pytest.mark.parametrize("preconditioner", ["none", "jacobi", "block_jacobi"])
+def test_matrix_free(preconditioner):
+    #The matrix-free conjugate gradient converges to the direct solution with every preconditioner, a warm start
+    #from the solution needs (almost) no iterations
+    IC = dict(generated("grid"), preconditioner=preconditioner)
+    expected = analyzeModel(IC)
+    results = analyzeModel(IC, solver="pcg")
+    assert results["solver"]["converged"]
+    assert np.allclose(results["displacement"], expected["displacement"], rtol=1e-7,
+                       atol=1e-8 * np.max(np.abs(expected["displacement"])))
+    warm = analyzeModel(IC, solver="pcg", initial_displacement=results["displacement"])
+    assert warm["solver"]["iterations"] < results["solver"]["iterations"]
+
+@pytest.mark.parametrize("solver", ["dense", "cholesky"])
+def test_mixed_precision(solver):
+    #float32 factors refined to the accuracy of the double precision solve
+    IC = generated("pratt")
+    expected = analyzeModel(IC, solver=solver)
+    results = analyzeModel(dict(IC, precision="mixed"), solver=solver)
+    assert results["solver"]["precision"] == "mixed"
+    assert results["solver"]["refinements"] >= 1
+    assert results["solver"]["relative_residual"] <= 1e-10
+    assert np.allclose(results["displacement"], expected["displacement"], rtol=1e-9,
+                       atol=1e-12 * np.max(np.abs(expected["displacement"])))
@@ -0,0 +1,43 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import copy
+import pytest
+from trussAnalysis import *
+from trussGenerator import generateModel, TRUSS_TYPES
+from benchmark import runBenchmark, compareBenchmarks
+#----------------------------------------------------------------------------------------------------------------------#
+#Generated models {trussGenerator.py} and the stage benchmark {benchmark.py}
+
+@pytest.mark.parametrize("kind", TRUSS_TYPES)
+@pytest.mark.parametrize("num_elements", [10, 1000])
+def test_generated_models(kind,num_elements):
+    #Valid, solvable models of about the requested size
+    IC = generateModel(kind, num_elements)["FEA"]
+    assert validateModel(IC)["warnings"] == []
+    count = len(IC["element_params"]["node_connections"])
+    if num_elements > 100:
+        assert 0.8 * num_elements <= count <= 1.2 * num_elements
+    assert analyzeModel(IC)["solver"]["converged"]
+
+def test_seed():
+    assert generateModel("delaunay", 300, seed=1) == generateModel("delaunay", 300, seed=1)
+    assert generateModel("delaunay", 300, seed=1) != generateModel("delaunay", 300, seed=2)
+
+def test_benchmark(tmp_path):
+    results = runBenchmark(["warren"], [100, 1000], ["cholesky", "pcg", "gauss_seidel"], workdir=str(tmp_path))
+    records = results["records"]
+    assert len(records) == 6
+    for record in records:
+        if record["solver"] == "gauss_seidel" and record["num_free_dofs"] > 200:
+            assert "skipped" in record
+        else:
+            assert record["converged"]
+            assert record["total"] == pytest.approx(sum(record["stages"].values()))
+    #A stage twice as slow is reported, the others are not
+    slower = copy.deepcopy(results)
+    slower["records"][0]["stages"]["solve"] = 2 * max(slower["records"][0]["stages"]["solve"], 1e-3)
+    regressions = compareBenchmarks(results, slower)
+    assert [regression[:4] for regression in regressions] == [("warren", 100, "cholesky", "solve")]
@@ -0,0 +1,44 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import numpy as np
+from trussAnalysis import *
+from trussGenerator import generateModel
+#----------------------------------------------------------------------------------------------------------------------#
+#Struct of arrays TrussModel {trussModel.py} against one Element object per bar {elementClass.py}
+
+def generated():
+    return generateModel("delaunay", 300)["FEA"]
+
+def test_element_kernel():
+    IC = generated()
+    model = buildModel(IC)
+    nodes, elements = buildElements(IC)
+    assert model.num_elements == len(elements) and model.num_nodes == len(nodes)
+    for name in ("length", "stiff_matrix", "strain_matrix", "stress_matrix"):
+        expected = np.array([getattr(element, name) for element in elements])
+        assert np.allclose(getattr(model, name), expected, rtol=1e-13, atol=0)
+    #The views expose the attributes of the objects
+    for index in (0, model.num_elements - 1):
+        view = model.element(index)
+        assert view.connecting_nodes == list(elements[index].connecting_nodes)
+        assert np.allclose(view.midpoint, elements[index].midpoint)
+        assert np.allclose(view.stiff_matrix, elements[index].stiff_matrix)
+    assert model.node(3).node_coords == nodes[3].node_coords
+
+def test_section_update():
+    #Updated sections give the matrices of a model built with them
+    IC = generated()
+    model = buildModel(IC)
+    indices = np.array([0, 5, 17])
+    D = np.array([0.5, 2.0, 1.5])
+    model.section_update(indices, E=[1e6, 2e6, 3e6], A=diaToArea(D), D=D)
+    E = np.array(IC["element_params"]["E"], dtype=float)
+    E[indices] = [1e6, 2e6, 3e6]
+    diameters = np.array(IC["element_params"]["D"], dtype=float)
+    diameters[indices] = D
+    expected = TrussModel(IC["nodes"], IC["element_params"]["node_connections"], E, diaToArea(diameters), diameters)
+    for name in ("stiff_matrix", "stress_matrix", "A", "D"):
+        assert np.allclose(getattr(model, name), getattr(expected, name), rtol=1e-13, atol=0)
@@ -0,0 +1,43 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import os
+import numpy as np
+import pytest
+from trussAnalysis import *
+from trussGenerator import generateModel
+from trussPlot import plotResults, plotModel, deformedScale
+#----------------------------------------------------------------------------------------------------------------------#
+#Headless plots {trussPlot.py}
+
+def artists(figure):
+    #Number of line collections and text labels drawn on the truss axes
+    from matplotlib.collections import LineCollection
+    axes = figure.axes[0]
+    return sum(isinstance(item, LineCollection) for item in axes.collections), len(axes.texts)
+
+@pytest.mark.parametrize("num_elements", [20, 5000])
+def test_plot_results(tmp_path,num_elements):
+    #Drawn with the same few collections at any size, labels only on small models
+    IC = generateModel("warren", num_elements)["FEA"]
+    model = buildModel(IC)
+    results = analyzeModel(IC, model=model)
+    for extension in ("png", "svg"):
+        file = str(tmp_path / ("results." + extension))
+        figure = plotResults(model, IC["initial_conds"], results, filename=file)
+        assert os.path.getsize(file) > 0
+    lines, texts = artists(figure)
+    #Undeformed and deformed shape
+    assert lines == 2
+    assert (texts > 0) == (num_elements <= 50)
+    assert "x%.3g" % deformedScale(model.coords, results["displacement"][0]) in figure.axes[0].get_title()
+
+def test_plot_model(tmp_path):
+    IC = loadModel("initialConditions5.json")
+    file = str(tmp_path / "model.pdf")
+    figure = plotModel(buildModel(IC), IC["initial_conds"]["displacement"], transformForce(IC["initial_conds"]["force"]),
+                       filename=file)
+    assert os.path.getsize(file) > 0
+    assert artists(figure)[0] == 1
@@ -0,0 +1,287 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import numpy as np
+from projectFunc import *
+from elementClass import *
+from nodeClass import *
+from trussModel import *
+from dofMap import *
+from nodeOrdering import *
+from matrixFree import *
+from instrumentation import *
+from solverEngine import *
+from loadJSON import *
+from resultCache import *
+from modelFormat import *
+from modelValidation import *
+from substructuring import *
+from nonlinearAnalysis import *
+#----------------------------------------------------------------------------------------------------------------------#
+#Library entry point of the analysis, runs the same steps as main.py without plotting or asking for confirmation
+
+def loadModel(file,stream=False):
+    #Read the "FEA" dictionary of a model file {loadJSON.py}
+    #.npz binary model files are memory mapped {modelFormat.py}, stream=True reads a large .json file with the
+    #streaming reader (numpy arrays instead of python lists)
+    if file.endswith(".npz"):
+        return loadBinaryModel(file)["FEA"]
+    if stream:
+        return StreamingJSON(file).data["FEA"]
+    return loadJSON(file).data["FEA"]
+
+def buildModel(IC):
+    #Create the array backed TrussModel of a model dictionary {trussModel.py}, area is calculated from the diameter
+    element_params = IC['element_params']
+    D = np.asarray(element_params["D"], dtype=float)
+    return TrussModel(IC['nodes'], element_params["node_connections"], element_params["E"], diaToArea(D), D)
+
+def buildElements(IC):
+    #Create the Node and Element objects of a model dictionary (one object per node/element, for small models)
+    element_params = IC['element_params']
+    element_connections = element_params["node_connections"]
+    E = element_params["E"]
+    D = element_params["D"]
+
+    #Node {from nodeClass} object requires x,y coordinates and the current index to create
+    nodes = [Node(IC['nodes'][i], i) for i in range(0, len(IC['nodes']))]
+    #Element {from elementClass} object for each connection, area is calculated from the diameter
+    elements = [Element(E[i], diaToArea(D[i]), nodes, element_connections[i]) for i in range(0, len(element_connections))]
+    return nodes, elements
+
+def analyzeModel(IC,solver=None,model=None,ordering=None,initial_displacement=None,instrumentation=None,cache=None,
+                 validation=None):
+    #Analyze a model dictionary and return a dictionary of results
+    #solver / ordering override the optional "solver" / "ordering" entries of the model, the "substructure" solver
+    #splits the model into the optional "subdomains" number of parts (default: one per core) {substructuring.py}
+    #model is the TrussModel if it was already built
+    #initial_displacement is a previous displacement field (dofs or cases x dofs) used as a warm start by "pcg"
+    #instrumentation is an optional Instrumentation {instrumentation.py} collecting the profile of the analysis
+    #cache is an optional ResultCache {resultCache.py}: the results of an identical model are read from it instead of
+    #being recalculated, and the assembled matrices are reused by models that only differ by their loads
+    #The optional "analysis": "nonlinear" entry runs a large displacement analysis {nonlinearAnalysis.py} in
+    #"load_steps" increments (default 10) with the "newton" method ("full" default, "modified" or "quasi"), the
+    #report of every load step is returned in the "load_steps" entry of the results
+    #The optional "precision" entry of the model selects float32 factors refined to float64 accuracy ("mixed") for
+    #the direct solvers {Factorization in solverEngine.py}, default "double"
+    #validation overrides the optional "validation" entry of the model {modelValidation.py}: "basic" (default) checks
+    #the model before it is built, "full" also checks the pivots of the assembled K_ff before the solve, "none" skips
+    #both. A model that can't be solved raises ModelValidationError, also when the direct solvers find a singular
+    #K_ff (a mechanism the basic checks can't see). When model is given the caller built it, so it also validated IC
+    #first (validateModel) and only the pivot check is left
+    if instrumentation is None:
+        instrumentation = NULL_INSTRUMENTATION
+    #Solver callbacks are only passed when profiling, the solvers skip them otherwise
+    residual_callback = instrumentation.residual if instrumentation.enabled else None
+    if solver is None:
+        solver = IC.get("solver", "auto")
+    if ordering is None:
+        ordering = IC.get("ordering", "none")
+    preconditioner = IC.get("preconditioner", "block_jacobi")
+    precision = IC.get("precision", "double")
+    if precision not in PRECISIONS:
+        raise ValueError("Unknown precision '%s', expected one of %s" % (precision, PRECISIONS))
+    analysis = IC.get("analysis", "linear")
+    if analysis not in ANALYSIS_TYPES:
+        raise ValueError("Unknown analysis '%s', expected one of %s" % (analysis, ANALYSIS_TYPES))
+    nonlinear = None
+    if analysis == "nonlinear":
+        nonlinear = {"load_steps": IC.get("load_steps", 10), "newton": IC.get("newton", "full")}
+    if validation is None:
+        validation = IC.get("validation", "basic")
+    if validation not in VALIDATION_LEVELS:
+        raise ValueError("Unknown validation '%s', expected one of %s" % (validation, VALIDATION_LEVELS))
+
+    if model is None and validation != "none":
+        #Fail before hashing, building or solving a model that can't be solved (a malformed model would otherwise
+        #raise from the cache key)
+        with instrumentation.stage("validate"):
+            validateModel(IC)
+
+    result_key = None
+    matrix_key = None
+    matrices = None
+    if cache is not None:
+        with instrumentation.stage("cache_lookup"):
+            result_key = modelKey(IC, solver, ordering, preconditioner if solver in MATRIX_FREE_SOLVERS else None,
+                                  precision if solver in SOLVERS else "double", nonlinear)
+            cached = cache.getResults(result_key)
+            if cached is None and solver in SOLVERS and nonlinear is None:
+                matrix_key = matrixKey(IC, ordering)
+                matrices = cache.getMatrices(matrix_key)
+        instrumentation.record("cache", "hit" if cached is not None else "miss")
+        if cached is not None:
+            cached["cached"] = True
+            return cached
+
+    if model is None:
+        with instrumentation.stage("element_build"):
+            model = buildModel(IC)
+    num_nodes = model.num_nodes
+
+    #(cases x dofs) array of x,y force components of every load case {readLoadCases in projectFunc.py}
+    load_cases = readLoadCases(IC["initial_conds"])
+    case_forces = transformLoadCases(load_cases)
+    displacement = IC['initial_conds']["displacement"]
+    support_displacement = IC['initial_conds'].get("support_displacement")
+
+    #Optionally renumber the nodes to reduce bandwidth and fill {nodeOrdering.py}, the model and all node based
+    #inputs are moved to the new numbering here and the node based results are moved back at the end
+    ordering_info = None
+    if ordering != "none":
+        with instrumentation.stage("ordering"):
+            if matrices is not None:
+                #The ordering is stored with the cached matrices that were assembled in it
+                order, ordering_info = matrices["order"], matrices["metadata"]["ordering"]
+            else:
+                order, ordering_info = orderNodes(model, ordering)
+            model = renumberModel(model, order)
+            displacement = permuteNodes(displacement, order)
+            case_forces = permuteNodes(case_forces, order)
+            if support_displacement is not None:
+                support_displacement = permuteNodes(support_displacement, order)
+            if initial_displacement is not None:
+                initial_displacement = permuteNodes(initial_displacement, order)
+
+    #Number the free and constrained dofs once {dofMap.py}
+    with instrumentation.stage("dof_map"):
+        dof_map = DofMap(displacement, support_displacement)
+    instrumentation.record("num_nodes", num_nodes)
+    instrumentation.record("num_elements", model.num_elements)
+    instrumentation.record("num_cases", len(load_cases))
+    instrumentation.record("num_free_dofs", dof_map.num_free)
+
+    load_steps = None
+    if nonlinear is not None:
+        #Load stepping with a tangent stiffness assembled from the deformed geometry, the strains, stresses and
+        #element forces come from the deformed lengths {solveNonlinear in nonlinearAnalysis.py}
+        with instrumentation.stage("solve"):
+            final_displacement, react_forces, calc_strains, element_forces, solver_info, load_steps = \
+                solveNonlinear(model, dof_map, case_forces, nonlinear["load_steps"], nonlinear["newton"], solver,
+                               precision, callback=residual_callback)
+        instrumentation.record("load_steps", solver_info["load_steps"])
+        instrumentation.record("factorizations", solver_info["factorizations"])
+    elif solver in MATRIX_FREE_SOLVERS:
+        #Matrix-free conjugate gradient {matrixFree.py}, K*u is applied element by element and nothing is assembled
+        forceVector = dof_map.reduceForces(case_forces)
+        if np.any(dof_map.prescribed != 0):
+            correction = prescribedForces(model, dof_map)
+            forceVector = forceVector - (correction[:, None] if forceVector.ndim == 2 else correction)
+        initial = None
+        if initial_displacement is not None:
+            initial = np.asarray(initial_displacement, dtype=float)[..., dof_map.free].T
+            initial = np.broadcast_to(initial if initial.ndim == 2 else initial[:, None], forceVector.shape)
+        with instrumentation.stage("solve"):
+            result_vector, solver_info = solveMatrixFree(model, dof_map, forceVector, initial=initial,
+                                                         kind=preconditioner,
+                                                         callback=residual_callback)
+        if solver_info["singular"]:
+            raise ModelValidationError("The stiffness matrix is singular: the conjugate gradient iterations found a "
+                                       "mechanism (use a direct solver to name its dofs)", "singular")
+        with instrumentation.stage("reactions"):
+            final_displacement = dof_map.expand(result_vector)
+            react_forces = reactionsMatrixFree(model, dof_map, final_displacement)
+    elif solver in SUBSTRUCTURE_SOLVERS:
+        #Schur complement substructuring: the subdomains are assembled, condensed and back substituted in parallel
+        #worker processes, which also return their part of the reactions. Only the interface system is solved here
+        with instrumentation.stage("solve"):
+            try:
+                final_displacement, react_forces, solver_info = solveSubstructured(model, dof_map, case_forces,
+                                                                                   IC.get("subdomains"))
+            except SingularMatrixError as error:
+                raise ModelValidationError("The interface system of the subdomains is singular (%s)" % error,
+                                           "singular")
+        instrumentation.record("num_subdomains", solver_info["num_subdomains"])
+        instrumentation.record("interface_dofs", solver_info["interface_dofs"])
+    else:
+        #Assemble the free-free block in place and keep the constrained rows only for the reactions
+        #{assembleReduced in projectFunc.py}
+        with instrumentation.stage("assembly"):
+            if matrices is not None:
+                K_ff, K_cf, K_cc = matrices["K_ff"], matrices["K_cf"], matrices["K_cc"]
+            else:
+                K_ff, K_cf, K_cc = assembleReduced(model, dof_map)
+                if cache is not None:
+                    extra = {"order": order} if ordering != "none" else {}
+                    cache.putMatrices(matrix_key, K_ff, K_cf, K_cc, {"ordering": ordering_info}, **extra)
+        instrumentation.record("nnz", int(K_ff.nnz))
+        #The pivot check needs the assembled matrix, the matrix-free solvers only get the basic checks
+        if validation == "full":
+            with instrumentation.stage("pivot_check"):
+                checkPivots(K_ff, dof_map, order if ordering != "none" else None)
+
+        #Solve every load case with one factorization
+        with instrumentation.stage("solve"):
+            forceVector = dof_map.reduceForces(case_forces, K_cf)
+            try:
+                result_vector, solver_info = solveSystem(K_ff, forceVector, method=solver,
+                                                         callback=residual_callback, precision=precision)
+            except SingularMatrixError as error:
+                #A mechanism: name its dofs in the original node numbering
+                raise explainSingular(K_ff, dof_map, order if ordering != "none" else None, error)
+        with instrumentation.stage("reactions"):
+            final_displacement = dof_map.expand(result_vector)
+            react_forces = dof_map.reactions(K_cf, K_cc, final_displacement)
+
+    instrumentation.record("solver_backend", solver_info["backend"])
+    instrumentation.record("solver_iterations", solver_info["iterations"])
+    instrumentation.record("solver_converged", solver_info["converged"])
+    instrumentation.record("residual_norm", solver_info["residual_norm"])
+    instrumentation.record("relative_residual", solver_info["relative_residual"])
+
+    #Post-process the results of every load case at once
+    with instrumentation.stage("post_process"):
+        if nonlinear is not None:
+            calc_stresses = element_forces / model.A
+        else:
+            calc_stresses = calcStress(model, final_displacement)
+            calc_strains = calcStrain(model, final_displacement)
+            element_forces = calcElementForces(calc_stresses, model)
+
+    #Element results keep the element numbering, node based results go back to the original node numbering
+    if ordering != "none":
+        final_displacement = restoreNodes(final_displacement, order)
+        react_forces = restoreNodes(react_forces, order)
+
+    results = {
+        "num_nodes": num_nodes,
+        "num_elements": model.num_elements,
+        "num_cases": len(load_cases),
+        "solver": solver_info,
+        "ordering": ordering_info,
+        "displacement": final_displacement,
+        "strain": calc_strains,
+        "stress": calc_stresses,
+        "element_force": element_forces,
+        "reaction": react_forces,
+    }
+    if load_steps is not None:
+        results["load_steps"] = load_steps
+    if cache is not None:
+        cache.putResults(result_key, results)
+        results["cached"] = False
+    return results
+
+def analyzeFile(file,solver=None,instrumentation=None,cache=None):
+    #Load and analyze a model file, instrumentation is an optional Instrumentation {instrumentation.py},
+    #cache an optional ResultCache {resultCache.py}
+    if instrumentation is None:
+        instrumentation = NULL_INSTRUMENTATION
+    with instrumentation.stage("load"):
+        IC = loadModel(file)
+    return analyzeModel(IC, solver=solver, instrumentation=instrumentation, cache=cache)
+
+def resultsToJSON(results):
+    #Convert the numpy arrays of a result dictionary (and of the dictionaries in it) to lists so it can be written
+    #with json.dump, keys become strings (the quantiles of monteCarlo.py are keyed by float)
+    output = {}
+    for key in results:
+        if isinstance(results[key], dict):
+            output[str(key)] = resultsToJSON(results[key])
+        elif isinstance(results[key], np.ndarray):
+            output[str(key)] = results[key].tolist()
+        else:
+            output[str(key)] = results[key]
+    return output
@@ -0,0 +1,176 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import argparse
+import json
+import sys
+import numpy as np
+#----------------------------------------------------------------------------------------------------------------------#
+#Parametric generator of valid model files (same schema as initialConditions*.json) from tens to millions of elements
+#Usage: python trussGenerator.py warren 10000 -o warren_10k.json
+
+#Names of the available truss types
+TRUSS_TYPES = ["warren", "pratt", "howe", "grid", "delaunay"]
+
+def modelDictionary(coords,connections,displacement,force,E=29500000.0,D=1.0):
+    #Wrap the generated arrays into the {"FEA": {...}} dictionary read by loadJSON
+    num_elements = len(connections)
+    return {"FEA": {
+        "nodes": np.asarray(coords, dtype=float).tolist(),
+        "element_params": {
+            "node_connections": np.asarray(connections, dtype=np.int64).tolist(),
+            "E": [float(E)] * num_elements,
+            "D": [float(D)] * num_elements,
+        },
+        "initial_conds": {
+            "displacement": np.asarray(displacement, dtype=np.int64).tolist(),
+            "force": np.asarray(force, dtype=float).tolist(),
+        },
+    }}
+
+def girderConditions(num_nodes,bottom,load,span_panels):
+    #Pinned support at the left end, rollers (fixed in y) at the right end and every span_panels bottom nodes
+    #(continuous girder, keeps long girders well conditioned), a downward load at each other bottom node
+    displacement = np.ones((num_nodes, 2), dtype=np.int64)
+    displacement[bottom[0]] = [0, 0]
+    supports = np.union1d(bottom[::span_panels], bottom[-1:])
+    displacement[supports, 1] = 0
+    loaded = np.setdiff1d(bottom, supports)
+    force = np.zeros((num_nodes, 2))
+    #Forces use the [magnitude, angle] format of transformForce, -90 degrees points down
+    force[loaded] = [load, -90.0]
+    return displacement, force
+
+def warrenGirder(panels,panel_length=1.0,height=1.0,load=1000.0,span_panels=10):
+    #Warren girder: bottom chord of panels+1 nodes, top chord nodes above the panel midpoints, alternating diagonals
+    #Elements: 4*panels - 1
+    bottom = np.arange(panels + 1)
+    top = panels + 1 + np.arange(panels)
+    coords = np.zeros((2 * panels + 1, 2))
+    coords[bottom, 0] = bottom * panel_length
+    coords[top, 0] = (np.arange(panels) + 0.5) * panel_length
+    coords[top, 1] = height
+
+    connections = np.concatenate([
+        np.stack([bottom[:-1], bottom[1:]], axis=1),
+        np.stack([top[:-1], top[1:]], axis=1),
+        np.stack([bottom[:-1], top], axis=1),
+        np.stack([top, bottom[1:]], axis=1),
+    ])
+    displacement, force = girderConditions(coords.shape[0], bottom, load, span_panels)
+    return modelDictionary(coords, connections, displacement, force)
+
+def verticalGirder(panels,panel_length,height,load,span_panels,howe):
+    #Pratt / Howe girder: bottom and top chords of panels+1 nodes, verticals at every node and one diagonal per panel
+    #Pratt diagonals slope down towards the middle (tension), Howe diagonals slope up towards the middle
+    #Elements: 4*panels + 1
+    bottom = np.arange(panels + 1)
+    top = panels + 1 + np.arange(panels + 1)
+    coords = np.zeros((2 * panels + 2, 2))
+    coords[bottom, 0] = bottom * panel_length
+    coords[top, 0] = np.arange(panels + 1) * panel_length
+    coords[top, 1] = height
+
+    #Panels left of the middle have their diagonal from top-left to bottom-right for Pratt, mirrored on the right
+    panel = np.arange(panels)
+    left_half = (panel + 0.5) < panels / 2.0
+    if howe:
+        left_half = ~left_half
+    diagonal_start = np.where(left_half, top[panel], bottom[panel])
+    diagonal_end = np.where(left_half, bottom[panel + 1], top[panel + 1])
+
+    connections = np.concatenate([
+        np.stack([bottom[:-1], bottom[1:]], axis=1),
+        np.stack([top[:-1], top[1:]], axis=1),
+        np.stack([bottom, top], axis=1),
+        np.stack([diagonal_start, diagonal_end], axis=1),
+    ])
+    displacement, force = girderConditions(coords.shape[0], bottom, load, span_panels)
+    return modelDictionary(coords, connections, displacement, force)
+
+def prattGirder(panels,panel_length=1.0,height=1.0,load=1000.0,span_panels=10):
+    return verticalGirder(panels, panel_length, height, load, span_panels, howe=False)
+
+def howeGirder(panels,panel_length=1.0,height=1.0,load=1000.0,span_panels=10):
+    return verticalGirder(panels, panel_length, height, load, span_panels, howe=True)
+
+def gridLattice(nx,ny,spacing=1.0,load=1000.0):
+    #Rectangular nx by ny node lattice with horizontal, vertical and one diagonal bar per cell (about 3*nx*ny bars)
+    #Left edge pinned, downward load at the bottom right node
+    index = np.arange(nx * ny).reshape(nx, ny)
+    grid_x, grid_y = np.meshgrid(np.arange(nx), np.arange(ny), indexing="ij")
+    coords = np.stack([grid_x.ravel(), grid_y.ravel()], axis=1) * spacing
+
+    connections = np.concatenate([
+        np.stack([index[:-1, :].ravel(), index[1:, :].ravel()], axis=1),
+        np.stack([index[:, :-1].ravel(), index[:, 1:].ravel()], axis=1),
+        np.stack([index[:-1, :-1].ravel(), index[1:, 1:].ravel()], axis=1),
+    ])
+    displacement = np.ones((nx * ny, 2), dtype=np.int64)
+    displacement[index[0, :]] = [0, 0]
+    force = np.zeros((nx * ny, 2))
+    force[index[-1, 0]] = [load, -90.0]
+    return modelDictionary(coords, connections, displacement, force)
+
+def delaunayTruss(num_nodes,width=2.0,height=1.0,seed=0,load=1000.0):
+    #Random nodes in a width x height rectangle connected by the edges of their Delaunay triangulation (~3 bars/node)
+    #Nodes in the left 5% (at least the two leftmost) are pinned, the nodes in the right 5% (at least the rightmost)
+    #carry a downward load
+    from scipy.spatial import Delaunay
+    rng = np.random.default_rng(seed)
+    coords = rng.random((num_nodes, 2)) * [width, height]
+    triangles = Delaunay(coords).simplices
+
+    #Every triangle gives three edges, keep each edge once
+    edges = np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [0, 2]]])
+    connections = np.unique(np.sort(edges, axis=1), axis=0)
+
+    displacement = np.ones((num_nodes, 2), dtype=np.int64)
+    sorted_x = np.sort(coords[:, 0])
+    displacement[coords[:, 0] <= max(0.05 * width, sorted_x[1])] = [0, 0]
+    force = np.zeros((num_nodes, 2))
+    loaded = coords[:, 0] >= min(0.95 * width, sorted_x[-1])
+    force[loaded] = [load / max(1, np.count_nonzero(loaded)), -90.0]
+    return modelDictionary(coords, connections, displacement, force)
+
+def generateModel(kind,num_elements,seed=0):
+    #Generate a model of the given type with approximately num_elements elements (at least a few panels/cells)
+    if kind == "warren":
+        return warrenGirder(max(2, int(round((num_elements + 1) / 4.0))))
+    if kind == "pratt":
+        return prattGirder(max(2, int(round((num_elements - 1) / 4.0))))
+    if kind == "howe":
+        return howeGirder(max(2, int(round((num_elements - 1) / 4.0))))
+    if kind == "grid":
+        #Lattice twice as long as high, 3*nx*ny bars
+        ny = max(2, int(round(np.sqrt(num_elements / 6.0))))
+        return gridLattice(max(2, int(round(num_elements / (3.0 * ny)))), ny)
+    if kind == "delaunay":
+        return delaunayTruss(max(4, int(round(num_elements / 3.0))), seed=seed)
+    raise ValueError("Unknown truss type '%s', expected one of %s" % (kind, TRUSS_TYPES))
+
+def writeModel(model,file):
+    #Write a generated model dictionary to a .json model file
+    with open(file, "w") as output:
+        json.dump(model, output)
+
+def main(argv=None):
+    #Command line interface of the generator
+    parser = argparse.ArgumentParser(description="Generate a truss model file")
+    parser.add_argument("kind", choices=TRUSS_TYPES, help="type of truss")
+    parser.add_argument("elements", type=int, help="approximate number of elements")
+    parser.add_argument("-o", "--output", default=None, help="model file to write (default: <kind>_<elements>.json)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the delaunay truss")
+    args = parser.parse_args(argv)
+
+    model = generateModel(args.kind, args.elements, seed=args.seed)
+    file = args.output or "%s_%d.json" % (args.kind, args.elements)
+    writeModel(model, file)
+    print("Wrote %s: %d nodes, %d elements" % (file, len(model["FEA"]["nodes"]),
+                                              len(model["FEA"]["element_params"]["node_connections"])))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
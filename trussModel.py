@@ -0,0 +1,102 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import numpy as np
+from elementClass import elementKernel
+#----------------------------------------------------------------------------------------------------------------------#
+
+#Struct of arrays container for a whole truss, replaces one Element/Node object per bar/joint on large models
+class TrussModel():
+    def kernel_calc(self):
+        #Calculate the length, strain, stress and stiffness matrices of every element in one pass {elementClass.py}
+        start = self.coords[self.connectivity[:, 0]]
+        end = self.coords[self.connectivity[:, 1]]
+        self.length, self.strain_matrix, self.stress_matrix, self.stiff_matrix = \
+            elementKernel(self.E, self.A, start, end)
+        # l = cos(theta), m = sin(theta) of every element
+        self.cos = self.strain_matrix[:, 2]
+        self.sin = self.strain_matrix[:, 3]
+
+    def dof_calc(self):
+        #Global dof indices [u_start, v_start, u_end, v_end] of each element, (elements x 4)
+        self.dofs = np.empty((self.num_elements, 4), dtype=np.int64)
+        self.dofs[:, 0] = self.connectivity[:, 0] * 2
+        self.dofs[:, 1] = self.dofs[:, 0] + 1
+        self.dofs[:, 2] = self.connectivity[:, 1] * 2
+        self.dofs[:, 3] = self.dofs[:, 2] + 1
+
+    def section_update(self,indices,E=None,A=None,D=None):
+        #Change the Young's modulus / area (and diameter) of some elements and recalculate only their matrices
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        if E is not None:
+            self.E[indices] = E
+        if A is not None:
+            self.A[indices] = A
+        if D is not None and self.D is not None:
+            self.D[indices] = D
+        start = self.coords[self.connectivity[indices, 0]]
+        end = self.coords[self.connectivity[indices, 1]]
+        length, direction, stress, stiff = elementKernel(self.E[indices], self.A[indices], start, end)
+        self.stress_matrix[indices] = stress
+        self.stiff_matrix[indices] = stiff
+
+    def element(self,index):
+        #Lightweight Element-like view of one element
+        return ElementView(self, index)
+
+    def elements(self):
+        #List of Element-like views of all elements, for code written against the Element objects
+        return [ElementView(self, i) for i in range(0, self.num_elements)]
+
+    def node(self,index):
+        #Lightweight Node-like view of one node
+        return NodeView(self, index)
+
+    def nodes(self):
+        #List of Node-like views of all nodes, for code written against the Node objects
+        return [NodeView(self, i) for i in range(0, self.num_nodes)]
+
+    def __init__(self,coords,connectivity,E,A,D=None):
+        #coords: (nodes x 2) node coordinates, connectivity: (elements x 2) start and end node of each element
+        #E, A: Young's modulus and area of each element, D: optional diameters the areas were calculated from
+        self.coords = np.ascontiguousarray(coords, dtype=float).reshape(-1, 2)
+        self.connectivity = np.ascontiguousarray(connectivity, dtype=np.int64).reshape(-1, 2)
+        self.num_nodes = self.coords.shape[0]
+        self.num_elements = self.connectivity.shape[0]
+        self.E = np.ascontiguousarray(E, dtype=float).reshape(self.num_elements)
+        self.A = np.ascontiguousarray(A, dtype=float).reshape(self.num_elements)
+        self.D = None if D is None else np.ascontiguousarray(D, dtype=float).reshape(self.num_elements)
+
+        #Calculate derived element data when the model is created
+        self.kernel_calc()
+        self.dof_calc()
+
+#Views reading one entry of a TrussModel, they hold no data of their own and expose the Element/Node attributes
+class ElementView():
+    __slots__ = ("model", "index")
+
+    def __init__(self,model,index):
+        self.model = model
+        self.index = index
+
+    E = property(lambda self: self.model.E[self.index])
+    A = property(lambda self: self.model.A[self.index])
+    length = property(lambda self: self.model.length[self.index])
+    connecting_nodes = property(lambda self: self.model.connectivity[self.index].tolist())
+    start_coord = property(lambda self: self.model.coords[self.model.connectivity[self.index, 0]].tolist())
+    end_coord = property(lambda self: self.model.coords[self.model.connectivity[self.index, 1]].tolist())
+    stiff_matrix = property(lambda self: self.model.stiff_matrix[self.index])
+    strain_matrix = property(lambda self: self.model.strain_matrix[self.index])
+    stress_matrix = property(lambda self: self.model.stress_matrix[self.index])
+    midpoint = property(lambda self: self.model.coords[self.model.connectivity[self.index]].mean(axis=0).tolist())
+
+class NodeView():
+    __slots__ = ("model", "node_num")
+
+    def __init__(self,model,index):
+        self.model = model
+        self.node_num = index
+
+    node_coords = property(lambda self: self.model.coords[self.node_num].tolist())
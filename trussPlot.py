@@ -0,0 +1,150 @@
+#----------------------------------------------------------------------------------------------------------------------#
+#FEA Truss Analysis Software
+#Created by Brad Young
+#Mar 10, 2019
+#----------------------------------------------------------------------------------------------------------------------#
+import numpy as np
+#----------------------------------------------------------------------------------------------------------------------#
+#Plots of a TrussModel {trussModel.py} that scale to large models: all members are one LineCollection (colored by
+#stress or force), supports one scatter per support type and loads one quiver, instead of one plot call per item.
+#Saving to a file uses a matplotlib Figure without pyplot, so it works headless in batch workers (.png, .svg, .pdf)
+#matplotlib is only imported when a plot is made
+
+#Element / node numbers and force values are only written on models with at most this many elements
+LABEL_LIMIT = 50
+#Longest load arrow and largest deformation drawn, as a fraction of the model size
+ARROW_LENGTH = 0.15
+DEFORMED_SIZE = 0.1
+
+def modelExtent(coords):
+    #Largest side of the bounding box of the nodes (1 for a single point)
+    if coords.shape[0] == 0:
+        return 1.0
+    extent = float(np.max(np.ptp(coords, axis=0)))
+    return extent if extent > 0 else 1.0
+
+def deformedScale(coords,displacement):
+    #Scale making the largest displacement DEFORMED_SIZE of the model size
+    largest = float(np.max(np.abs(displacement), initial=0.0))
+    return DEFORMED_SIZE * modelExtent(coords) / largest if largest > 0 else 1.0
+
+def newFigure(filename):
+    #Figure saved to a file without pyplot (no GUI backend needed), or a pyplot figure to show
+    if filename is not None:
+        from matplotlib.figure import Figure
+        figure = Figure(figsize=(10, 6))
+    else:
+        import matplotlib.pyplot as plt
+        figure = plt.figure(figsize=(10, 6))
+    return figure, figure.add_subplot(1, 1, 1)
+
+def drawMembers(axes,coords,connectivity,values=None,label=None,**style):
+    #All members as one LineCollection, colored by values (one per element) on a scale centered on 0
+    from matplotlib.collections import LineCollection
+    from matplotlib.colors import Normalize
+    members = LineCollection(coords[connectivity], **style)
+    if values is not None:
+        values = np.asarray(values, dtype=float)
+        limit = float(np.max(np.abs(values), initial=0.0)) or 1.0
+        members.set_array(values)
+        members.set_cmap("coolwarm")
+        members.set_norm(Normalize(-limit, limit))
+    axes.add_collection(members)
+    if values is not None:
+        axes.figure.colorbar(members, ax=axes, label=label)
+    return members
+
+def drawSupports(axes,coords,i_disp,size):
+    #Marker of each support type: circle pinned, > fixed in x only, ^ fixed in y only
+    flags = np.asarray(i_disp).reshape(-1, 2) != 0
+    pinned = ~flags[:, 0] & ~flags[:, 1]
+    fixed_x = ~flags[:, 0] & flags[:, 1]
+    fixed_y = flags[:, 0] & ~flags[:, 1]
+    for mask, marker in ((pinned, "o"), (fixed_x, ">"), (fixed_y, "^")):
+        if np.any(mask):
+            axes.scatter(coords[mask, 0], coords[mask, 1], marker=marker, s=size, zorder=3)
+
+def drawForces(axes,coords,i_force,labels):
+    #Load arrows of the (nodes x 2) x,y force components, the length grows with log(1 + |F|) so small and large
+    #loads both stay visible
+    forces = np.asarray(i_force, dtype=float).reshape(-1, 2)
+    magnitude = np.hypot(forces[:, 0], forces[:, 1])
+    loaded = magnitude > 0
+    if not np.any(loaded):
+        return
+    length = np.log1p(magnitude[loaded])
+    length = ARROW_LENGTH * modelExtent(coords) * length / np.max(length)
+    direction = forces[loaded] / magnitude[loaded][:, None]
+    #Arrows end at the node they load
+    tips = coords[loaded]
+    tails = tips - direction * length[:, None]
+    axes.quiver(tails[:, 0], tails[:, 1], tips[:, 0] - tails[:, 0], tips[:, 1] - tails[:, 1], angles="xy",
+                scale_units="xy", scale=1, color="black", width=0.004, zorder=4)
+    if labels:
+        for point, value in zip(tails, magnitude[loaded]):
+            axes.annotate("F: %d" % int(np.ceil(value)), (point[0], point[1]))
+
+def drawLabels(axes,coords,connectivity):
+    #Element numbers at the member midpoints and node numbers at the nodes
+    midpoints = coords[connectivity].mean(axis=1)
+    for i, point in enumerate(midpoints):
+        axes.annotate("E%d" % i, (point[0], point[1]))
+    for i, point in enumerate(coords):
+        axes.annotate("N%d" % i, (point[0], point[1]))
+
+def drawTruss(coords,connectivity,i_disp,i_force=None,values=None,displacement=None,scale=None,label="Stress",
+              filename=None,label_limit=LABEL_LIMIT,title=None):
+    #Plot a truss given by its (nodes x 2) coordinates and (elements x 2) connectivity, with its supports (i_disp: the
+    #[[x,y],...] displacement flags) and loads (i_force: (nodes x 2) x,y components {transformForce in projectFunc.py})
+    #values: optional value of each element (stress, force...) used to color the members, label names it
+    #displacement: optional final displacements (dofs), the deformed shape is drawn over the undeformed model,
+    #magnified by scale (default: largest displacement drawn as 10% of the model size)
+    #filename: save to this file (format from the extension), otherwise the figure is shown
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    connectivity = np.asarray(connectivity, dtype=np.int64).reshape(-1, 2)
+    labels = connectivity.shape[0] <= label_limit
+    #Thinner members and smaller support markers on large models
+    width = 2.0 if labels else 0.5
+    figure, axes = newFigure(filename)
+
+    if displacement is not None:
+        displacement = np.asarray(displacement, dtype=float).reshape(-1, 2)
+        if scale is None:
+            scale = deformedScale(coords, displacement)
+        #Undeformed shape in light gray under the colored deformed shape
+        drawMembers(axes, coords, connectivity, colors="lightgray", linestyles="dashed", linewidths=width / 2)
+        drawMembers(axes, coords + scale * displacement, connectivity, values, label, linewidths=width)
+        axes.set_title(title or "Deformed shape (x%.3g)" % scale)
+    else:
+        drawMembers(axes, coords, connectivity, values, label, linewidths=width)
+        if title:
+            axes.set_title(title)
+
+    drawSupports(axes, coords, i_disp, 150 if labels else 20)
+    if i_force is not None:
+        drawForces(axes, coords, i_force, labels)
+    if labels:
+        drawLabels(axes, coords, connectivity)
+    axes.autoscale_view()
+    axes.set_aspect("equal", adjustable="datalim")
+
+    if filename is not None:
+        figure.savefig(filename, dpi=150)
+    else:
+        import matplotlib.pyplot as plt
+        plt.show()
+    return figure
+
+def plotModel(model,i_disp,i_force=None,**options):
+    #drawTruss of a TrussModel {trussModel.py}
+    return drawTruss(model.coords, model.connectivity, i_disp, i_force, **options)
+
+def plotResults(model,initial_conds,results,case=0,quantity="stress",filename=None,scale=None,
+                label_limit=LABEL_LIMIT):
+    #Plot one load case of an analysis result {analyzeModel in trussAnalysis.py}: members colored by quantity
+    #("stress", "strain" or "element_force") on the deformed shape, with the supports and loads of the model
+    from projectFunc import readLoadCases, transformForce
+    names = {"stress": "Stress", "strain": "Strain", "element_force": "Element force"}
+    return plotModel(model, initial_conds["displacement"], transformForce(readLoadCases(initial_conds)[case]),
+                     values=results[quantity][case], displacement=results["displacement"][case], scale=scale,
+                     label=names.get(quantity, quantity), filename=filename, label_limit=label_limit)